@@ -0,0 +1,87 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db.models import QuerySet
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from comment.pagination import CursorPage, CursorPaginator, RankCursorPaginator, get_sort_field
+
+
+class CommentCursorPagination(BasePagination):  # type: ignore
+    """
+    DRF pagination backed by the keyset `CursorPaginator` used by the comment list page.
+
+    Supports `?sort=created|username|email|activity`, `?order=asc|desc`, `?cursor=` and
+    `?page_size=` (up to `max_page_size`).
+    """
+
+    page_size = 25
+    max_page_size = 100
+    paginator_class = CursorPaginator
+
+    def get_sorting(self, request: Request) -> Tuple[str, bool]:
+        """
+        Reads the requested sort column and direction from the query string.
+
+        Returns:
+            Tuple[str, bool]: The sort column and whether the order is descending.
+        """
+        sort_by = get_sort_field(request.query_params.get("sort"))
+        return sort_by, request.query_params.get("order", "asc") == "desc"
+
+    def get_page_size(self, request: Request) -> int:
+        try:
+            page_size = int(request.query_params.get("page_size", self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(
+        self, queryset: QuerySet[Any], request: Request, view: Any = None
+    ) -> List[Any]:
+        sort_field, descending = self.get_sorting(request)
+        paginator = self.paginator_class(
+            queryset, sort_field, descending, self.get_page_size(request)
+        )
+        self.request = request
+        self.page: CursorPage = paginator.get_page(request.query_params.get("cursor"))
+        return self.page.object_list
+
+    def get_paginated_response(self, data: Any) -> Response:
+        return Response(
+            {
+                "next": self._link(self.page.next_cursor),
+                "previous": self._link(self.page.previous_cursor),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def _link(self, cursor: Optional[str]) -> Optional[str]:
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), "cursor", cursor)
+
+
+class CommentSearchPagination(CommentCursorPagination):
+    """
+    Cursor pagination of search results from the most to the least relevant.
+
+    Supports `?cursor=` and `?page_size=`; the order is fixed.
+    """
+
+    paginator_class = RankCursorPaginator
+
+    def get_sorting(self, request: Request) -> Tuple[str, bool]:
+        return "rank", True
@@ -0,0 +1,51 @@
+from typing import Any
+
+from rest_framework import serializers
+
+from comment.models import Comment
+
+
+class CommentSerializer(serializers.ModelSerializer):  # type: ignore
+    """
+    Serializes a comment, limited to the fields passed as `fields` in the context.
+
+    `parent` is rendered from `parent_id`, so serializing a list never loads the
+    parent comments.
+    """
+
+    class Meta:
+        model = Comment
+        fields = [
+            "id",
+            "parent",
+            "depth",
+            "username",
+            "email",
+            "text",
+            "file",
+            "thumbnail",
+            "thumbnail_webp",
+            "image_webp",
+            "created",
+            "updated",
+        ]
+        read_only_fields = fields
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        requested = self.context.get("fields")
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+
+class CommentSearchSerializer(CommentSerializer):
+    """
+    Serializes a search result with its thread and its relevance to the search term.
+    """
+
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(CommentSerializer.Meta):
+        fields = [*CommentSerializer.Meta.fields, "tree_id", "rank"]
+        read_only_fields = fields
@@ -0,0 +1,229 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from comment.models import Comment
+from testtask.ratelimit import get_rate_limit_backend
+
+
+@override_settings(RATE_LIMIT_BACKEND="testtask.ratelimit.InMemoryRateLimitBackend")
+class CommentAPITests(TestCase):
+    def setUp(self) -> None:
+        """
+        Set up three root comments, a nested reply chain and an API client.
+        """
+        get_rate_limit_backend().clear()  # type: ignore
+        self.client = APIClient()
+        self.roots = [
+            Comment.objects.create(
+                username=f"user{index}",
+                email=f"user{index}@gmail.com",
+                text=f"Root comment {index}",
+                is_approved=True,
+            )
+            for index in range(3)
+        ]
+        self.reply = Comment.objects.create(
+            username="reply",
+            email="reply@gmail.com",
+            text="Reply",
+            parent=self.roots[0],
+            is_approved=True,
+        )
+        self.nested = Comment.objects.create(
+            username="nested",
+            email="nested@gmail.com",
+            text="Nested",
+            parent=self.reply,
+            is_approved=True,
+        )
+
+    def test_list_is_cursor_paginated_with_sparse_fields(self) -> None:
+        """
+        Test that roots are paginated by cursor and only the requested fields are returned.
+        """
+        url = reverse("api_comment_list")
+        first = self.client.get(url, {"page_size": 2, "fields": "id,username"}).json()
+
+        self.assertEqual([item["username"] for item in first["results"]], ["user0", "user1"])
+        self.assertEqual(set(first["results"][0]), {"id", "username"})
+        self.assertIsNone(first["previous"])
+
+        second = self.client.get(first["next"]).json()
+        self.assertEqual([item["username"] for item in second["results"]], ["user2"])
+        self.assertIsNone(second["next"])
+
+    def test_list_answers_conditional_requests(self) -> None:
+        """
+        Test that an unchanged page is answered with 304 and a changed one is not.
+        """
+        url = reverse("api_comment_list")
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(queries), 1)
+
+        self.roots[1].text = "Edited"
+        self.roots[1].save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_thread_is_nested_without_n_plus_one_queries(self) -> None:
+        """
+        Test that a thread is returned nested, with a query count independent of its size.
+        """
+        url = reverse("api_comment_thread", args=[self.roots[0].pk])
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        parent = self.nested
+        for _ in range(5):
+            parent = Comment.objects.create(
+                username="deep",
+                email="deep@gmail.com",
+                text="Deeper",
+                parent=parent,
+                is_approved=True,
+            )
+
+        with CaptureQueriesContext(connection) as large:
+            data = self.client.get(url, {"fields": "id,username"}).json()
+
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(data["username"], "user0")
+        self.assertEqual(data["replies"][0]["username"], "reply")
+        self.assertEqual(data["replies"][0]["replies"][0]["username"], "nested")
+        self.assertEqual(
+            self.client.get(reverse("api_comment_thread", args=[self.reply.pk])).status_code, 404
+        )
+
+    def test_thread_etag_changes_when_a_reply_is_added(self) -> None:
+        """
+        Test that the thread validator covers its replies.
+        """
+        url = reverse("api_comment_thread", args=[self.roots[0].pk])
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Comment.objects.create(
+            username="late",
+            email="late@gmail.com",
+            text="Late reply",
+            parent=self.nested,
+            is_approved=True,
+        )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_thread_hides_unapproved_replies(self) -> None:
+        """
+        Test that pending replies are neither returned nor change the thread validators.
+        """
+        url = reverse("api_comment_thread", args=[self.roots[0].pk])
+        response = self.client.get(url)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        pending = Comment.objects.create(
+            username="pending", email="pending@gmail.com", text="Pending", parent=self.roots[0]
+        )
+        Comment.objects.create(
+            username="hidden", email="hidden@gmail.com", text="Hidden", parent=pending
+        )
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["Last-Modified"], last_modified)
+        data = self.client.get(url).json()
+        self.assertEqual([reply["username"] for reply in data["replies"]], ["reply"])
+
+    def test_posting_replies_requires_authentication(self) -> None:
+        """
+        Test that anonymous clients cannot post and authenticated ones get a sanitized reply.
+        """
+        url = reverse("api_comment_replies", args=[self.reply.pk])
+        data = {"username": "mobile", "email": "mobile@gmail.com", "text": "<b>Hi</b> there"}
+        self.assertEqual(self.client.post(url, data).status_code, 401)
+
+        self.client.force_authenticate(User.objects.create_user("mobile"))
+        response = self.client.post(url, data)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["text"], "Hi there")
+        self.assertEqual(response.json()["parent"], self.reply.pk)
+        self.assertEqual(
+            response["Location"], reverse("api_comment_thread", args=[self.roots[0].pk])
+        )
+
+
+@override_settings(RATE_LIMIT_BACKEND="testtask.ratelimit.InMemoryRateLimitBackend")
+class CommentSearchAPITests(TestCase):
+    def setUp(self) -> None:
+        """
+        Set up comments mentioning "django", in visible and hidden threads.
+        """
+        get_rate_limit_backend().clear()  # type: ignore
+        self.client = APIClient()
+        self.url = reverse("api_comment_search")
+        self.root = Comment.objects.create(
+            username="django", email="root@gmail.com", text="Deploying apps", is_approved=True
+        )
+        self.matches = [
+            Comment.objects.create(
+                username=f"user{index}",
+                email=f"user{index}@gmail.com",
+                text=f"Reply {index} about django" + " and django views" * index,
+                parent=self.root,
+                is_approved=True,
+            )
+            for index in range(3)
+        ]
+        hidden_root = Comment.objects.create(
+            username="hidden", email="hidden@gmail.com", text="Secret django notes"
+        )
+        Comment.objects.create(
+            username="hidden",
+            email="hidden@gmail.com",
+            text="Hidden django reply",
+            parent=hidden_root,
+            is_approved=True,
+        )
+
+    def test_results_are_ranked_and_cursor_paginated(self) -> None:
+        """
+        Test that matches of visible threads are returned by relevance across pages.
+        """
+        first = self.client.get(self.url, {"q": "django", "page_size": 2})
+        self.assertIn("no-cache", first["Cache-Control"])
+        first_data = first.json()
+        second = self.client.get(first_data["next"]).json()
+
+        results = first_data["results"] + second["results"]
+        ranks = [item["rank"] for item in results]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        # The username match is weighted highest.
+        self.assertEqual(results[0]["id"], self.root.pk)
+        self.assertEqual(
+            {item["id"] for item in results}, {self.root.pk, *(c.pk for c in self.matches)}
+        )
+        self.assertEqual(results[1]["tree_id"], self.root.pk)
+        self.assertIsNone(second["next"])
+
+        previous = self.client.get(second["previous"]).json()
+        self.assertEqual(previous["results"], first_data["results"])
+
+    def test_search_syntax_and_validation(self) -> None:
+        """
+        Test that web search syntax is supported and empty or malformed input is handled.
+        """
+        data = self.client.get(self.url, {"q": 'django -"views"'}).json()
+        self.assertEqual(
+            {item["id"] for item in data["results"]}, {self.root.pk, self.matches[0].pk}
+        )
+        self.assertEqual(self.client.get(self.url, {"q": "  "}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"q": "x" * 201}).status_code, 400)
+        response = self.client.get(self.url, {"q": "django", "cursor": "bogus"})
+        self.assertEqual(response.status_code, 200)
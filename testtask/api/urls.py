@@ -1,9 +1,14 @@
 from django.urls import path
-from rest_framework_simplejwt.views import (TokenObtainPairView,
-                                            TokenRefreshView, TokenVerifyView)
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
+
+from .views import CommentListView, CommentReplyView, CommentSearchView, CommentThreadView
 
 urlpatterns = [
     path("token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("token/verify/", TokenVerifyView.as_view(), name="token_verify"),
+    path("comments/", CommentListView.as_view(), name="api_comment_list"),
+    path("comments/search/", CommentSearchView.as_view(), name="api_comment_search"),
+    path("comments/<int:pk>/", CommentThreadView.as_view(), name="api_comment_thread"),
+    path("comments/<int:pk>/replies/", CommentReplyView.as_view(), name="api_comment_replies"),
 ]
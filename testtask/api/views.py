@@ -0,0 +1,330 @@
+import hashlib
+import logging
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.db.models import Count, Max, Q
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import (
+    add_never_cache_headers,
+    get_conditional_response,
+    patch_cache_control,
+)
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.generics import GenericAPIView
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from comment.form import CommentForm
+from comment.models import Comment
+from comment.search import MAX_QUERY_LENGTH, search_comments, visible_comments
+from comment.task import queue_comment_notification
+from comment.uploads import get_uploaded_files
+from comment.utils import clean_html
+from geoip.middleware import UserStatsMiddleware
+from testtask.ratelimit import check_rate_limit
+
+from .pagination import CommentCursorPagination, CommentSearchPagination
+from .serializers import CommentSearchSerializer, CommentSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def get_requested_fields(request: Request) -> List[str]:
+    """
+    Parses the sparse fieldset from `?fields=id,username,...`.
+
+    Args:
+        request (Request): The API request.
+
+    Returns:
+        List[str]: The known requested fields, or an empty list for all fields.
+    """
+    requested = (name.strip() for name in request.query_params.get("fields", "").split(","))
+    return [name for name in requested if name in CommentSerializer.Meta.fields]
+
+
+def make_etag(request: Request, *state: Any) -> str:
+    """
+    Builds a strong ETag from the data a response is rendered from.
+
+    The path with its query string and the response format are included, so every
+    page, sort order, fieldset and renderer gets its own validator.
+
+    Args:
+        request (Request): The API request.
+        *state: Values that change whenever the response body changes.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    digest = hashlib.sha256(request.get_full_path().encode())
+    digest.update(request.accepted_renderer.format.encode())
+    for value in state:
+        digest.update(repr(value).encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def not_modified(
+    request: Request, etag: str, last_modified: Optional[datetime]
+) -> Optional[HttpResponse]:
+    """
+    Returns a 304 response if the client's cached copy is still current.
+
+    Args:
+        request (Request): The API request with `If-None-Match`/`If-Modified-Since`.
+        etag (str): The current ETag.
+        last_modified (Optional[datetime]): When the data last changed.
+
+    Returns:
+        Optional[HttpResponse]: The 304 response, or None if a full response is needed.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)  # type: ignore
+
+
+def set_validators(response: HttpResponse, etag: str, last_modified: Optional[datetime]) -> None:
+    """
+    Adds the ETag and Last-Modified headers and asks clients to revalidate every time.
+
+    The response is marked private so the site-wide cache middleware never stores it;
+    a copy cached by URL would outlive the data the validators describe.
+    """
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+
+
+def rate_limited(request: Request, name: str, message: str) -> Optional[Response]:
+    """
+    Counts the request against a rate limit.
+
+    Args:
+        request (Request): The API request.
+        name (str): The key of the limit in `settings.RATE_LIMITS`.
+        message (str): The error detail returned once the limit is exceeded.
+
+    Returns:
+        Optional[Response]: The 429 response, or None if the request is allowed.
+    """
+    rate_limit = check_rate_limit(request, name)
+    if rate_limit.allowed:
+        return None
+    return Response(
+        {"detail": message},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(math.ceil(rate_limit.retry_after))},
+    )
+
+
+def create_comment(request: Request, parent: Optional[Comment] = None) -> Response:
+    """
+    Validates and saves a comment posted to the API, like the comment form does.
+
+    Args:
+        request (Request): The API request with the comment data.
+        parent (Optional[Comment]): The comment being replied to, if any.
+
+    Returns:
+        Response: The created comment, or the validation errors.
+    """
+    response = rate_limited(request, "api_comment_post", "Too many comments, try again later.")
+    if response is not None:
+        return response
+
+    form = CommentForm(request.data, get_uploaded_files(request))
+    # API clients authenticate with a token instead of solving a CAPTCHA
+    del form.fields["captcha"]
+    if not form.is_valid():
+        return Response({"errors": form.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    comment = form.save(commit=False)
+    comment.is_approved = True
+    comment.text = clean_html(form.cleaned_data["text"])
+    comment.user_ip = UserStatsMiddleware.get_client_ip(request)
+    if parent is None and form.cleaned_data.get("parent"):
+        parent = get_object_or_404(Comment, pk=form.cleaned_data["parent"])
+    comment.parent = parent
+    comment.save()
+    try:
+        queue_comment_notification(comment.username, comment.text)
+    except Exception as e:
+        logger.error("Failed to queue the comment notification: %s", e)
+
+    data = CommentSerializer(comment, context={"request": request}).data
+    location = reverse("api_comment_thread", args=[comment.tree_id])
+    return Response(data, status=status.HTTP_201_CREATED, headers={"Location": location})
+
+
+class CommentListView(GenericAPIView):  # type: ignore
+    """
+    Lists approved root comments with cursor pagination and creates new comments.
+
+    `GET` supports `?fields=`, `?sort=`, `?order=`, `?cursor=` and `?page_size=`
+    and answers conditional requests with 304.
+    """
+
+    serializer_class = CommentSerializer
+    pagination_class = CommentCursorPagination
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get_queryset(self) -> Any:
+        return Comment.approved.filter(parent__isnull=True)
+
+    def get_serializer_context(self) -> Dict[str, Any]:
+        context: Dict[str, Any] = super().get_serializer_context()
+        context["fields"] = get_requested_fields(self.request)
+        return context
+
+    def get(self, request: Request, *args: Any, **kwargs: Any) -> HttpResponse:
+        """
+        Returns a page of root comments, or 304 if the client's copy is current.
+
+        The page is a single keyset query; the validators are computed from its rows,
+        so a 304 costs that query and no serialization.
+        """
+        queryset = self.get_queryset()
+        fields = get_requested_fields(request)
+        if fields:
+            sort_field, _ = self.paginator.get_sorting(request)
+            queryset = queryset.only(*{*fields, "id", "updated", sort_field})
+
+        comments = self.paginate_queryset(queryset)
+        page = self.paginator.page
+        last_modified = max((comment.updated for comment in comments), default=None)
+        etag = make_etag(
+            request,
+            [(comment.pk, comment.updated) for comment in comments],
+            page.next_cursor,
+            page.previous_cursor,
+        )
+
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = self.get_paginated_response(self.get_serializer(comments, many=True).data)
+        set_validators(response, etag, last_modified)
+        return response
+
+    def post(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        """
+        Creates a root comment, or a reply if `parent` is given.
+        """
+        return create_comment(request)
+
+
+class CommentThreadView(GenericAPIView):  # type: ignore
+    """
+    Returns a root comment with its approved replies nested under `replies`.
+    """
+
+    serializer_class = CommentSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get_serializer_context(self) -> Dict[str, Any]:
+        context: Dict[str, Any] = super().get_serializer_context()
+        context["fields"] = get_requested_fields(self.request)
+        return context
+
+    def get(self, request: Request, pk: int, *args: Any, **kwargs: Any) -> HttpResponse:
+        """
+        Returns the thread, or 304 if the client's copy is current.
+
+        The validators come from one aggregate over the thread's `(tree_id, depth)`
+        index, so a 304 never loads the comments themselves.
+        """
+        thread = Comment.approved.filter(tree_id=pk).aggregate(
+            last_modified=Max("updated"),
+            count=Count("id"),
+            visible=Count("id", filter=Q(pk=pk, parent__isnull=True)),
+        )
+        if not thread["visible"]:
+            raise Http404("Thread not found.")
+
+        etag = make_etag(request, thread["last_modified"], thread["count"])
+        response = not_modified(request, etag, thread["last_modified"])
+        if response is None:
+            response = Response(self.serialize_thread(pk))
+        set_validators(response, etag, thread["last_modified"])
+        return response
+
+    def serialize_thread(self, pk: int) -> Dict[str, Any]:
+        """
+        Serializes the approved comments of a thread with one query and one serializer
+        pass. Replies under a pending comment are left out along with it.
+
+        Args:
+            pk (int): The ID of the root comment.
+
+        Returns:
+            Dict[str, Any]: The root comment with nested `replies`.
+        """
+        queryset = Comment.approved.filter(tree_id=pk).order_by("depth", "-created", "-id")
+        fields = get_requested_fields(self.request)
+        if fields:
+            queryset = queryset.only(*{*fields, "id", "parent", "depth"})
+        comments = list(queryset)
+
+        nodes: Dict[int, Dict[str, Any]] = {}
+        for comment, data in zip(comments, self.get_serializer(comments, many=True).data):
+            data["replies"] = []
+            nodes[comment.pk] = data
+            parent = nodes.get(comment.parent_id) if comment.depth else None  # type: ignore
+            if parent is not None:
+                parent["replies"].append(data)
+        return nodes[pk]
+
+
+class CommentReplyView(GenericAPIView):  # type: ignore
+    """
+    Posts a reply to a comment.
+    """
+
+    serializer_class = CommentSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def post(self, request: Request, pk: int, *args: Any, **kwargs: Any) -> Response:
+        """
+        Creates a reply to the comment with the given ID.
+        """
+        return create_comment(request, parent=get_object_or_404(Comment, pk=pk))
+
+
+class CommentSearchView(GenericAPIView):  # type: ignore
+    """
+    Full-text search over the visible comments, most relevant first.
+
+    `GET ?q=` accepts the web search syntax (quoted phrases, `or`, `-word`) and
+    supports `?cursor=` and `?page_size=`.
+    """
+
+    serializer_class = CommentSearchSerializer
+    pagination_class = CommentSearchPagination
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        """
+        Returns a page of comments matching the search term.
+
+        Matches are found through the GIN index on the search vector; only the matches
+        are ranked, and each page is a keyset query on `(rank, id)`.
+        """
+        term = request.query_params.get("q", "").strip()
+        if not term or len(term) > MAX_QUERY_LENGTH:
+            return Response(
+                {"detail": f"Pass a search term of 1 to {MAX_QUERY_LENGTH} characters as q."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        response = rate_limited(request, "comment_search", "Too many searches, try again later.")
+        if response is None:
+            queryset = search_comments(visible_comments(Comment.objects.all()), term)
+            comments = self.paginate_queryset(queryset)
+            response = self.get_paginated_response(self.get_serializer(comments, many=True).data)
+        # Results change with every new comment and must not be kept by the page cache.
+        add_never_cache_headers(response)
+        return response
@@ -0,0 +1,137 @@
+import time
+from typing import Dict, Iterable, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Bump the format number whenever `includes/comment_item.html` changes in a way that
+# makes previously cached fragments invalid.
+THREAD_FRAGMENT_KEY = "comment_thread_html:v1:{tree_id}:{version}"
+THREAD_VERSION_KEY = "comment_thread_version:{tree_id}"
+
+
+def get_thread_versions(tree_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Returns the current version counter of each thread, initializing missing counters.
+
+    A missing counter is initialized with a fresh nanosecond timestamp, so a counter that
+    was evicted never comes back with a value pointing at an outdated fragment.
+
+    Args:
+        tree_ids (Iterable[int]): IDs of the root comments of the threads.
+
+    Returns:
+        Dict[int, int]: The version of every requested thread.
+    """
+    keys = {THREAD_VERSION_KEY.format(tree_id=tree_id): tree_id for tree_id in tree_ids}
+    found = cache.get_many(keys)
+
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+        found.update(cache.get_many(missing))
+
+    return {tree_id: found[key] for key, tree_id in keys.items() if key in found}
+
+
+def get_thread_fragments(tree_ids: Iterable[int]) -> Tuple[Dict[int, str], Dict[int, int]]:
+    """
+    Fetches the cached HTML of the given threads at their current versions.
+
+    Args:
+        tree_ids (Iterable[int]): IDs of the root comments of the threads.
+
+    Returns:
+        Tuple[Dict[int, str], Dict[int, int]]: The cached fragments of the clean threads,
+        and the current versions of all threads to store newly rendered fragments under.
+    """
+    versions = get_thread_versions(tree_ids)
+    keys = {
+        THREAD_FRAGMENT_KEY.format(tree_id=tree_id, version=version): tree_id
+        for tree_id, version in versions.items()
+    }
+    fragments = {keys[key]: html for key, html in cache.get_many(keys).items()}
+    return fragments, versions
+
+
+def set_thread_fragments(fragments: Dict[int, str], versions: Dict[int, int]) -> None:
+    """
+    Caches rendered thread HTML under the versions it was rendered at.
+
+    Args:
+        fragments (Dict[int, str]): Rendered HTML by root comment ID.
+        versions (Dict[int, int]): The versions returned by `get_thread_fragments`.
+    """
+    cache.set_many(
+        {
+            THREAD_FRAGMENT_KEY.format(tree_id=tree_id, version=versions[tree_id]): html
+            for tree_id, html in fragments.items()
+            if tree_id in versions
+        },
+        timeout=settings.COMMENT_THREAD_CACHE_TIMEOUT,
+    )
+
+
+async def aget_thread_versions(tree_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Async version of `get_thread_versions` using the async cache API.
+    """
+    keys = {THREAD_VERSION_KEY.format(tree_id=tree_id): tree_id for tree_id in tree_ids}
+    found = await cache.aget_many(keys)
+
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, time.time_ns(), timeout=None)
+        found.update(await cache.aget_many(missing))
+
+    return {tree_id: found[key] for key, tree_id in keys.items() if key in found}
+
+
+async def aget_thread_fragments(
+    tree_ids: Iterable[int],
+) -> Tuple[Dict[int, str], Dict[int, int]]:
+    """
+    Async version of `get_thread_fragments` using the async cache API.
+    """
+    versions = await aget_thread_versions(tree_ids)
+    keys = {
+        THREAD_FRAGMENT_KEY.format(tree_id=tree_id, version=version): tree_id
+        for tree_id, version in versions.items()
+    }
+    fragments = {keys[key]: html for key, html in (await cache.aget_many(keys)).items()}
+    return fragments, versions
+
+
+async def aset_thread_fragments(fragments: Dict[int, str], versions: Dict[int, int]) -> None:
+    """
+    Async version of `set_thread_fragments` using the async cache API.
+    """
+    await cache.aset_many(
+        {
+            THREAD_FRAGMENT_KEY.format(tree_id=tree_id, version=versions[tree_id]): html
+            for tree_id, html in fragments.items()
+            if tree_id in versions
+        },
+        timeout=settings.COMMENT_THREAD_CACHE_TIMEOUT,
+    )
+
+
+def bump_thread_versions(tree_ids: Iterable[int]) -> None:
+    """
+    Invalidates the cached HTML of the given threads by incrementing their versions.
+
+    Threads without a counter have nothing cached at a reachable version, so they
+    are skipped.
+
+    Args:
+        tree_ids (Iterable[int]): IDs of the root comments of the changed threads.
+    """
+    for tree_id in set(tree_ids):
+        if tree_id is None:
+            continue
+        try:
+            cache.incr(THREAD_VERSION_KEY.format(tree_id=tree_id))
+        except ValueError:
+            pass
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Set
+
+import redis.asyncio
+from django.conf import settings
+from django.template.loader import render_to_string
+from redis.exceptions import RedisError
+
+from geoip.utils import redis_client
+
+from .models import Comment
+
+logger = logging.getLogger(__name__)
+
+# Channel of new visible root comments, shown at the top of the comment list.
+ROOTS_CHANNEL = "comments:roots"
+
+
+def thread_channel(tree_id: int) -> str:
+    """
+    Returns the pub/sub channel of the comments of one thread.
+    """
+    return f"comments:thread:{tree_id}"
+
+
+def publish_comments(comments: Iterable[Comment]) -> None:
+    """
+    Publishes newly visible comments to every ASGI worker with one pipelined round-trip.
+
+    Each approved comment goes to the channel of its thread, and root comments also go
+    to `ROOTS_CHANNEL`. Pending comments are skipped, as the admin approval publishes
+    them again. The payload carries the rendered list item, so clients can insert it
+    without requesting the comment page.
+
+    Args:
+        comments (Iterable[Comment]): Comments that were just saved or approved.
+    """
+    pipeline = redis_client.pipeline(transaction=False)
+    for comment in comments:
+        if not comment.is_approved:
+            continue
+        payload = json.dumps(
+            {
+                "id": comment.pk,
+                "tree_id": comment.tree_id,
+                "parent": comment.parent_id,
+                "depth": comment.depth,
+                "html": render_to_string("includes/comment_item.html", {"comment": comment}),
+            }
+        )
+        pipeline.publish(thread_channel(comment.tree_id), payload)
+        if comment.parent_id is None:
+            pipeline.publish(ROOTS_CHANNEL, payload)
+    if not pipeline.command_stack:
+        return
+    try:
+        pipeline.execute()
+    except RedisError as e:
+        # Clients still see the comment on their next page load.
+        logger.warning("Failed to publish comment events: %s", e)
+
+
+class Subscription:
+    """
+    Bounded queue of the events of some channels for one client connection.
+
+    When a slow client lets `queue_size` events pile up, further events are not
+    queued and the subscription is marked as overflowed; the stream then tells the
+    client to reload instead of buffering without limit.
+    """
+
+    def __init__(self, channels: Iterable[str], queue_size: int) -> None:
+        self.channels = frozenset(channels)
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def put(self, data: str) -> None:
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class CommentEventBroker:
+    """
+    Fans comment events out from Redis pub/sub to the client connections of one worker.
+
+    A worker holds a single pub/sub connection, subscribed to the channels its clients
+    currently listen to, and copies every message into the bounded queue of each of
+    those clients. The number of Redis connections therefore does not grow with the
+    number of clients, and a slow client only ever delays itself.
+    """
+
+    def __init__(self, client_factory: Callable[[], Any]) -> None:
+        """
+        Args:
+            client_factory (Callable): Creates the asyncio Redis client to subscribe with.
+        """
+        self.client_factory = client_factory
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self.connections = 0
+
+    def _reset(self) -> None:
+        # Asyncio primitives and connections are bound to the loop they were created on.
+        self._loop = asyncio.get_running_loop()
+        self._subscriptions = {}
+        self._lock = asyncio.Lock()
+        self._pubsub: Any = None
+        self._listener: Optional["asyncio.Task[None]"] = None
+        self.connections = 0
+
+    async def subscribe(self, channels: Iterable[str]) -> Subscription:
+        """
+        Subscribes a client connection to some channels.
+
+        Args:
+            channels (Iterable[str]): The channels to receive the events of.
+
+        Returns:
+            Subscription: The queue the events of the channels are delivered to.
+
+        Raises:
+            RedisError: If the channels could not be subscribed to.
+        """
+        if self._loop is not asyncio.get_running_loop():
+            self._reset()
+        subscription = Subscription(channels, settings.COMMENT_EVENTS_QUEUE_SIZE)
+        async with self._lock:
+            if self._pubsub is None:
+                self._pubsub = self.client_factory().pubsub(ignore_subscribe_messages=True)
+            new_channels = [
+                channel for channel in subscription.channels if channel not in self._subscriptions
+            ]
+            if new_channels:
+                await self._pubsub.subscribe(*new_channels)
+            for channel in subscription.channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+            self.connections += 1
+            if self._listener is None or self._listener.done():
+                self._listener = asyncio.create_task(self._listen())
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Removes a client connection, unsubscribing from the channels nobody listens to anymore.
+        """
+        async with self._lock:
+            unused_channels = []
+            for channel in subscription.channels:
+                subscriptions = self._subscriptions.get(channel, set())
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    self._subscriptions.pop(channel, None)
+                    unused_channels.append(channel)
+            self.connections -= 1
+            if unused_channels:
+                try:
+                    await self._pubsub.unsubscribe(*unused_channels)
+                except RedisError as e:
+                    logger.warning("Failed to unsubscribe from comment events: %s", e)
+
+    def dispatch(self, channel: str, data: str) -> None:
+        """
+        Delivers an event to every client connection listening to the channel.
+        """
+        for subscription in list(self._subscriptions.get(channel, ())):
+            subscription.put(data)
+
+    async def _listen(self) -> None:
+        while self._subscriptions:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except RedisError as e:
+                # The pub/sub connection re-subscribes to its channels when it reconnects.
+                logger.warning("Comment event subscription failed: %s", e)
+                await asyncio.sleep(1.0)
+                continue
+            if message and message["type"] == "message":
+                self.dispatch(message["channel"].decode(), message["data"].decode())
+
+
+comment_event_broker = CommentEventBroker(
+    lambda: redis.asyncio.Redis.from_url(
+        settings.REDIS_URL,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=30,
+    )
+)
+
+
+async def stream_events(
+    broker: CommentEventBroker, subscription: Subscription
+) -> AsyncIterator[str]:
+    """
+    Formats the events of a subscription as a server-sent event stream.
+
+    A comment is sent as a `comment` event. A comment line is sent every
+    `COMMENT_EVENTS_KEEPALIVE` seconds so proxies keep idle connections open. If the
+    client fell too far behind, the queued events are followed by a `reset` event
+    asking it to reload, and the stream ends.
+
+    Args:
+        broker (CommentEventBroker): The broker the subscription belongs to.
+        subscription (Subscription): The subscription to stream.
+
+    Yields:
+        str: Chunks of the event stream.
+    """
+    try:
+        yield f"retry: {settings.COMMENT_EVENTS_RETRY_MS}\n\n"
+        while True:
+            if subscription.overflowed and subscription.queue.empty():
+                # Events after the queued ones were dropped; the client has to reload.
+                yield "event: reset\ndata: {}\n\n"
+                return
+            try:
+                data = await asyncio.wait_for(
+                    subscription.queue.get(), timeout=settings.COMMENT_EVENTS_KEEPALIVE
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            event_id = json.loads(data)["id"]
+            yield f"id: {event_id}\nevent: comment\ndata: {data}\n\n"
+    finally:
+        await broker.unsubscribe(subscription)
@@ -0,0 +1,110 @@
+import os
+from io import BytesIO
+from typing import Dict, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models.fields.files import FieldFile
+from PIL import Image, ImageOps
+
+# Attachments with these extensions are processed into thumbnails and WebP variants.
+IMAGE_EXTENSIONS = ("jpg", "jpeg", "png", "gif")
+
+# Pillow format used to re-encode each source format; GIF thumbnails become PNGs.
+SAVE_FORMATS = {"JPEG": "JPEG", "PNG": "PNG", "GIF": "PNG"}
+SAVE_OPTIONS: Dict[str, Dict[str, object]] = {
+    "JPEG": {"quality": 85, "optimize": True, "progressive": True},
+    "PNG": {"optimize": True},
+    "WEBP": {"quality": 80, "method": 4},
+}
+
+
+def is_image_attachment(name: str) -> bool:
+    """
+    Checks whether an attachment should be processed as an image.
+
+    Args:
+        name (str): The file name of the attachment.
+
+    Returns:
+        bool: True for jpg, png and gif attachments.
+    """
+    return os.path.splitext(name)[1].lower().lstrip(".") in IMAGE_EXTENSIONS
+
+
+def _encode(image: Image.Image, image_format: str) -> ContentFile:
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    # Nothing from the source `info` (EXIF, XMP, ICC, comments) is passed on, so the
+    # encoded file carries no metadata.
+    image.save(buffer, image_format, **SAVE_OPTIONS[image_format])  # type: ignore
+    return ContentFile(buffer.getvalue())
+
+
+def _save_variant(
+    file: FieldFile, field_name: str, extension: str, image: Image.Image, image_format: str
+) -> str:
+    field = file.instance._meta.get_field(field_name)
+    base = os.path.splitext(os.path.basename(file.name))[0]
+    name = field.generate_filename(file.instance, f"{base}.{extension}")
+    return field.storage.save(name, _encode(image, image_format))  # type: ignore
+
+
+def _bounded(image: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    image = image.copy()
+    image.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    return image
+
+
+def create_image_variants(file: FieldFile) -> Dict[str, str]:
+    """
+    Creates the variants of an image attachment and stores them through their model fields.
+
+    The image is decoded once, rotated according to its EXIF orientation and then:
+
+    - re-encoded without metadata and scaled down to `COMMENT_IMAGE_MAX_SIZE` under a
+      new name, which replaces the original once stored (animated GIFs are kept as is),
+    - scaled down to `COMMENT_THUMBNAIL_SIZE` in its own format and as WebP,
+    - converted to WebP at its bounded full size.
+
+    Args:
+        file (FieldFile): The stored attachment of a model instance.
+
+    Returns:
+        Dict[str, str]: The stored names keyed by model field: `file`, `thumbnail`,
+            `thumbnail_webp` and `image_webp`.
+
+    Raises:
+        ValueError: If the image exceeds `COMMENT_IMAGE_MAX_PIXELS`.
+        PIL.UnidentifiedImageError: If the file is not an image Pillow can read.
+    """
+    with file.open("rb") as source, Image.open(source) as image:
+        width, height = image.size
+        if width * height > settings.COMMENT_IMAGE_MAX_PIXELS:
+            raise ValueError(f"Image of {width}x{height} pixels is too large to process.")
+
+        source_format = image.format or "PNG"
+        animated = getattr(image, "is_animated", False)
+        # Lets the JPEG decoder downscale by a power of two while decoding, which is
+        # much cheaper than decoding huge photos at full size.
+        image.draft("RGB", settings.COMMENT_IMAGE_MAX_SIZE)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA", "L"):
+            # Palette images would otherwise be resized with nearest-neighbour sampling.
+            image = image.convert("RGBA")
+        full = _bounded(image, settings.COMMENT_IMAGE_MAX_SIZE)
+
+    save_format = SAVE_FORMATS.get(source_format, "PNG")
+    thumbnail = _bounded(full, settings.COMMENT_THUMBNAIL_SIZE)
+    extension = "jpg" if save_format == "JPEG" else "png"
+
+    names = {
+        "thumbnail": _save_variant(file, "thumbnail", extension, thumbnail, save_format),
+        "thumbnail_webp": _save_variant(file, "thumbnail_webp", "webp", thumbnail, "WEBP"),
+        "image_webp": _save_variant(file, "image_webp", "webp", full, "WEBP"),
+        "file": file.name,
+    }
+    if not animated and save_format == source_format:
+        names["file"] = _save_variant(file, "file", extension, full, save_format)
+    return names
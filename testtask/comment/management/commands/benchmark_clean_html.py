@@ -0,0 +1,96 @@
+import random
+import time
+from typing import Any, Callable, List
+
+import bleach
+from django.core.management.base import BaseCommand, CommandParser
+
+from comment.utils import ALLOWED_ATTRIBUTES, ALLOWED_TAGS, CleanHTMLCache, clean_html
+
+WORDS = (
+    "thanks great point agree disagree because the this that code example works fails "
+    "version update release bug issue fixed django python template query cache привіт "
+    "дякую коментар 👍 really interesting source link below above"
+).split()
+
+MARKUP = (
+    "<strong>{}</strong>",
+    "<i>{}</i>",
+    "<code>{}</code>",
+    '<a href="https://example.com/{}" title="link">{}</a>',
+    "<script>alert('{}')</script>",
+    '<img src="x" onerror="alert(1)">{}',
+    '<a href="javascript:alert(1)">{}</a>',
+    "<div><p>{}</p></div>",
+)
+
+
+def uncached_clean(user_input: str) -> str:
+    """
+    Reproduces the previous implementation, which configured bleach on every call.
+    """
+    return bleach.clean(
+        user_input, tags=list(ALLOWED_TAGS), attributes=dict(ALLOWED_ATTRIBUTES), strip=True
+    )
+
+
+def make_comment(rng: random.Random) -> str:
+    """
+    Builds a comment body of a few sentences with occasional allowed and hostile markup.
+    """
+    parts = []
+    for _ in range(rng.randint(1, 6)):
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 25)))
+        if rng.random() < 0.4:
+            word = rng.choice(WORDS)
+            sentence += " " + rng.choice(MARKUP).format(word, word)
+        parts.append(sentence.capitalize() + ".")
+    return " ".join(parts)
+
+
+class Command(BaseCommand):
+    """
+    Measures the throughput of comment HTML sanitizing.
+    """
+
+    help = "Benchmarks clean_html: bleach.clean per call vs shared Cleaner vs preview LRU cache."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--comments", type=int, default=2000, help="Comments per run.")
+        parser.add_argument(
+            "--previews-per-comment",
+            type=int,
+            default=5,
+            help="Preview requests per comment; some repeat the same text, as when a user "
+            "pauses typing or previews again before posting.",
+        )
+        parser.add_argument("--seed", type=int, default=42, help="Random seed for the corpus.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        rng = random.Random(options["seed"])
+        corpus = [make_comment(rng) for _ in range(options["comments"])]
+
+        previews = []
+        for comment in corpus:
+            cut = len(comment)
+            for _ in range(options["previews_per_comment"]):
+                if rng.random() < 0.5:
+                    cut = rng.randint(cut // 2, cut) if cut else 0
+                previews.append(comment[:cut] or comment)
+
+        before = self._measure("bleach.clean per call", uncached_clean, corpus)
+        after = self._measure("shared Cleaner", clean_html, corpus)
+        self.stdout.write(f"Speedup: {before / after:.1f}x")
+
+        cache = CleanHTMLCache(max_size=2048, max_input_length=10_000)
+        uncached = self._measure("previews, no cache", clean_html, previews)
+        cached = self._measure("previews, LRU cache", cache.clean, previews)
+        self.stdout.write(f"Preview speedup: {uncached / cached:.1f}x, cache: {cache.info()}")
+
+    def _measure(self, label: str, clean: Callable[[str], str], inputs: List[str]) -> float:
+        started = time.perf_counter()
+        for user_input in inputs:
+            clean(user_input)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label:>22}: {len(inputs) / elapsed:10.0f} comments/s")
+        return elapsed
@@ -0,0 +1,179 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import aiohttp
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+# A request of the mix: method, path and form data.
+Request = Tuple[str, str, Optional[Dict[str, str]]]
+
+PREVIEW_DATA = {
+    "username": "loadtest",
+    "email": "loadtest@example.com",
+    "text": "Load test <strong>preview</strong> with a <a href='https://example.com'>link</a>.",
+}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Returns the value below which the given fraction of the sorted values falls.
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def client_ip(index: int) -> str:
+    """
+    Builds a distinct client address per request, so per-IP rate limits do not turn
+    the benchmark into a benchmark of 429 responses.
+
+    The servers only use it when they trust the load generator as a proxy, i.e. with
+    `TRUSTED_PROXY_COUNT` one above the number of proxies in front of them.
+    """
+    return f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"
+
+
+async def run_load(
+    base_url: str, requests: List[Request], concurrency: int, duration: float, timeout: float
+) -> Dict[str, Any]:
+    """
+    Sends the request mix from `concurrency` clients for `duration` seconds.
+
+    Every client sends its next request as soon as the previous one completed, so the
+    server always has `concurrency` requests in flight.
+
+    Returns:
+        Dict[str, Any]: The sorted latencies, the count per status code, the number of
+            failed requests and the elapsed seconds.
+    """
+    latencies: List[float] = []
+    statuses: Counter[int] = Counter()
+    errors = 0
+    sent = 0
+    deadline = time.perf_counter() + duration
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+
+        async def client(offset: int) -> None:
+            nonlocal errors, sent
+            index = offset
+            while time.perf_counter() < deadline:
+                method, path, data = requests[index % len(requests)]
+                index += 1
+                sent += 1
+                headers = {"X-Forwarded-For": client_ip(sent)}
+                started = time.perf_counter()
+                try:
+                    async with session.request(
+                        method, urljoin(base_url, path), data=data, headers=headers
+                    ) as response:
+                        await response.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(offset) for offset in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {"latencies": latencies, "statuses": statuses, "errors": errors, "elapsed": elapsed}
+
+
+class Command(BaseCommand):
+    """
+    Compares the throughput of the comment read path on the uWSGI and ASGI servers.
+    """
+
+    help = (
+        "Load-tests the comment list, preview and visitor stats endpoints at high "
+        "concurrency on each target, e.g. "
+        "`benchmark_load uwsgi=http://localhost/ asgi=http://localhost:8001/`. "
+        "Run it from a separate machine or container so the client does not compete "
+        "with the servers for CPU."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "targets",
+            nargs="+",
+            metavar="LABEL=URL",
+            help="Servers to compare, each as a label and the base URL of the site.",
+        )
+        parser.add_argument(
+            "--paths",
+            nargs="+",
+            default=["/", "/ip/stats/visitors/"],
+            help="Paths requested with GET.",
+        )
+        parser.add_argument(
+            "--no-preview", action="store_true", help="Leave comment previews out of the mix."
+        )
+        parser.add_argument("--concurrency", type=int, default=200, help="Requests kept in flight.")
+        parser.add_argument("--duration", type=float, default=30.0, help="Seconds per target.")
+        parser.add_argument(
+            "--warmup", type=float, default=3.0, help="Unmeasured seconds before each run."
+        )
+        parser.add_argument("--timeout", type=float, default=30.0, help="Seconds per request.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        targets = []
+        for target in options["targets"]:
+            label, separator, url = target.partition("=")
+            if not separator or not url.startswith(("http://", "https://")):
+                raise CommandError(f"Expected LABEL=URL, got {target!r}")
+            targets.append((label, url.rstrip("/") + "/"))
+
+        requests: List[Request] = [("GET", path.lstrip("/"), None) for path in options["paths"]]
+        if not options["no_preview"]:
+            requests.append(("POST", "preview/", PREVIEW_DATA))
+
+        self.stdout.write(
+            f"{options['concurrency']} concurrent clients, {options['duration']:.0f}s per target, "
+            f"mix: {', '.join(f'{method} /{path}' for method, path, _ in requests)}"
+        )
+        self.stdout.write(
+            f"{'target':>10} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+            f"{'max ms':>9} {'non-2xx':>8} {'errors':>7}"
+        )
+        throughput = {}
+        for label, url in targets:
+            if options["warmup"] > 0:
+                asyncio.run(
+                    run_load(
+                        url, requests, options["concurrency"], options["warmup"], options["timeout"]
+                    )
+                )
+            result = asyncio.run(
+                run_load(
+                    url, requests, options["concurrency"], options["duration"], options["timeout"]
+                )
+            )
+            throughput[label] = self._report(label, result)
+
+        if len(throughput) > 1:
+            baseline_label, baseline = next(iter(throughput.items()))
+            for label, value in list(throughput.items())[1:]:
+                ratio = value / baseline if baseline else 0.0
+                self.stdout.write(f"{label} vs {baseline_label}: {ratio:.2f}x throughput")
+
+    def _report(self, label: str, result: Dict[str, Any]) -> float:
+        latencies = result["latencies"]
+        completed = len(latencies)
+        throughput = completed / result["elapsed"] if result["elapsed"] else 0.0
+        non_2xx = sum(count for status, count in result["statuses"].items() if status >= 300)
+        self.stdout.write(
+            f"{label:>10} {throughput:9.1f} {percentile(latencies, 0.5) * 1000:9.1f} "
+            f"{percentile(latencies, 0.95) * 1000:9.1f} {percentile(latencies, 0.99) * 1000:9.1f} "
+            f"{(latencies[-1] if latencies else 0.0) * 1000:9.1f} {non_2xx:8d} "
+            f"{result['errors']:7d}"
+        )
+        return throughput
@@ -0,0 +1,47 @@
+import gzip
+import sys
+import time
+from typing import IO, Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from comment.transfer import export_comments
+
+
+class Command(BaseCommand):
+    """
+    Streams every comment to a JSON Lines file for backups and migrations.
+    """
+
+    help = "Exports comments as JSON Lines. Paths ending in .gz are gzip-compressed."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("path", help='Output file, or "-" for standard output.')
+        parser.add_argument(
+            "--chunk-size", type=int, default=2000, help="Rows fetched from the database at a time."
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Writes the export and reports the throughput on stderr.
+        """
+        started = time.perf_counter()
+        if options["path"] == "-":
+            total = export_comments(sys.stdout, options["chunk_size"])
+        else:
+            with self._open(options["path"]) as stream:
+                total = export_comments(stream, options["chunk_size"])
+        elapsed = time.perf_counter() - started
+
+        self.stderr.write(
+            self.style.SUCCESS(
+                f"Exported {total} comment(s) in {elapsed:.2f}s "
+                f"({total / max(elapsed, 1e-9):.0f} rows/s)."
+            )
+        )
+
+    @staticmethod
+    def _open(path: str) -> IO[str]:
+        if path.endswith(".gz"):
+            return gzip.open(path, "wt", encoding="utf-8")
+        return open(path, "w", encoding="utf-8")
@@ -0,0 +1,50 @@
+import gzip
+import sys
+import time
+from typing import IO, Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+
+from comment.transfer import CommentImportError, import_comments
+
+
+class Command(BaseCommand):
+    """
+    Loads comments from a JSON Lines export, remapping their IDs and parents.
+    """
+
+    help = "Imports comments exported by export_comments. Paths ending in .gz are decompressed."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("path", help='Input file, or "-" for standard input.')
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows inserted per query.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Runs the import inside a single transaction and reports the throughput.
+        """
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                if options["path"] == "-":
+                    total = import_comments(sys.stdin, options["batch_size"])
+                else:
+                    with self._open(options["path"]) as stream:
+                        total = import_comments(stream, options["batch_size"])
+        except CommentImportError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {total} comment(s) in {elapsed:.2f}s "
+                f"({total / max(elapsed, 1e-9):.0f} rows/s)."
+            )
+        )
+
+    @staticmethod
+    def _open(path: str) -> IO[str]:
+        if path.endswith(".gz"):
+            return gzip.open(path, "rt", encoding="utf-8")
+        return open(path, encoding="utf-8")
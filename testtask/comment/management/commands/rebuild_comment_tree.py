@@ -0,0 +1,23 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from comment.models import Comment
+from comment.tree import rebuild_tree
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the materialized path, depth and tree ID of every comment.
+    """
+
+    help = "Rebuilds the materialized comment tree (tree_id, depth, path)."
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Runs the rebuild inside a single transaction and reports the number of comments.
+        """
+        with transaction.atomic():
+            total = rebuild_tree(Comment)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt tree fields for {total} comment(s)."))
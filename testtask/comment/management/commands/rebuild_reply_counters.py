@@ -0,0 +1,32 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+
+from comment.models import Comment
+from comment.tree import rebuild_reply_counters
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the denormalized reply counters and last activity of every comment.
+    """
+
+    help = "Repairs reply_count, descendant_count and last_activity from the comment tree."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--tree",
+            type=int,
+            action="append",
+            dest="tree_ids",
+            help="Only repair this thread, by the ID of its root comment. Repeatable.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        """
+        Runs the repair inside a single transaction and reports the number of comments.
+        """
+        with transaction.atomic():
+            total = rebuild_reply_counters(Comment, options["tree_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Repaired reply counters of {total} comment(s)."))
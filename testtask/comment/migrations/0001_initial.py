@@ -0,0 +1,94 @@
+# Generated by Django 5.1.5 on 2026-10-17 00:11
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Comment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "username",
+                    models.CharField(
+                        help_text="The name of the user who posted the comment.", max_length=100
+                    ),
+                ),
+                (
+                    "email",
+                    models.EmailField(help_text="The email address of the user.", max_length=100),
+                ),
+                ("text", models.TextField(help_text="The content of the comment.")),
+                (
+                    "file",
+                    models.FileField(
+                        blank=True,
+                        help_text="Optional file attachment. Allowed formats: txt, jpg, png, gif.",
+                        null=True,
+                        upload_to="comments/",
+                        validators=[
+                            django.core.validators.FileExtensionValidator(
+                                allowed_extensions=["txt", "jpg", "png", "gif"]
+                            )
+                        ],
+                    ),
+                ),
+                (
+                    "user_ip",
+                    models.TextField(
+                        blank=True,
+                        help_text="The IP address of the user.",
+                        max_length=100,
+                        null=True,
+                    ),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True, help_text="The timestamp when the comment was created."
+                    ),
+                ),
+                (
+                    "updated",
+                    models.DateTimeField(
+                        auto_now=True, help_text="The timestamp when the comment was last updated."
+                    ),
+                ),
+                (
+                    "is_approved",
+                    models.BooleanField(
+                        default=False, help_text="Indicates whether the comment is approved."
+                    ),
+                ),
+                (
+                    "parent",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="The parent comment for nested replies.",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="replies",
+                        to="comment.comment",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Comment",
+                "verbose_name_plural": "Comments",
+                "ordering": ["-created"],
+            },
+        ),
+    ]
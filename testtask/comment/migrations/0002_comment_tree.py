@@ -0,0 +1,74 @@
+# Generated by Django 5.1.5 on 2026-10-17 00:12
+
+from django.db import migrations, models
+from django.db.models import CharField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat, LPad
+
+
+def backfill_tree(apps, schema_editor):
+    # A frozen copy of `comment.tree.rebuild_tree`, so later changes to the helper
+    # never change what this migration does.
+    Comment = apps.get_model("comment", "Comment")
+    segment = LPad(Cast("pk", output_field=CharField()), 10, Value("0"))
+
+    Comment.objects.filter(parent__isnull=True).update(tree_id=F("pk"), depth=0, path=segment)
+    depth = 0
+    while True:
+        depth += 1
+        parents = Comment.objects.filter(pk=OuterRef("parent_id"))
+        updated = (
+            Comment.objects.filter(path="", parent__isnull=False)
+            .exclude(parent__path="")
+            .update(
+                tree_id=Subquery(parents.values("tree_id")[:1]),
+                depth=depth,
+                path=Concat(
+                    Subquery(parents.values("path")[:1]),
+                    Value("/"),
+                    segment,
+                    output_field=CharField(),
+                ),
+            )
+        )
+        if not updated:
+            return
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("comment", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="depth",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Nesting level of the comment, 0 for root comments.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="path",
+            field=models.TextField(
+                default="",
+                editable=False,
+                help_text="Materialized path of zero-padded ancestor IDs ending with the comment ID.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="tree_id",
+            field=models.BigIntegerField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="ID of the root comment of the thread this comment belongs to.",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(backfill_tree, migrations.RunPython.noop),
+    ]
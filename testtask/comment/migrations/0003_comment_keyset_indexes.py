@@ -0,0 +1,37 @@
+# Generated by Django 5.1.5 on 2026-10-17 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("comment", "0002_comment_tree"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("is_approved", True), ("parent__isnull", True)),
+                fields=["created", "id"],
+                name="comment_root_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("is_approved", True), ("parent__isnull", True)),
+                fields=["username", "id"],
+                name="comment_root_username_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("is_approved", True), ("parent__isnull", True)),
+                fields=["email", "id"],
+                name="comment_root_email_idx",
+            ),
+        ),
+    ]
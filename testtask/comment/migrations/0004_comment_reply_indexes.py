@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-17 00:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("comment", "0003_comment_keyset_indexes"),
+    ]
+
+    operations = [
+        # Create the composite indexes before dropping the single-column ones they replace.
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["parent", "-created"], name="comment_reply_parent_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["tree_id", "depth"], name="comment_tree_depth_idx"),
+        ),
+        migrations.AlterField(
+            model_name="comment",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                help_text="The parent comment for nested replies.",
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="replies",
+                to="comment.comment",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="comment",
+            name="tree_id",
+            field=models.BigIntegerField(
+                blank=True,
+                editable=False,
+                help_text="ID of the root comment of the thread this comment belongs to.",
+                null=True,
+            ),
+        ),
+    ]
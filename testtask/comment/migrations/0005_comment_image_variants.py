@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-17 00:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("comment", "0004_comment_reply_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="image_webp",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                help_text="WebP version of an image attachment, bounded to the maximum size.",
+                null=True,
+                upload_to="comments/webp/",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="thumbnail",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                help_text="Small, metadata-free version of an image attachment for list pages.",
+                null=True,
+                upload_to="comments/thumbnails/",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="thumbnail_webp",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                help_text="WebP version of the thumbnail.",
+                null=True,
+                upload_to="comments/thumbnails/",
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.5 on 2026-10-17 00:33
+
+import comment.uploads
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("comment", "0005_comment_image_variants"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="comment",
+            name="file",
+            field=models.FileField(
+                blank=True,
+                help_text="Optional file attachment. Allowed formats: txt, jpg, png, gif.",
+                null=True,
+                upload_to="comments/",
+                validators=[
+                    django.core.validators.FileExtensionValidator(
+                        allowed_extensions=["txt", "jpg", "png", "gif"]
+                    ),
+                    comment.uploads.validate_upload,
+                ],
+            ),
+        ),
+    ]
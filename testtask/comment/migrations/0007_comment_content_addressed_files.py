@@ -0,0 +1,99 @@
+# Generated by Django 5.1.5 on 2026-10-17 00:35
+
+import comment.storage
+import comment.uploads
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("comment", "0006_comment_file_upload_validation"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="comment",
+            name="file",
+            field=models.FileField(
+                blank=True,
+                help_text="Optional file attachment. Allowed formats: txt, jpg, png, gif.",
+                null=True,
+                storage=comment.storage.select_comment_storage,
+                upload_to="comments/",
+                validators=[
+                    django.core.validators.FileExtensionValidator(
+                        allowed_extensions=["txt", "jpg", "png", "gif"]
+                    ),
+                    comment.uploads.validate_upload,
+                ],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="comment",
+            name="image_webp",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                help_text="WebP version of an image attachment, bounded to the maximum size.",
+                null=True,
+                storage=comment.storage.select_comment_storage,
+                upload_to="comments/webp/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="comment",
+            name="thumbnail",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                help_text="Small, metadata-free version of an image attachment for list pages.",
+                null=True,
+                storage=comment.storage.select_comment_storage,
+                upload_to="comments/thumbnails/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="comment",
+            name="thumbnail_webp",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                help_text="WebP version of the thumbnail.",
+                null=True,
+                storage=comment.storage.select_comment_storage,
+                upload_to="comments/thumbnails/",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("file__gt", "")), fields=["file"], name="comment_file_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("thumbnail__gt", "")),
+                fields=["thumbnail"],
+                name="comment_thumbnail_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("thumbnail_webp__gt", "")),
+                fields=["thumbnail_webp"],
+                name="comment_thumbnail_webp_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("image_webp__gt", "")),
+                fields=["image_webp"],
+                name="comment_image_webp_idx",
+            ),
+        ),
+    ]
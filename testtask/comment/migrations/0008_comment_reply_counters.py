@@ -0,0 +1,80 @@
+# Generated by Django 5.1.5 on 2026-10-17 01:07
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, Greatest
+
+
+def backfill_reply_counters(apps, schema_editor):
+    # A frozen copy of `comment.tree.rebuild_reply_counters`, so later changes to the
+    # helper never change what this migration does.
+    Comment = apps.get_model("comment", "Comment")
+    children = (
+        Comment.objects.filter(parent_id=OuterRef("pk"), is_approved=True)
+        .order_by()
+        .values("parent_id")
+    )
+    descendants = (
+        Comment.objects.filter(
+            tree_id=OuterRef("tree_id"),
+            path__startswith=Concat(OuterRef("path"), Value("/")),
+            is_approved=True,
+        )
+        .order_by()
+        .values("tree_id")
+    )
+    Comment.objects.update(
+        reply_count=Coalesce(Subquery(children.annotate(count=Count("pk")).values("count")), 0),
+        descendant_count=Coalesce(
+            Subquery(descendants.annotate(count=Count("pk")).values("count")), 0
+        ),
+        last_activity=Greatest(
+            "created",
+            Coalesce(
+                Subquery(descendants.annotate(latest=Max("created")).values("latest")), "created"
+            ),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("comment", "0007_comment_content_addressed_files"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="descendant_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, help_text="Number of approved replies at any depth."
+            ),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="last_activity",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                editable=False,
+                help_text="When the comment or its latest approved reply at any depth was posted.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="reply_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, help_text="Number of approved direct replies."
+            ),
+        ),
+        migrations.RunPython(backfill_reply_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("is_approved", True), ("parent__isnull", True)),
+                fields=["last_activity", "id"],
+                name="comment_root_activity_idx",
+            ),
+        ),
+    ]
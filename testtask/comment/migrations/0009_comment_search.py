@@ -0,0 +1,70 @@
+# Generated by Django 5.1.5 on 2026-10-17 01:11
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import logging
+
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+# Admin substring searches compile to `UPPER(column::text) LIKE UPPER('%term%')`, so
+# the trigram indexes are built on the same expression.
+TRIGRAM_COLUMNS = ("username", "email")
+
+
+def create_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            # The admin keeps working with sequential scans for these two columns.
+            logger.warning("pg_trgm is not available, skipping the trigram indexes.")
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in TRIGRAM_COLUMNS:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS comment_{column}_trgm_idx ON comment_comment "
+                f"USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for column in TRIGRAM_COLUMNS:
+            cursor.execute(f"DROP INDEX IF EXISTS comment_{column}_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("comment", "0008_comment_reply_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="search_vector",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.contrib.postgres.search.CombinedSearchVector(
+                    django.contrib.postgres.search.SearchVector(
+                        "username", config="english", weight="A"
+                    ),
+                    "||",
+                    django.contrib.postgres.search.SearchVector(
+                        "text", config="english", weight="B"
+                    ),
+                    django.contrib.postgres.search.SearchConfig("english"),
+                ),
+                help_text="Weighted full-text search vector of the username and the text.",
+                output_field=django.contrib.postgres.search.SearchVectorField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="comment_search_idx"
+            ),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
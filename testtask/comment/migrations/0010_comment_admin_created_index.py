@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-17 01:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("comment", "0009_comment_search"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["created", "id"], name="comment_created_idx"),
+        ),
+    ]
@@ -1,9 +1,36 @@
+from typing import Any, List, Optional
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import FileExtensionValidator
-from django.db import models
-from django.db.models import QuerySet
+from django.db import models, transaction
+from django.db.models import F, Q, QuerySet, Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
+
+from .search import build_search_vector
+from .storage import ATTACHMENT_FIELDS, select_comment_storage
+from .tree import PATH_SEPARATOR, ReplyCounterChange, path_segment, update_reply_counters
+from .uploads import validate_upload
 
 
-class ApprovedManager(models.Manager):  # type: ignore
+class CommentManager(models.Manager):  # type: ignore
+    """
+    Manager that leaves the search vector out of loaded comments.
+    """
+
+    def get_queryset(self) -> QuerySet:  # type: ignore
+        """
+        Defers `search_vector`, which is only ever used in the WHERE clause and would
+        otherwise roughly double the size of every row read for a page.
+
+        Returns:
+            QuerySet: All comments without the search vector.
+        """
+        return super().get_queryset().defer("search_vector")
+
+
+class ApprovedManager(CommentManager):
     """
     Custom manager to retrieve only approved objects.
     """
@@ -33,13 +60,42 @@ class Comment(models.Model):
     text = models.TextField(help_text="The content of the comment.")  # type: ignore
     file = models.FileField(
         upload_to="comments/",
-        validators=[FileExtensionValidator(allowed_extensions=["txt", "jpg", "png", "gif"])],
+        storage=select_comment_storage,
+        validators=[
+            FileExtensionValidator(allowed_extensions=["txt", "jpg", "png", "gif"]),
+            validate_upload,
+        ],
         null=True,
         blank=True,
         help_text="Optional file attachment. Allowed formats: txt, jpg, png, gif.",
     )
+    thumbnail = models.ImageField(
+        upload_to="comments/thumbnails/",
+        storage=select_comment_storage,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Small, metadata-free version of an image attachment for list pages.",
+    )
+    thumbnail_webp = models.ImageField(
+        upload_to="comments/thumbnails/",
+        storage=select_comment_storage,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="WebP version of the thumbnail.",
+    )
+    image_webp = models.ImageField(
+        upload_to="comments/webp/",
+        storage=select_comment_storage,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="WebP version of an image attachment, bounded to the maximum size.",
+    )
     user_ip = models.TextField(
-        max_length=100, null=True, blank=True, help_text="The IP address of the user.")
+        max_length=100, null=True, blank=True, help_text="The IP address of the user."
+    )
     created = models.DateTimeField(
         auto_now_add=True, help_text="The timestamp when the comment was created."
     )  # type: ignore
@@ -52,21 +108,188 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         null=True,
         blank=True,
+        db_index=False,
         related_name="replies",
         help_text="The parent comment for nested replies.",
     )  # type: ignore
     is_approved = models.BooleanField(
         default=False, help_text="Indicates whether the comment is approved."
     )  # type: ignore
+    tree_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="ID of the root comment of the thread this comment belongs to.",
+    )  # type: ignore
+    depth = models.PositiveIntegerField(
+        default=0, editable=False, help_text="Nesting level of the comment, 0 for root comments."
+    )  # type: ignore
+    path = models.TextField(
+        default="",
+        editable=False,
+        help_text="Materialized path of zero-padded ancestor IDs ending with the comment ID.",
+    )  # type: ignore
+    reply_count = models.PositiveIntegerField(
+        default=0, editable=False, help_text="Number of approved direct replies."
+    )  # type: ignore
+    descendant_count = models.PositiveIntegerField(
+        default=0, editable=False, help_text="Number of approved replies at any depth."
+    )  # type: ignore
+    last_activity = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        help_text="When the comment or its latest approved reply at any depth was posted.",
+    )  # type: ignore
+    search_vector = models.GeneratedField(
+        expression=build_search_vector(),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        help_text="Weighted full-text search vector of the username and the text.",
+    )
 
     # Default and custom managers
-    objects = models.Manager()
+    objects = CommentManager()
+
     approved = ApprovedManager()
 
     class Meta:
         ordering = ["-created"]
         verbose_name = "Comment"
         verbose_name_plural = "Comments"
+        # Keyset pagination of approved root comments, one index per sort column,
+        # plus the reply and whole-thread lookups. The latter two also serve as the
+        # indexes for `parent` and `tree_id`.
+        indexes = [
+            models.Index(
+                fields=["created", "id"],
+                name="comment_root_created_idx",
+                condition=Q(is_approved=True, parent__isnull=True),
+            ),
+            models.Index(
+                fields=["username", "id"],
+                name="comment_root_username_idx",
+                condition=Q(is_approved=True, parent__isnull=True),
+            ),
+            models.Index(
+                fields=["email", "id"],
+                name="comment_root_email_idx",
+                condition=Q(is_approved=True, parent__isnull=True),
+            ),
+            models.Index(
+                fields=["last_activity", "id"],
+                name="comment_root_activity_idx",
+                condition=Q(is_approved=True, parent__isnull=True),
+            ),
+            models.Index(fields=["parent", "-created"], name="comment_reply_parent_idx"),
+            models.Index(fields=["tree_id", "depth"], name="comment_tree_depth_idx"),
+            # The admin changelist, newest first, and its date filter.
+            models.Index(fields=["created", "id"], name="comment_created_idx"),
+            # Full-text search. Username and email substring searches of the admin are
+            # served by trigram indexes created by migration 0009 where `pg_trgm` exists.
+            GinIndex(fields=["search_vector"], name="comment_search_idx"),
+        ] + [
+            # Reference lookups of shared attachment files; most comments have none.
+            models.Index(
+                fields=[field], name=f"comment_{field}_idx", condition=Q(**{f"{field}__gt": ""})
+            )
+            for field in ATTACHMENT_FIELDS
+        ]
+
+    @classmethod
+    def from_db(cls, db: Any, field_names: Any, values: Any) -> "Comment":
+        """
+        Remembers the parent the comment was loaded with to detect re-parenting on save.
+        """
+        instance: "Comment" = super().from_db(db, field_names, values)
+        instance._loaded_parent_id = instance.__dict__.get("parent_id")
+        instance._loaded_tree_id = instance.__dict__.get("tree_id")
+        instance._loaded_is_approved = instance.__dict__.get("is_approved")
+        return instance
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Saves the comment and keeps its materialized path, depth and tree ID up to date,
+        as well as the reply counters of its ancestors.
+
+        The insert and the tree update run in one transaction, so `on_commit` hooks
+        registered by signal handlers see the final tree fields.
+        """
+        is_new = self._state.adding
+        parent_changed = (
+            not is_new and getattr(self, "_loaded_parent_id", self.parent_id) != self.parent_id
+        )
+        was_approved = False if is_new else getattr(self, "_loaded_is_approved", self.is_approved)
+        old_path = self.path
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+            if is_new or parent_changed:
+                self._update_tree_fields(old_path=old_path if parent_changed else None)
+            if parent_changed or was_approved != self.is_approved:
+                update_reply_counters(
+                    type(self), self._reply_counter_changes(old_path, was_approved, parent_changed)
+                )
+        self._loaded_parent_id = self.parent_id
+        self._loaded_tree_id = self.tree_id
+        self._loaded_is_approved = self.is_approved
+
+    def _reply_counter_changes(
+        self, old_path: str, was_approved: bool, moved: bool
+    ) -> List[ReplyCounterChange]:
+        """
+        Describes how the counters of the ancestors change: the comment's old contribution
+        is withdrawn from its old ancestors and its new one added to the current ones. A
+        moved comment takes the approved replies of its subtree along.
+        """
+        subtree = self.descendant_count if moved else 0
+        changes = []
+        if old_path and (was_approved or subtree):
+            changes.append(
+                ReplyCounterChange(old_path, -int(was_approved), -int(was_approved) - subtree)
+            )
+        if self.is_approved or subtree:
+            changes.append(
+                ReplyCounterChange(
+                    self.path,
+                    int(self.is_approved),
+                    int(self.is_approved) + subtree,
+                    self.last_activity if moved else self.created,
+                )
+            )
+        return changes
+
+    def _update_tree_fields(self, old_path: Optional[str] = None) -> None:
+        """
+        Recomputes the tree fields from the parent and, when the comment was moved,
+        rewrites the paths of its whole subtree.
+
+        Args:
+            old_path (Optional[str]): The path before re-parenting, if the comment was moved.
+        """
+        if self.parent_id:
+            parent = self.parent
+            self.path = f"{parent.path}{PATH_SEPARATOR}{path_segment(self.pk)}"
+            self.tree_id = parent.tree_id
+            self.depth = parent.depth + 1
+        else:
+            self.path = path_segment(self.pk)
+            self.tree_id = self.pk
+            self.depth = 0
+
+        fields = {"path": self.path, "tree_id": self.tree_id, "depth": self.depth}
+        if old_path is None:
+            # A new comment: its `created` is only known after the insert.
+            self.last_activity = fields["last_activity"] = self.created
+
+        manager = type(self).objects
+        manager.filter(pk=self.pk).update(**fields)
+
+        if old_path:
+            old_depth = old_path.count(PATH_SEPARATOR)
+            manager.filter(path__startswith=f"{old_path}{PATH_SEPARATOR}").update(
+                path=Concat(Value(self.path), Substr("path", len(old_path) + 1)),
+                tree_id=self.tree_id,
+                depth=F("depth") + (self.depth - old_depth),
+            )
 
     def __str__(self) -> str:
         """
@@ -0,0 +1,202 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from graphene import ID, Field, Int, List as GraphQLList, NonNull, ObjectType, String
+from graphene_django import DjangoObjectType
+
+from .models import Comment
+from .pagination import CursorPaginator, get_sort_field
+from .search import visible_comments
+
+
+class ReplyLoader:
+    """
+    Batches reply lookups so a GraphQL query costs one SQL query per tree level.
+
+    Every comment handed to the loader is queued under its depth. The first time the
+    replies of any comment are needed, the replies of all queued comments at that
+    depth are fetched with a single `parent_id IN (...)` query and queued in turn, so
+    the siblings and cousins resolved afterwards are served from memory. The query
+    count of a thread is therefore bounded by its depth, not by its number of comments,
+    and at most `GRAPHQL_MAX_LIST_SIZE` approved replies are read per comment.
+
+    The executor resolves fields synchronously and depth-first, so a promise-based
+    DataLoader would not get a chance to collect keys before they are needed; queueing
+    whole levels gives the same batching without an event loop.
+    """
+
+    def __init__(self) -> None:
+        self.pending: Dict[int, Set[int]] = defaultdict(set)
+        self.replies: Dict[int, List[Comment]] = {}
+
+    def prime(self, comments: Iterable[Comment]) -> None:
+        """
+        Queues comments whose replies may be requested later.
+
+        Args:
+            comments (Iterable[Comment]): Comments already loaded by a resolver.
+        """
+        for comment in comments:
+            if comment.pk not in self.replies:
+                self.pending[comment.depth].add(comment.pk)
+
+    def load(self, comment: Comment, first: int) -> List[Comment]:
+        """
+        Returns the newest approved direct replies of a comment, newest first.
+
+        Args:
+            comment (Comment): The comment whose replies are requested.
+            first (int): The number of replies, capped at `GRAPHQL_MAX_LIST_SIZE`.
+
+        Returns:
+            List[Comment]: The replies of the comment.
+        """
+        if comment.pk not in self.replies:
+            self.prime([comment])
+            parent_ids = self.pending.pop(comment.depth)
+            batch: Dict[int, List[Comment]] = {pk: [] for pk in parent_ids}
+            newest_first = [F("created").desc(), F("id").desc()]
+            replies = (
+                Comment.approved.filter(parent_id__in=parent_ids)
+                .annotate(
+                    position=Window(RowNumber(), partition_by="parent_id", order_by=newest_first)
+                )
+                .filter(position__lte=settings.GRAPHQL_MAX_LIST_SIZE)
+                .order_by(*newest_first)
+            )
+            for reply in replies:
+                batch[reply.parent_id].append(reply)  # type: ignore
+            self.replies.update(batch)
+            for children in batch.values():
+                self.prime(children)
+        return self.replies[comment.pk][: max(1, min(first, settings.GRAPHQL_MAX_LIST_SIZE))]
+
+
+def get_reply_loader(info: Any) -> ReplyLoader:
+    """
+    Returns the reply loader of the current GraphQL request, creating it on first use.
+
+    Args:
+        info (Any): The GraphQL execution context.
+
+    Returns:
+        ReplyLoader: A loader shared by all resolvers of the request.
+    """
+    loader = getattr(info.context, "_comment_reply_loader", None)
+    if loader is None:
+        loader = ReplyLoader()
+        info.context._comment_reply_loader = loader
+    return loader
+
+
+class CommentType(DjangoObjectType):  # type: ignore
+    """
+    GraphQL type representing a comment and its nested replies.
+    """
+
+    replies = NonNull(
+        GraphQLList(NonNull(lambda: CommentType)),
+        first=Int(default_value=settings.GRAPHQL_LIST_SIZE),
+        description="The newest approved replies; `replyCount` tells whether there are more.",
+    )
+    file_url = String()
+    thumbnail_url = String()
+    cursor = String(description="Pass as `after` to fetch the root comments after this one.")
+
+    class Meta:
+        model = Comment
+        fields = (
+            "id",
+            "parent",
+            "depth",
+            "username",
+            "email",
+            "text",
+            "created",
+            "updated",
+            "reply_count",
+            "descendant_count",
+            "last_activity",
+        )
+
+    def resolve_replies(self, info: Any, first: int) -> List[Comment]:
+        return get_reply_loader(info).load(self, first)
+
+    def resolve_parent(self, info: Any) -> Optional[ID]:
+        return self.parent_id  # type: ignore
+
+    def resolve_file_url(self, info: Any) -> Optional[str]:
+        return self.file.url if self.file else None
+
+    def resolve_thumbnail_url(self, info: Any) -> Optional[str]:
+        return self.thumbnail.url if self.thumbnail else None
+
+    def resolve_cursor(self, info: Any) -> Optional[str]:
+        return getattr(self, "_cursor", None)
+
+
+class Query(ObjectType):  # type: ignore
+    """
+    Query for retrieving comments and their reply threads.
+    """
+
+    comments = NonNull(
+        GraphQLList(NonNull(CommentType)),
+        first=Int(default_value=25),
+        after=String(),
+        sort=String(default_value="created"),
+        order=String(default_value="asc"),
+        description="Approved root comments, ordered by `sort` (created, username, email, activity).",
+    )
+    comment = Field(
+        CommentType,
+        id=ID(required=True),
+        description="Retrieve an approved comment of an approved thread by ID.",
+    )
+
+    def resolve_comments(
+        self, info: Any, first: int, sort: str, order: str, after: Optional[str] = None
+    ) -> List[Comment]:
+        """
+        Resolves a page of root comments with the keyset paginator of the comment list.
+
+        Args:
+            info (Any): The GraphQL execution context.
+            first (int): The page size, capped at `GRAPHQL_MAX_LIST_SIZE`.
+            sort (str): The sort column.
+            order (str): `asc` or `desc`.
+            after (Optional[str]): The `cursor` of the last comment of the previous page.
+
+        Returns:
+            List[Comment]: The root comments of the page.
+        """
+        paginator = CursorPaginator(
+            Comment.approved.filter(parent__isnull=True),
+            get_sort_field(sort),
+            order == "desc",
+            max(1, min(first, settings.GRAPHQL_MAX_LIST_SIZE)),
+        )
+        comments = paginator.get_page(after).object_list
+        for comment in comments:
+            comment._cursor = paginator.encode_cursor(comment)
+        get_reply_loader(info).prime(comments)
+        return comments
+
+    def resolve_comment(self, info: Any, id: str) -> Optional[Comment]:
+        """
+        Resolves a single comment if it is approved and the thread it belongs to is visible.
+
+        Args:
+            info (Any): The GraphQL execution context.
+            id (str): The ID of the comment.
+
+        Returns:
+            Optional[Comment]: The comment or None if not found.
+        """
+        comment = visible_comments(Comment.objects.filter(pk=id)).first()
+        if comment is not None:
+            get_reply_loader(info).prime([comment])
+        return comment
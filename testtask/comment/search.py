@@ -0,0 +1,63 @@
+from typing import Any
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import Exists, F, FloatField, OuterRef, QuerySet
+from django.db.models.functions import Cast
+
+# Text search configuration of the search vector and of every query matched against it.
+# Changing it requires a migration of `Comment.search_vector`.
+SEARCH_CONFIG = "english"
+# Longest search term accepted from the public search.
+MAX_QUERY_LENGTH = 200
+
+
+def build_search_vector() -> Any:
+    """
+    Returns the expression `Comment.search_vector` is generated from.
+
+    The username is weighted above the text, so a search for a name ranks that user's
+    comments first. Each column gets its own `to_tsvector` with an explicit config,
+    which keeps the expression immutable as PostgreSQL requires for generated columns.
+    Email addresses are left out: they are not shown publicly and the admin finds
+    them through the trigram index instead.
+    """
+    return SearchVector("username", weight="A", config=SEARCH_CONFIG) + SearchVector(
+        "text", weight="B", config=SEARCH_CONFIG
+    )
+
+
+def build_search_query(term: str) -> SearchQuery:
+    """
+    Parses a search term with the `websearch_to_tsquery` syntax: quoted phrases, `or`
+    and `-excluded` words. Malformed input never raises, it just matches less.
+    """
+    return SearchQuery(term, config=SEARCH_CONFIG, search_type="websearch")
+
+
+def search_comments(queryset: QuerySet[Any], term: str) -> QuerySet[Any]:
+    """
+    Filters comments matching a search term through the GIN index on the search vector
+    and annotates them with their relevance as `rank`.
+
+    The rank is cast to double precision, so the value a cursor carries compares equal
+    to the one computed for the next page.
+
+    Args:
+        queryset (QuerySet): The comments to search.
+        term (str): The search term.
+
+    Returns:
+        QuerySet: The matching comments, unordered.
+    """
+    query = build_search_query(term)
+    return queryset.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+    )
+
+
+def visible_comments(queryset: QuerySet[Any]) -> QuerySet[Any]:
+    """
+    Restricts comments to approved ones in threads whose root comment is approved.
+    """
+    visible_root = queryset.model.approved.filter(pk=OuterRef("tree_id"), parent__isnull=True)
+    return queryset.filter(Exists(visible_root), is_approved=True)
@@ -0,0 +1,84 @@
+import logging
+from typing import Any
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_thread_versions
+from .events import publish_comments
+from .images import is_image_attachment
+from .models import Comment
+from .storage import ATTACHMENT_FIELDS, delete_orphaned_files
+from .task import process_comment_image
+from .tree import ReplyCounterChange, update_reply_counters
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_thread_on_save(sender: Any, instance: Comment, **kwargs: Any) -> None:
+    """
+    Invalidates the cached HTML of the thread a comment was saved to, and of the thread
+    it was moved out of, once the transaction commits.
+    """
+    previous_tree_id = getattr(instance, "_loaded_tree_id", None)
+    transaction.on_commit(lambda: bump_thread_versions([instance.tree_id, previous_tree_id]))
+
+
+@receiver(post_save, sender=Comment)
+def publish_comment_on_create(sender: Any, instance: Comment, created: bool, **kwargs: Any) -> None:
+    """
+    Pushes a new comment to the clients streaming its thread once the transaction commits.
+    """
+    if created:
+        transaction.on_commit(lambda: publish_comments([instance]))
+
+
+@receiver(post_save, sender=Comment)
+def process_image_on_save(sender: Any, instance: Comment, **kwargs: Any) -> None:
+    """
+    Schedules thumbnail and WebP generation for a newly attached image.
+    """
+    if not instance.file or instance.thumbnail or not is_image_attachment(instance.file.name):
+        return
+
+    def schedule() -> None:
+        try:
+            process_comment_image.delay(instance.pk)
+        except Exception as e:
+            logger.error("Failed to schedule image processing for %s: %s", instance.pk, e)
+
+    transaction.on_commit(schedule)
+
+
+@receiver(post_delete, sender=Comment)
+def invalidate_thread_on_delete(sender: Any, instance: Comment, **kwargs: Any) -> None:
+    """
+    Invalidates the cached HTML of the thread a comment was deleted from.
+    """
+    tree_id = instance.tree_id
+    transaction.on_commit(lambda: bump_thread_versions([tree_id]))
+
+
+@receiver(post_delete, sender=Comment)
+def update_reply_counters_on_delete(sender: Any, instance: Comment, **kwargs: Any) -> None:
+    """
+    Removes a deleted approved reply from the counters of its ancestors.
+
+    Replies deleted by the cascade are handled by their own signal, and updates of
+    ancestors deleted along with them match no rows.
+    """
+    if instance.is_approved and instance.parent_id:
+        update_reply_counters(Comment, [ReplyCounterChange(instance.path, -1, -1)])
+
+
+@receiver(post_delete, sender=Comment)
+def delete_files_on_delete(sender: Any, instance: Comment, **kwargs: Any) -> None:
+    """
+    Deletes the attachment files of a deleted comment, including replies removed by the
+    cascade, once the transaction commits and unless other comments still share them.
+    """
+    names = [getattr(instance, field).name for field in ATTACHMENT_FIELDS]
+    if any(names):
+        transaction.on_commit(lambda: delete_orphaned_files(names))
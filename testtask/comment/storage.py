@@ -0,0 +1,118 @@
+import hashlib
+import logging
+import os
+from typing import Any, Iterable, Optional
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage, storages
+from django.db import connection, transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+# Comment fields whose files live in the content-addressed storage.
+ATTACHMENT_FIELDS = ("file", "thumbnail", "thumbnail_webp", "image_webp")
+
+
+class ContentAddressedStorage(FileSystemStorage):  # type: ignore
+    """
+    File system storage that names every file after the SHA-256 of its content.
+
+    `comments/cat.jpg` is stored as `comments/<h[:2]>/<h>.jpg`, so identical uploads
+    share one file and a stored file never changes, which lets it be cached forever.
+    Files are shared between comments; use `delete_orphaned_files` instead of `delete`
+    to remove one only when nothing references it anymore.
+
+    Save files in the transaction that stores the reference to them, as `Model.save()`
+    does: the lock taken on the name is held until that reference is committed.
+    """
+
+    def save(self, name: Optional[str], content: Any, max_length: Optional[int] = None) -> str:
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        directory, file_name = os.path.split(name)
+        extension = os.path.splitext(file_name)[1].lower()
+        hexdigest = digest.hexdigest()
+        name = os.path.join(directory, hexdigest[:2], f"{hexdigest}{extension}")
+        with transaction.atomic(savepoint=False):
+            lock_stored_file(name)
+            if self.exists(name):
+                return name
+            return super().save(name, content, max_length)  # type: ignore
+
+
+def lock_stored_file(name: str) -> None:
+    """
+    Locks a stored file name until the current transaction ends.
+
+    Saving a file and deleting it as orphaned both take this lock, so a cleanup cannot
+    remove a file between a concurrent upload finding it already stored and the commit
+    of the comment referencing it: the cleanup waits for that commit and then counts
+    the new reference, or it deletes first and the upload writes the file again.
+
+    Args:
+        name (str): The stored name of the file.
+    """
+    if connection.vendor != "postgresql":
+        return
+    key = int(hashlib.sha256(name.encode()).hexdigest()[:15], 16)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [key])
+
+
+def select_comment_storage() -> Storage:
+    """
+    Returns the storage configured for comment attachments in `STORAGES["comments"]`.
+    """
+    return storages["comments"]
+
+
+def delete_orphaned_files(names: Iterable[Optional[str]]) -> int:
+    """
+    Deletes the given attachment files that no comment references anymore.
+
+    Reference counts are taken from the database rather than kept separately, so they
+    cannot drift from the comments that actually exist. The names are locked while they
+    are counted and deleted, see `lock_stored_file`.
+
+    Args:
+        names (Iterable[Optional[str]]): The stored names of files that may be orphaned.
+
+    Returns:
+        int: The number of deleted files.
+    """
+    from .models import Comment
+
+    names = {name for name in names if name}
+    if not names:
+        return 0
+
+    condition = Q()
+    for field in ATTACHMENT_FIELDS:
+        condition |= Q(**{f"{field}__in": names})
+
+    storage = select_comment_storage()
+    deleted = 0
+    with transaction.atomic():
+        # Locked in a fixed order, so two cleanups of overlapping names cannot deadlock.
+        for name in sorted(names):
+            lock_stored_file(name)
+        referenced = set()
+        for row in Comment.objects.filter(condition).values_list(*ATTACHMENT_FIELDS):
+            referenced.update(row)
+
+        for name in names - referenced:
+            try:
+                storage.delete(name)
+                deleted += 1
+            except OSError as e:
+                logger.warning("Failed to delete orphaned attachment %s: %s", name, e)
+    return deleted
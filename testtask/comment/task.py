@@ -1,34 +1,224 @@
+import json
 import logging
-from typing import List
+import time
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
 
 from celery import shared_task
-from django.core.mail import send_mail
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils.timezone import now
+from PIL import UnidentifiedImageError
+from redis.exceptions import RedisError
 
-from testtask import settings
+from geoip.utils import redis_client
+from .cache import bump_thread_versions
+from .images import create_image_variants, is_image_attachment
+from .models import Comment
+from .storage import delete_orphaned_files
 
 logger = logging.getLogger(__name__)
 
+PENDING_NOTIFICATIONS_KEY = "comment_notifications:pending"
+DIGEST_SCHEDULED_KEY = "comment_notifications:scheduled"
+# How long the "digest scheduled" flag outlives the window, so a busy worker does not
+# cause a second digest to be scheduled while the first one is still waiting to run.
+DIGEST_SCHEDULE_GRACE = 60
+
+NotificationEvent = Dict[str, Any]
+
+
+def queue_comment_notification(username: str, text: str) -> None:
+    """
+    Queues a new-comment event for the next digest email.
+
+    The first event of a window schedules `send_comment_digest` to run after
+    `COMMENT_DIGEST_WINDOW` seconds, later events only join the queue. If Redis is
+    unavailable, the event is sent on its own.
+
+    Args:
+        username (str): The username of the person who wrote the comment.
+        text (str): The text of the comment.
+    """
+    event = {"username": username, "text": text, "queued_at": time.time()}
+    window = settings.COMMENT_DIGEST_WINDOW
+    try:
+        with redis_client.pipeline() as pipe:
+            pipe.rpush(PENDING_NOTIFICATIONS_KEY, json.dumps(event))
+            pipe.set(DIGEST_SCHEDULED_KEY, 1, nx=True, ex=window + DIGEST_SCHEDULE_GRACE)
+            _, scheduled = pipe.execute()
+    except RedisError as e:
+        logger.warning("Notification queue unavailable, sending immediately: %s", e)
+        send_comment_digest.delay([event])
+        return
+
+    if scheduled:
+        try:
+            send_comment_digest.apply_async(countdown=window)
+        except Exception:
+            redis_client.delete(DIGEST_SCHEDULED_KEY)
+            raise
+
+
+def drain_notification_queue(limit: int) -> Tuple[List[NotificationEvent], int]:
+    """
+    Takes up to `limit` queued events and clears the "digest scheduled" flag.
+
+    The flag is cleared in the same transaction, so any event queued afterwards
+    schedules the next digest.
+
+    Args:
+        limit (int): The maximum number of events to take.
+
+    Returns:
+        Tuple[List[NotificationEvent], int]: The events and the number still queued.
+    """
+    with redis_client.pipeline() as pipe:
+        pipe.delete(DIGEST_SCHEDULED_KEY)
+        pipe.lrange(PENDING_NOTIFICATIONS_KEY, 0, limit - 1)
+        pipe.ltrim(PENDING_NOTIFICATIONS_KEY, limit, -1)
+        pipe.llen(PENDING_NOTIFICATIONS_KEY)
+        _, raw_events, _, remaining = pipe.execute()
+    return [json.loads(raw_event) for raw_event in raw_events], remaining
+
+
+def build_digest_messages(events: List[NotificationEvent]) -> List[EmailMessage]:
+    """
+    Groups events into digest emails of at most `COMMENT_DIGEST_MAX_EVENTS` comments.
+
+    Args:
+        events (List[NotificationEvent]): The new-comment events, oldest first.
+
+    Returns:
+        List[EmailMessage]: The digest emails.
+    """
+    remaining = iter(events)
+    messages = []
+    while chunk := list(islice(remaining, settings.COMMENT_DIGEST_MAX_EVENTS)):
+        if len(chunk) == 1:
+            subject = f"The comments were updated by {chunk[0]['username']}"
+        else:
+            subject = f"{len(chunk)} new comments"
+        body = "\n\n".join(
+            f"The user {event['username']} wrote:\n{event['text']}" for event in chunk
+        )
+        messages.append(
+            EmailMessage(
+                subject,
+                body,
+                settings.EMAIL_HOST_USER,
+                settings.COMMENT_NOTIFICATION_RECIPIENTS,
+            )
+        )
+    return messages
+
+
+@shared_task(bind=True, max_retries=5)  # type: ignore
+def send_comment_digest(
+    self: Any, events: Optional[List[NotificationEvent]] = None
+) -> Dict[str, Any]:
+    """
+    Sends queued new-comment events as digest emails over a single SMTP connection.
+
+    On failure the task is retried with exponential backoff, carrying the events it
+    already took from the queue so none are lost.
+
+    Args:
+        events (Optional[List[NotificationEvent]]): The events to send, taken from the
+            queue if not given.
+
+    Returns:
+        Dict[str, Any]: The number of events and emails sent and the batch latency.
+    """
+    remaining = 0
+    if events is None:
+        events, remaining = drain_notification_queue(settings.COMMENT_DIGEST_BATCH_SIZE)
+    if not events:
+        return {"events": 0, "emails": 0}
+
+    messages = build_digest_messages(events)
+    started = time.monotonic()
+    try:
+        with get_connection() as connection:
+            connection.send_messages(messages)
+    except Exception as e:
+        countdown = settings.COMMENT_DIGEST_RETRY_BACKOFF * 2**self.request.retries
+        logger.warning(
+            "Failed to send %d comment notification(s), retrying in %ss: %s",
+            len(events),
+            countdown,
+            e,
+        )
+        raise self.retry(args=(events,), countdown=countdown, exc=e)
+
+    if remaining:
+        send_comment_digest.delay()
+
+    stats = {
+        "events": len(events),
+        "emails": len(messages),
+        "send_seconds": time.monotonic() - started,
+        "latency_seconds": time.time() - min(event["queued_at"] for event in events),
+    }
+    logger.info(
+        "Sent %(events)d comment notification(s) in %(emails)d email(s): "
+        "%(send_seconds).3fs to send, %(latency_seconds).1fs since the first was queued.",
+        stats,
+    )
+    return stats
+
 
 @shared_task  # type: ignore
 def send_comment_notification(username: str, text: str) -> bool:
     """
-    Sends an email notification when a new comment is added.
+    Queues an email notification for a new comment.
+
+    Kept for tasks enqueued before notifications were sent as digests.
 
     Args:
         username (str): The username of the person who wrote the comment.
         text (str): The text of the comment.
 
     Returns:
-        bool: True if the email was sent successfully, False otherwise.
+        bool: True once the notification is queued.
+    """
+    queue_comment_notification(username, text)
+    return True
+
+
+@shared_task(bind=True, max_retries=3)  # type: ignore
+def process_comment_image(self: Any, comment_id: int) -> bool:
+    """
+    Creates the thumbnail and WebP variants of a comment's image attachment.
+
+    The cached HTML of the comment's thread is invalidated afterwards, so list pages
+    switch to the small variants.
+
+    Args:
+        comment_id (int): The ID of the comment.
+
+    Returns:
+        bool: True if the variants were created, False if there was nothing to process.
     """
-    subject = f"The comments were updated by {username}"
-    message = f"The user {username} wrote:\n{text}"
-    recipients: List[str] = ["danya.tkachenko.1997@gmail.com"]
+    comment = Comment.objects.filter(pk=comment_id).first()
+    if comment is None or not comment.file or not is_image_attachment(comment.file.name):
+        return False
 
+    original = comment.file.name
     try:
-        send_mail(subject, message, settings.EMAIL_HOST_USER, recipients)
-        return True
-    except Exception as e:
-        # Log the error (replace with proper logging in production)
-        print(f"Error sending email: {e}")
+        # The variants are stored and referenced in one transaction, which keeps them
+        # locked against concurrent orphan cleanups until the references are committed.
+        with transaction.atomic():
+            variants = create_image_variants(comment.file)
+            Comment.objects.filter(pk=comment_id).update(**variants, updated=now())
+    except (UnidentifiedImageError, ValueError) as e:
+        logger.warning("Cannot process the image of comment %s: %s", comment_id, e)
         return False
+    except OSError as e:
+        raise self.retry(countdown=30 * 2**self.request.retries, exc=e)
+
+    if variants["file"] != original:
+        delete_orphaned_files([original])
+    bump_thread_versions([comment.tree_id])
+    return True
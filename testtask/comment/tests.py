@@ -1,10 +1,52 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from io import BytesIO, StringIO
+from typing import Any, Dict, List, Optional, Tuple
+from unittest import mock
+
+from asgiref.sync import sync_to_async
 from captcha.models import CaptchaStore
+from django.contrib.auth.models import User
 from django.contrib.messages import get_messages
-from django.test import Client, TestCase
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopUpload
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F, QuerySet
+from django.test import (
+    AsyncClient,
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from fakeredis import FakeAsyncRedis, FakeServer, FakeStrictRedis
+from PIL import Image
+
+from testtask.ratelimit import get_rate_limit_backend
 
+from . import events, task
+from .cache import get_thread_versions
 from .form import CommentForm
 from .models import Comment
+from .pagination import CURSOR_SORT_FIELDS, CursorPaginator, EstimatedCountPaginator
+from .storage import delete_orphaned_files
+from .transfer import CommentImportError, export_comments, import_comments
+from .tree import path_segment
+from .uploads import CommentUploadHandler, RejectedUploadedFile, get_uploaded_files
+from .utils import CleanHTMLCache, clean_html
 
 
 class IndexViewTests(TestCase):
@@ -122,3 +164,1264 @@ class IndexViewTests(TestCase):
 
         self.assertEqual(Comment.objects.count(), 1)  # No new comment should be created
         self.assertEqual(response.status_code, 302)
+
+    @override_settings(
+        RATE_LIMIT_BACKEND="testtask.ratelimit.InMemoryRateLimitBackend",
+        RATE_LIMITS={"comment_preview": {"limit": 2, "window": 60, "key": "user_or_ip"}},
+    )
+    def test_preview_is_rate_limited(self) -> None:
+        """
+        Test that previews over the limit are rejected with 429 and a Retry-After header.
+        """
+        get_rate_limit_backend().clear()  # type: ignore
+        data = {"username": "tester", "email": "tester@gmail.com", "text": "Preview"}
+
+        responses = [self.client.post(reverse("preview_message"), data) for _ in range(3)]
+
+        self.assertEqual([response.status_code for response in responses], [200, 200, 429])
+        self.assertGreater(int(responses[-1]["Retry-After"]), 0)
+
+
+class CommentTreeTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Set up a root comment with a chain of nested replies.
+        """
+        self.root = Comment.objects.create(
+            username="root", email="root@gmail.com", text="Root comment", is_approved=True
+        )
+        self.chain = [self.root]
+        for depth in range(1, 4):
+            self.chain.append(
+                Comment.objects.create(
+                    username=f"reply{depth}",
+                    email="reply@gmail.com",
+                    text="Nested reply",
+                    parent=self.chain[-1],
+                    is_approved=True,
+                )
+            )
+
+    def test_tree_fields_are_maintained_on_save(self) -> None:
+        """
+        Test that new comments get their tree ID, depth and materialized path on save.
+        """
+        leaf = Comment.objects.get(pk=self.chain[-1].pk)
+
+        self.assertEqual(leaf.tree_id, self.root.pk)
+        self.assertEqual(leaf.depth, 3)
+        self.assertEqual(leaf.path, "/".join(path_segment(c.pk) for c in self.chain))
+
+    def test_reparenting_moves_the_subtree(self) -> None:
+        """
+        Test that moving a reply to another thread rewrites the paths of its descendants.
+        """
+        other_root = Comment.objects.create(
+            username="other", email="other@gmail.com", text="Other root", is_approved=True
+        )
+        moved = Comment.objects.get(pk=self.chain[2].pk)
+        moved.parent = other_root
+        moved.save()
+
+        leaf = Comment.objects.get(pk=self.chain[-1].pk)
+        self.assertEqual(leaf.tree_id, other_root.pk)
+        self.assertEqual(leaf.depth, 2)
+        self.assertEqual(
+            leaf.path,
+            "/".join(path_segment(pk) for pk in (other_root.pk, moved.pk, leaf.pk)),
+        )
+
+    def test_rebuild_command_restores_tree_fields(self) -> None:
+        """
+        Test that the rebuild command recomputes tree fields from parent links.
+        """
+        Comment.objects.update(tree_id=None, depth=0, path="")
+
+        call_command("rebuild_comment_tree", stdout=StringIO())
+
+        leaf = Comment.objects.get(pk=self.chain[-1].pk)
+        self.assertEqual(leaf.tree_id, self.root.pk)
+        self.assertEqual(leaf.depth, 3)
+        self.assertEqual(leaf.path, "/".join(path_segment(c.pk) for c in self.chain))
+
+    def test_list_view_query_count_does_not_depend_on_depth(self) -> None:
+        """
+        Test that rendering deep threads does not issue a query per nested reply.
+        """
+        url = reverse("index")
+        with CaptureQueriesContext(connection) as shallow:
+            self.client.get(url)
+
+        parent = self.chain[-1]
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(10):
+                parent = Comment.objects.create(
+                    username="deep", email="deep@gmail.com", text="Deep reply", parent=parent
+                )
+        with CaptureQueriesContext(connection) as deep:
+            response = self.client.get(url)
+
+        self.assertEqual(len(deep), len(shallow))
+        self.assertContains(response, "Deep reply", count=10)
+
+
+class ReplyCounterTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Set up two threads, one with an approved reply and an unapproved nested reply.
+        """
+        self.root = Comment.objects.create(
+            username="root", email="root@gmail.com", text="Root", is_approved=True
+        )
+        self.other_root = Comment.objects.create(
+            username="other", email="other@gmail.com", text="Other root", is_approved=True
+        )
+        self.reply = Comment.objects.create(
+            username="reply",
+            email="reply@gmail.com",
+            text="Reply",
+            parent=self.root,
+            is_approved=True,
+        )
+        self.nested = Comment.objects.create(
+            username="nested", email="nested@gmail.com", text="Nested", parent=self.reply
+        )
+
+    def counters(self, comment: Comment) -> Tuple[int, int]:
+        comment.refresh_from_db()
+        return comment.reply_count, comment.descendant_count
+
+    def test_counters_follow_approvals_moves_and_deletes(self) -> None:
+        """
+        Test that only approved replies are counted, and that approving, moving and
+        deleting replies update the counters and last activity of their ancestors.
+        """
+        self.assertEqual(self.counters(self.root), (1, 1))
+        self.assertEqual(self.counters(self.reply), (0, 0))
+        self.assertEqual(self.root.last_activity, self.reply.created)
+
+        self.nested.is_approved = True
+        self.nested.save()
+        self.assertEqual(self.counters(self.root), (1, 2))
+        self.assertEqual(self.counters(self.reply), (1, 1))
+        self.assertEqual(self.root.last_activity, self.nested.created)
+
+        self.reply.parent = self.other_root
+        self.reply.save()
+        self.assertEqual(self.counters(self.root), (0, 0))
+        self.assertEqual(self.counters(self.other_root), (1, 2))
+        self.assertEqual(self.other_root.last_activity, self.nested.created)
+
+        # The move rewrote the path of the nested reply in the database only.
+        self.nested.refresh_from_db()
+        self.nested.delete()
+        self.assertEqual(self.counters(self.other_root), (1, 1))
+        self.assertEqual(self.counters(self.reply), (0, 0))
+
+    def test_admin_approval_and_repair_command(self) -> None:
+        """
+        Test that the admin approval action counts the approved replies, and that the
+        repair command restores corrupted counters.
+        """
+        self.client.force_login(User.objects.create_superuser("admin", "admin@gmail.com", "pw"))
+        self.client.post(
+            reverse("admin:comment_comment_changelist"),
+            {"action": "approve_comments", "_selected_action": [self.nested.pk]},
+        )
+        self.assertEqual(self.counters(self.root), (1, 2))
+
+        expected = list(
+            Comment.objects.order_by("pk").values_list(
+                "reply_count", "descendant_count", "last_activity"
+            )
+        )
+        Comment.objects.update(reply_count=7, descendant_count=7, last_activity=F("updated"))
+        call_command("rebuild_reply_counters", stdout=StringIO())
+
+        self.assertEqual(
+            list(
+                Comment.objects.order_by("pk").values_list(
+                    "reply_count", "descendant_count", "last_activity"
+                )
+            ),
+            expected,
+        )
+
+    def test_list_can_be_sorted_by_activity(self) -> None:
+        """
+        Test that `sort=activity` puts the thread with the latest reply first.
+        """
+        Comment.objects.create(
+            username="late",
+            email="late@gmail.com",
+            text="Late reply",
+            parent=self.other_root,
+            is_approved=True,
+        )
+
+        response = self.client.get(reverse("index"), {"sort": "activity", "order": "desc"})
+
+        roots = [comment.pk for comment in response.context["comments"]]
+        self.assertEqual(roots, [self.other_root.pk, self.root.pk])
+        self.assertContains(response, "1 reply", count=2)
+
+
+class CommentSearchTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Set up comments to search for through the admin.
+        """
+        self.python = Comment.objects.create(
+            username="alice", email="alice@gmail.com", text="<p>Typing in Python</p>"
+        )
+        self.rust = Comment.objects.create(
+            username="bob", email="bob@example.com", text="Ownership in Rust"
+        )
+        self.client.force_login(User.objects.create_superuser("admin", "admin@gmail.com", "pw"))
+
+    def admin_search(self, term: str) -> List[int]:
+        response = self.client.get(reverse("admin:comment_comment_changelist"), {"q": term})
+        return sorted(comment.pk for comment in response.context["cl"].result_list)
+
+    def test_admin_searches_text_words_and_address_substrings(self) -> None:
+        """
+        Test that the admin matches stemmed text words and partial usernames and emails.
+        """
+        self.assertEqual(self.admin_search("types python"), [self.python.pk])
+        self.assertEqual(self.admin_search("example.co"), [self.rust.pk])
+        self.assertEqual(self.admin_search("LIC"), [self.python.pk])
+        # Stop words of the text are not indexed.
+        self.assertEqual(self.admin_search("in"), [])
+
+    def test_search_vector_follows_edits_and_is_not_loaded(self) -> None:
+        """
+        Test that the generated search vector reflects edits without loading it with rows.
+        """
+        self.rust.text = "Lifetimes in Rust"
+        self.rust.save()
+
+        self.assertEqual(self.admin_search("lifetime"), [self.rust.pk])
+        self.assertEqual(self.admin_search("ownership"), [])
+        self.assertIn("search_vector", Comment.objects.get(pk=self.rust.pk).get_deferred_fields())
+
+
+class CommentAdminChangelistTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Set up a thread with unapproved replies and a logged-in superuser.
+        """
+        self.root = Comment.objects.create(
+            username="root", email="root@gmail.com", text="Root " * 40, is_approved=True
+        )
+        self.replies = [
+            Comment.objects.create(
+                username=f"reply{index}", email="reply@gmail.com", text="Reply", parent=self.root
+            )
+            for index in range(5)
+        ]
+        self.client.force_login(User.objects.create_superuser("admin", "admin@gmail.com", "pw"))
+        self.url = reverse("admin:comment_comment_changelist")
+
+    def test_changelist_estimates_large_counts_and_reads_snippets(self) -> None:
+        """
+        Test that counts above the limit are estimated and snippets are shown.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.context["cl"].result_count, 6)
+        self.assertContains(response, ">Root Root Root Root Root Root Root Root Root Root ...<")
+        self.assertContains(response, 'aria-label="Select this object for an action - root: Root')
+
+        with mock.patch.object(EstimatedCountPaginator, "estimate_count", return_value=50_000):
+            with override_settings(COMMENT_ADMIN_EXACT_COUNT_LIMIT=1000):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(self.url, {"is_approved__exact": "0"})
+        self.assertEqual(response.context["cl"].result_count, 50_000)
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+
+    @override_settings(COMMENT_ADMIN_APPROVE_BATCH_SIZE=2)
+    def test_bulk_approval_runs_in_batches(self) -> None:
+        """
+        Test that approving a whole selection updates it batch by batch.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.url,
+                {
+                    "action": "approve_comments",
+                    "select_across": "1",
+                    "index": "0",
+                    "_selected_action": [self.root.pk],
+                },
+                follow=True,
+            )
+
+        self.assertContains(response, "5 comment(s) successfully approved.")
+        self.assertFalse(Comment.objects.filter(is_approved=False).exists())
+        self.root.refresh_from_db()
+        self.assertEqual((self.root.reply_count, self.root.descendant_count), (5, 5))
+        approvals = [
+            query
+            for query in queries
+            if query["sql"].startswith('UPDATE "comment_comment" SET "is_approved"')
+        ]
+        self.assertEqual(len(approvals), 3)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Set up approved root comments sharing usernames to exercise the id tie-breaker.
+        """
+        for index in range(10):
+            Comment.objects.create(
+                username=f"user{index % 3}",
+                email=f"user{index}@gmail.com",
+                text="Root comment",
+                is_approved=True,
+            )
+        self.queryset = Comment.approved.filter(parent__isnull=True)
+
+    def test_walks_all_pages_forward_and_back(self) -> None:
+        """
+        Test that following next cursors yields every comment once, in order,
+        and that previous cursors return to the earlier page.
+        """
+        paginator = CursorPaginator(self.queryset, "username", True, per_page=3)
+        expected = list(self.queryset.order_by("-username", "-id"))
+
+        pages = [paginator.get_page()]
+        while pages[-1].has_next:
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+
+        self.assertEqual([c for page in pages for c in page], expected)
+        self.assertFalse(pages[0].has_previous)
+        back = paginator.get_page(pages[2].previous_cursor)
+        self.assertEqual(back.object_list, pages[1].object_list)
+
+    async def test_async_pages_match_sync_pages(self) -> None:
+        """
+        Test that `aget_page` walks the same pages as `get_page`, including backwards.
+        """
+        paginator = CursorPaginator(self.queryset, "created", False, per_page=4)
+        first = await paginator.aget_page()
+        second = await paginator.aget_page(first.next_cursor)
+        back = await paginator.aget_page(second.previous_cursor)
+
+        expected = await sync_to_async(paginator.get_page)(first.next_cursor)
+        self.assertEqual(second.object_list, expected.object_list)
+        self.assertEqual(second.next_cursor, expected.next_cursor)
+        self.assertEqual(back.object_list, first.object_list)
+
+    def test_invalid_or_foreign_cursor_returns_first_page(self) -> None:
+        """
+        Test that malformed cursors and cursors of another ordering are ignored.
+        """
+        by_email = CursorPaginator(self.queryset, "email", False, per_page=3)
+        by_created = CursorPaginator(self.queryset, "created", False, per_page=3)
+        foreign_cursor = by_email.get_page().next_cursor
+
+        first_page = by_created.get_page().object_list
+        self.assertEqual(by_created.get_page("not-a-cursor").object_list, first_page)
+        self.assertEqual(by_created.get_page(foreign_cursor).object_list, first_page)
+
+        email_page = by_email.get_page().object_list
+        for value in (123, {"a": 1}, None):
+            payload = {"s": "email", "d": False, "v": value, "id": 1}
+            raw = json.dumps(payload).encode()
+            cursor = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+            self.assertEqual(by_email.get_page(cursor).object_list, email_page)
+
+    def test_list_view_does_not_count_comments(self) -> None:
+        """
+        Test that the cursor-paginated list view issues no COUNT(*) queries.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("index"), {"sort": "email", "order": "desc"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+
+    @override_settings(COMMENT_PAGINATION_MODE="offset")
+    def test_offset_mode_is_still_available(self) -> None:
+        """
+        Test that the classic page-number pagination can be enabled via settings.
+        """
+        response = self.client.get(reverse("index"), {"page": 1})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["paginator"].count, 10)
+
+
+class CommentIndexUsageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """
+        Seed a large comment table and refresh the planner statistics.
+        """
+        roots = Comment.objects.bulk_create(
+            Comment(
+                username=f"user{index % 500}",
+                email=f"user{index}@gmail.com",
+                text="Root comment",
+                is_approved=index % 4 != 0,
+            )
+            for index in range(20000)
+        )
+        Comment.objects.filter(parent__isnull=True).update(tree_id=F("pk"))
+        Comment.objects.bulk_create(
+            Comment(
+                username="replier",
+                email="replier@gmail.com",
+                text="Reply",
+                is_approved=True,
+                parent=roots[index % 2000],
+                tree_id=roots[index % 2000].pk,
+                depth=1,
+            )
+            for index in range(20000)
+        )
+        cls.roots = roots[:25]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE comment_comment")
+
+    def plan_nodes(self, queryset: QuerySet[Comment]) -> List[Dict[str, Any]]:
+        """
+        Returns the nodes of the query plan, from the top down.
+        """
+        nodes = [json.loads(queryset.explain(format="json"))[0]["Plan"]]
+        for node in nodes:
+            nodes.extend(node.get("Plans", []))
+        return nodes
+
+    def assertUsesIndex(self, queryset: QuerySet[Comment], index_name: str) -> Dict[str, Any]:
+        """
+        Asserts that the top index scan of the plan reads the given index and that no
+        table is scanned sequentially, and returns the index scan.
+        """
+        nodes = self.plan_nodes(queryset)
+        self.assertNotIn("Seq Scan", [node["Node Type"] for node in nodes])
+        scan = next(node for node in nodes if "Index Name" in node)
+        self.assertEqual(scan["Index Name"], index_name, scan)
+        return scan
+
+    def assertKeysetScan(
+        self, queryset: QuerySet[Comment], index_name: str, bound: str = ""
+    ) -> None:
+        """
+        Asserts that the page is read in index order from the given index, starting at
+        an `Index Cond` on `bound` if given, without filtering or sorting any rows.
+        """
+        scan = self.assertUsesIndex(queryset, index_name)
+        self.assertIn(scan["Node Type"], ("Index Scan", "Index Only Scan"))
+        self.assertNotIn("Filter", scan)
+        self.assertNotIn("Sort", [node["Node Type"] for node in self.plan_nodes(queryset)])
+        if bound:
+            self.assertIn(bound, scan.get("Index Cond", ""))
+
+    def test_root_list_uses_index_scans(self) -> None:
+        """
+        Test that every sort order of the root list is read from its index, with deep
+        cursor pages starting at an index bound rather than at the first row.
+        """
+        indexes = {
+            "created": "comment_root_created_idx",
+            "username": "comment_root_username_idx",
+            "email": "comment_root_email_idx",
+            "last_activity": "comment_root_activity_idx",
+        }
+        roots = Comment.approved.filter(parent__isnull=True)
+        for field in CURSOR_SORT_FIELDS:
+            for descending in (False, True):
+                with self.subTest(field=field, descending=descending):
+                    paginator = CursorPaginator(roots, field, descending, per_page=25)
+                    ordering = paginator._ordering()
+                    self.assertKeysetScan(roots.order_by(*ordering)[:26], indexes[field])
+                    for offset in (100, 10000):
+                        boundary = roots.order_by(*ordering)[offset]
+                        after = paginator._after(getattr(boundary, field), boundary.pk, descending)
+                        self.assertKeysetScan(
+                            roots.filter(after).order_by(*ordering)[:26], indexes[field], field
+                        )
+
+    def test_cursor_pages_follow_each_other(self) -> None:
+        """
+        Test that walking a deep cursor returns the same rows as an OFFSET would.
+        """
+        roots = Comment.approved.filter(parent__isnull=True)
+        paginator = CursorPaginator(roots, "username", False, per_page=25)
+        boundary = roots.order_by(*paginator._ordering())[9999]
+        page = paginator.get_page(paginator.encode_cursor(boundary))
+
+        expected = list(roots.order_by(*paginator._ordering())[10000:10025])
+        self.assertEqual(page.object_list, expected)
+
+    def test_reply_queries_use_index_scans(self) -> None:
+        """
+        Test that fetching the replies of a comment and the replies of a page of
+        threads are answered from their indexes.
+        """
+        root = self.roots[0]
+
+        self.assertUsesIndex(
+            Comment.objects.filter(parent=root).order_by("-created"), "comment_reply_parent_idx"
+        )
+        self.assertUsesIndex(
+            Comment.objects.filter(
+                tree_id__in=[root.pk for root in self.roots], depth__gt=0
+            ).order_by("depth", "-created", "-id"),
+            "comment_tree_depth_idx",
+        )
+
+
+class ThreadFragmentCacheTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Set up two threads and an empty cache.
+        """
+        cache.clear()
+        self.url = reverse("index")
+        self.root = Comment.objects.create(
+            username="root", email="root@gmail.com", text="Cached thread", is_approved=True
+        )
+        self.other = Comment.objects.create(
+            username="other", email="other@gmail.com", text="Other thread", is_approved=True
+        )
+        self.reply = Comment.objects.create(
+            username="reply", email="reply@gmail.com", text="First reply", parent=self.root
+        )
+
+    def test_unchanged_threads_are_served_from_cache(self) -> None:
+        """
+        Test that a second request does not re-render or re-query unchanged threads.
+        """
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        self.assertTemplateNotUsed(response, "includes/comment_item.html")
+        self.assertFalse(any('"tree_id" IN' in query["sql"] for query in queries))
+        self.assertContains(response, "First reply")
+
+    def test_saving_a_reply_rerenders_only_its_thread(self) -> None:
+        """
+        Test that adding and editing replies invalidates only the affected thread.
+        """
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                username="late", email="late@gmail.com", text="Late reply", parent=self.reply
+            )
+            self.reply.text = "Edited reply"
+            self.reply.save()
+
+        response = self.client.get(self.url)
+
+        self.assertContains(response, "Late reply")
+        self.assertContains(response, "Edited reply")
+        rendered = [t.name for t in response.templates].count("includes/comment_item.html")
+        self.assertEqual(rendered, 3)  # root, edited reply and the new nested reply
+
+    def test_deleting_a_reply_invalidates_its_thread(self) -> None:
+        """
+        Test that deleting a reply removes it from the cached thread.
+        """
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reply.delete()
+
+        self.assertNotContains(self.client.get(self.url), "First reply")
+
+    def test_admin_approval_invalidates_threads(self) -> None:
+        """
+        Test that approving comments through the admin action bumps thread versions.
+        """
+        admin_user = User.objects.create_superuser("admin", "admin@gmail.com", "password")
+        self.client.force_login(admin_user)
+        before = get_thread_versions([self.root.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("admin:comment_comment_changelist"),
+                {"action": "approve_comments", "_selected_action": [self.reply.pk]},
+            )
+
+        self.assertTrue(Comment.objects.get(pk=self.reply.pk).is_approved)
+        self.assertNotEqual(get_thread_versions([self.root.pk]), before)
+
+
+class CommentTransferTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Set up two threads, one with nested replies, and a temporary export file.
+        """
+        self.root = Comment.objects.create(
+            username="root", email="root@gmail.com", text="Root", is_approved=True
+        )
+        parent = self.root
+        for depth in range(1, 4):
+            parent = Comment.objects.create(
+                username=f"reply{depth}", email="reply@gmail.com", text="Reply", parent=parent
+            )
+        Comment.objects.create(
+            username="other", email="other@gmail.com", text="Other", file="comments/a.txt"
+        )
+        Comment.objects.filter(username="root").update(created="2024-01-01T00:00:00Z")
+
+        handle, self.path = tempfile.mkstemp(suffix=".jsonl.gz")
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def test_export_import_round_trip(self) -> None:
+        """
+        Test that an export imported in small batches restores the threads with new IDs.
+        """
+        call_command("export_comments", self.path, stderr=StringIO())
+        old_ids = set(Comment.objects.values_list("id", flat=True))
+        Comment.objects.all().delete()
+
+        call_command("import_comments", self.path, batch_size=2, stdout=StringIO())
+
+        comments = {comment.username: comment for comment in Comment.objects.all()}
+        self.assertEqual(len(comments), 5)
+        self.assertFalse(old_ids & {comment.pk for comment in comments.values()})
+        self.assertEqual(comments["root"].created.year, 2024)
+        self.assertEqual(comments["other"].file.name, "comments/a.txt")
+        self.assertEqual(comments["reply1"].parent_id, comments["root"].pk)
+        self.assertEqual(comments["reply3"].parent_id, comments["reply2"].pk)
+        self.assertEqual(comments["reply3"].tree_id, comments["root"].pk)
+        self.assertEqual(comments["reply3"].depth, 3)
+        self.assertEqual(
+            comments["reply3"].path,
+            "/".join(
+                path_segment(comments[name].pk) for name in ("root", "reply1", "reply2", "reply3")
+            ),
+        )
+
+    def test_reply_before_its_parent_is_rejected(self) -> None:
+        """
+        Test that an import whose replies cannot be linked fails without partial writes.
+        """
+        lines = StringIO()
+        export_comments(lines)
+        reordered = [line for line in lines.getvalue().splitlines() if '"depth": 0' not in line]
+        Comment.objects.all().delete()
+
+        with self.assertRaises(CommentImportError):
+            with transaction.atomic():
+                import_comments(reordered)
+        self.assertFalse(Comment.objects.exists())
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    COMMENT_DIGEST_WINDOW=30,
+    COMMENT_DIGEST_MAX_EVENTS=2,
+    COMMENT_NOTIFICATION_RECIPIENTS=["admin@example.com"],
+)
+class NotificationDigestTests(SimpleTestCase):
+    def setUp(self) -> None:
+        """
+        Route the notification queue to a fake Redis server and stub out scheduling.
+        """
+        self.redis = FakeStrictRedis(server=FakeServer())
+        patches = [
+            mock.patch.object(task, "redis_client", self.redis),
+            mock.patch.object(task.send_comment_digest, "apply_async"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        mail.outbox = []
+
+    def test_events_are_coalesced_into_digests(self) -> None:
+        """
+        Test that a burst schedules one digest, sent as emails over a single connection.
+        """
+        for index in range(3):
+            task.queue_comment_notification(f"user{index}", f"Comment {index}")
+
+        task.send_comment_digest.apply_async.assert_called_once_with(countdown=30)
+        with mock.patch.object(task, "get_connection", wraps=task.get_connection) as connect:
+            stats = task.send_comment_digest.apply().get()
+
+        connect.assert_called_once()
+        self.assertEqual((stats["events"], stats["emails"]), (3, 2))
+        self.assertEqual(
+            [message.subject for message in mail.outbox],
+            [
+                "2 new comments",
+                "The comments were updated by user2",
+            ],
+        )
+        self.assertIn("The user user0 wrote:\nComment 0", mail.outbox[0].body)
+        self.assertEqual(self.redis.llen(task.PENDING_NOTIFICATIONS_KEY), 0)
+
+        task.queue_comment_notification("late", "After the digest")
+        self.assertEqual(task.send_comment_digest.apply_async.call_count, 2)
+
+    def test_failed_send_is_retried_with_the_events(self) -> None:
+        """
+        Test that a failed send retries with backoff and keeps the drained events.
+        """
+        task.queue_comment_notification("user", "Comment")
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=OSError("SMTP down"),
+        ), mock.patch.object(
+            task.send_comment_digest, "retry", return_value=RuntimeError("retry")
+        ) as retry:
+            result = task.send_comment_digest.apply()
+
+        self.assertIsInstance(result.result, RuntimeError)
+        events = retry.call_args.kwargs["args"][0]
+        self.assertEqual(events[0]["username"], "user")
+        self.assertEqual(retry.call_args.kwargs["countdown"], 30)
+
+
+def make_image(size: Tuple[int, int], image_format: str = "JPEG") -> bytes:
+    """
+    Encodes a solid image with an EXIF camera tag.
+    """
+    exif = Image.Exif()
+    exif[0x0110] = "Test camera"
+    buffer = BytesIO()
+    Image.new("RGB", size, "red").save(buffer, image_format, exif=exif)
+    return buffer.getvalue()
+
+
+@override_settings(COMMENT_IMAGE_MAX_SIZE=(800, 800), COMMENT_THUMBNAIL_SIZE=(320, 240))
+class ImageProcessingTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Store uploads in a temporary media directory.
+        """
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def create_comment(self, name: str, content: bytes) -> Comment:
+        """
+        Creates an approved comment with the given attachment.
+        """
+        return Comment.objects.create(
+            username="tester",
+            email="tester@gmail.com",
+            text="With attachment",
+            is_approved=True,
+            file=SimpleUploadedFile(name, content),
+        )
+
+    def test_variants_are_bounded_and_stripped(self) -> None:
+        """
+        Test that large images are scaled down, lose their metadata and get small variants.
+        """
+        with mock.patch.object(task.process_comment_image, "delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                comment = self.create_comment("photo.jpg", make_image((3200, 1600)))
+        delay.assert_called_once_with(comment.pk)
+        original = comment.file.name
+
+        self.assertTrue(task.process_comment_image.apply(args=(comment.pk,)).get())
+
+        comment.refresh_from_db()
+        self.assertNotEqual(comment.file.name, original)
+        self.assertFalse(comment.file.storage.exists(original))
+        with Image.open(comment.file) as image:
+            self.assertEqual(image.size, (800, 400))
+            self.assertEqual(len(image.getexif()), 0)
+        with Image.open(comment.thumbnail) as image:
+            self.assertEqual((image.format, image.size), ("JPEG", (320, 160)))
+        with Image.open(comment.thumbnail_webp) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (320, 160)))
+        with Image.open(comment.image_webp) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (800, 400)))
+        self.assertContains(self.client.get(reverse("index")), comment.thumbnail_webp.url)
+
+    def test_non_images_are_skipped(self) -> None:
+        """
+        Test that text attachments and unreadable images are left untouched.
+        """
+        text = self.create_comment("notes.txt", b"plain text")
+        broken = self.create_comment("broken.png", b"not an image")
+
+        self.assertFalse(task.process_comment_image.apply(args=(text.pk,)).get())
+        self.assertFalse(task.process_comment_image.apply(args=(broken.pk,)).get())
+        broken.refresh_from_db()
+        self.assertFalse(broken.thumbnail)
+
+
+@override_settings(
+    RATE_LIMIT_BACKEND="testtask.ratelimit.InMemoryRateLimitBackend",
+    COMMENT_UPLOAD_MAX_SIZE=200 * 1024,
+    COMMENT_TEXT_UPLOAD_MAX_SIZE=1024,
+)
+class UploadValidationTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Start every test with an empty rate limiter.
+        """
+        get_rate_limit_backend().clear()  # type: ignore
+
+    def preview(self, name: str, content: bytes) -> Dict[str, Any]:
+        """
+        Posts a comment preview with the given attachment and returns the form errors.
+        """
+        data = {
+            "username": "tester",
+            "email": "tester@gmail.com",
+            "text": "With attachment",
+            "file": SimpleUploadedFile(name, content),
+        }
+        response = self.client.post(reverse("preview_message"), data)
+        return response.json().get("errors", {})  # type: ignore
+
+    def test_valid_uploads_are_accepted(self) -> None:
+        """
+        Test that images matching their extension and UTF-8 text files pass.
+        """
+        self.assertEqual(self.preview("photo.png", make_image((10, 10), "PNG")), {})
+        self.assertEqual(self.preview("notes.txt", "Привіт".encode()), {})
+
+    def test_oversized_uploads_are_rejected(self) -> None:
+        """
+        Test that files over their size limit are rejected, with a lower limit for text.
+        """
+        self.assertIn("too large", self.preview("notes.txt", b"a" * 2048)["file"][0])
+        self.assertIn(
+            "too large", self.preview("photo.png", b"\x89PNG\r\n\x1a\n" * 30000)["file"][0]
+        )
+
+    def test_content_must_match_the_extension(self) -> None:
+        """
+        Test that the magic bytes and text encoding are checked, not just the name.
+        """
+        self.assertIn("does not match", self.preview("photo.png", make_image((10, 10)))["file"][0])
+        self.assertIn("does not match", self.preview("photo.gif", b"GIF")["file"][0])
+        self.assertIn("UTF-8", self.preview("notes.txt", b"\xff\xfe\x00")["file"][0])
+
+    def test_rejected_upload_is_not_written(self) -> None:
+        """
+        Test that the handler stops the upload as soon as the limit is exceeded.
+        """
+        request = RequestFactory().post("/")
+        handler = CommentUploadHandler(request)
+        handler.new_file("file", "notes.txt", "text/plain", None)
+        handler.receive_data_chunk(b"a" * 1000, 0)
+        temporary_path = handler.file.temporary_file_path()
+
+        with self.assertRaises(StopUpload) as stop:
+            handler.receive_data_chunk(b"a" * 1000, 1000)
+        self.assertTrue(stop.exception.connection_reset)
+        self.assertFalse(os.path.exists(temporary_path))
+        self.assertIsInstance(request.rejected_uploads["file"], RejectedUploadedFile)
+        self.assertIn("too large", get_uploaded_files(request)["file"].error)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Store attachments in a temporary media directory.
+        """
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def create_comment(self, name: str, content: bytes, parent: Any = None) -> Comment:
+        """
+        Creates a comment with the given attachment.
+        """
+        return Comment.objects.create(
+            username="tester",
+            email="tester@gmail.com",
+            text="With attachment",
+            parent=parent,
+            file=SimpleUploadedFile(name, content),
+        )
+
+    def test_identical_uploads_share_one_file(self) -> None:
+        """
+        Test that files are named by their content hash and stored once.
+        """
+        first = self.create_comment("meme.txt", b"same content")
+        second = self.create_comment("other-name.txt", b"same content")
+        third = self.create_comment("meme.txt", b"different content")
+
+        digest = hashlib.sha256(b"same content").hexdigest()
+        self.assertEqual(first.file.name, f"comments/{digest[:2]}/{digest}.txt")
+        self.assertEqual(second.file.name, first.file.name)
+        self.assertNotEqual(third.file.name, first.file.name)
+        self.assertEqual(len(os.listdir(os.path.dirname(first.file.path))), 1)
+
+    def test_files_are_deleted_with_their_last_reference(self) -> None:
+        """
+        Test that a shared file survives until the last comment using it, including
+        replies removed by the cascade, is deleted.
+        """
+        root = self.create_comment("root.txt", b"root file")
+        reply = self.create_comment("reply.txt", b"shared file", parent=root)
+        other = self.create_comment("other.txt", b"shared file")
+        storage = reply.file.storage
+
+        with self.captureOnCommitCallbacks(execute=True):
+            root.delete()
+        self.assertFalse(storage.exists(root.file.name))
+        self.assertTrue(storage.exists(reply.file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(storage.exists(reply.file.name))
+
+
+class ContentAddressedStorageLockTests(TransactionTestCase):
+    def setUp(self) -> None:
+        """
+        Store attachments in a temporary media directory.
+        """
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def test_cleanup_waits_for_uncommitted_uploads_of_the_same_file(self) -> None:
+        """
+        Test that an orphan cleanup keeps a file that an uncommitted upload reuses.
+        """
+        existing = Comment.objects.create(
+            username="first",
+            email="first@gmail.com",
+            text="First",
+            file=SimpleUploadedFile("a.txt", b"shared"),
+        )
+        name = existing.file.name
+        uploaded, release = threading.Event(), threading.Event()
+
+        def upload() -> None:
+            try:
+                with transaction.atomic():
+                    Comment.objects.create(
+                        username="second",
+                        email="second@gmail.com",
+                        text="Second",
+                        file=SimpleUploadedFile("b.txt", b"shared"),
+                    )
+                    uploaded.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        def cleanup() -> None:
+            try:
+                delete_orphaned_files([name])
+            finally:
+                connection.close()
+
+        uploader = threading.Thread(target=upload)
+        uploader.start()
+        self.assertTrue(uploaded.wait(5))
+        # The only committed reference goes away while the upload is in flight.
+        Comment.objects.filter(pk=existing.pk).update(file="")
+        cleaner = threading.Thread(target=cleanup)
+        cleaner.start()
+        cleaner.join(0.5)
+        self.assertTrue(cleaner.is_alive())
+
+        release.set()
+        uploader.join(5)
+        cleaner.join(5)
+        self.assertTrue(existing.file.storage.exists(name))
+        self.assertEqual(Comment.objects.get(username="second").file.name, name)
+
+
+class CleanHTMLTests(SimpleTestCase):
+    def test_only_allowed_markup_is_kept(self) -> None:
+        """
+        Test that the shared cleaner keeps allowed tags and strips everything else.
+        """
+        cleaned = clean_html(
+            '<strong>Hi</strong> <a href="https://example.com" onclick="x()">link</a>'
+            "<script>alert(1)</script>"
+        )
+
+        self.assertEqual(
+            cleaned, '<strong>Hi</strong> <a href="https://example.com">link</a>alert(1)'
+        )
+
+    def test_preview_cache_is_bounded(self) -> None:
+        """
+        Test that repeated inputs are served from the cache, which evicts the least
+        recently used entry and skips long inputs.
+        """
+        cache = CleanHTMLCache(max_size=2, max_input_length=20)
+
+        for text in ("<i>one</i>", "<i>two</i>", "<i>one</i>", "<b>three</b>", "x" * 21):
+            cache.clean(text)
+        self.assertEqual(cache.info(), {"hits": 1, "misses": 3, "size": 2})
+
+        self.assertEqual(cache.clean("<i>one</i>"), "<i>one</i>")
+        self.assertEqual(cache.clean("<i>two</i>"), "<i>two</i>")
+        self.assertEqual(cache.info()["hits"], 2)
+
+
+class GraphQLCommentTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Set up two approved threads, the first one three levels deep.
+        """
+        self.roots = [
+            Comment.objects.create(
+                username=f"root{index}",
+                email=f"root{index}@gmail.com",
+                text=f"Root {index}",
+                is_approved=True,
+            )
+            for index in range(2)
+        ]
+        level = [self.roots[0]]
+        for depth in range(1, 4):
+            level = [
+                Comment.objects.create(
+                    username=f"reply{depth}",
+                    email="reply@gmail.com",
+                    text=f"Reply at depth {depth}",
+                    parent=parent,
+                    is_approved=True,
+                )
+                for parent in level
+                for _ in range(2)
+            ]
+        self.pending = Comment.objects.create(
+            username="pending", email="pending@gmail.com", text="Awaiting", parent=self.roots[0]
+        )
+
+    def execute(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        response = self.client.post(
+            "/ip/graphql/",
+            {"query": query, "variables": variables or {}},
+            content_type="application/json",
+        )
+        return response.json()  # type: ignore
+
+    def test_thread_query_count_is_bounded_by_depth(self) -> None:
+        """
+        Test that replies are loaded with one query per level, however many there are.
+        """
+        query = f"""{{
+            comment(id: {self.roots[0].pk}) {{
+                username replies {{ username replies {{ username replies {{ username replies {{ id }} }} }} }}
+            }}
+        }}"""
+        with CaptureQueriesContext(connection) as small:
+            result = self.execute(query)
+        self.assertNotIn("errors", result)
+        thread = result["data"]["comment"]
+        self.assertEqual(len(thread["replies"]), 2)
+        self.assertEqual(len(thread["replies"][1]["replies"][0]["replies"]), 2)
+
+        for parent in Comment.objects.filter(tree_id=self.roots[0].pk, depth=3):
+            for _ in range(3):
+                Comment.objects.create(
+                    username="leaf",
+                    email="leaf@gmail.com",
+                    text="Leaf",
+                    parent=parent,
+                    is_approved=True,
+                )
+        with CaptureQueriesContext(connection) as large:
+            self.execute(query)
+
+        # One query for the root and one per requested level of replies.
+        self.assertEqual(len(small), 5)
+        self.assertEqual(len(large), len(small))
+
+    def test_root_comments_share_reply_batches(self) -> None:
+        """
+        Test that the replies of all root comments on a page are fetched together.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            result = self.execute("{ comments(first: 10) { username cursor replies { id } } }")
+
+        comments = result["data"]["comments"]
+        self.assertEqual([comment["username"] for comment in comments], ["root0", "root1"])
+        self.assertEqual([len(comment["replies"]) for comment in comments], [2, 0])
+        self.assertEqual(len(queries), 2)
+
+        after = self.execute(f'{{ comments(after: "{comments[0]["cursor"]}") {{ username }} }}')
+        self.assertEqual(after["data"]["comments"], [{"username": "root1"}])
+
+    def test_unapproved_replies_are_not_exposed(self) -> None:
+        """
+        Test that unapproved replies are neither listed nor resolvable by ID.
+        """
+        result = self.execute(
+            f"{{ comment(id: {self.pending.pk}) {{ id }} "
+            f"thread: comment(id: {self.roots[0].pk}) {{ replies(first: 10) {{ username }} }} }}"
+        )
+
+        self.assertIsNone(result["data"]["comment"])
+        usernames = [reply["username"] for reply in result["data"]["thread"]["replies"]]
+        self.assertEqual(usernames, ["reply1", "reply1"])
+
+    def test_replies_are_limited_by_first(self) -> None:
+        """
+        Test that `replies(first:)` limits the replies of every comment.
+        """
+        result = self.execute(
+            f"{{ comment(id: {self.roots[0].pk}) {{ replies(first: 1) {{ replies {{ id }} }} }} }}"
+        )
+
+        replies = result["data"]["comment"]["replies"]
+        self.assertEqual(len(replies), 1)
+        self.assertEqual(len(replies[0]["replies"]), 2)
+
+    def test_deeply_nested_queries_are_rejected(self) -> None:
+        """
+        Test that queries nested beyond the maximum depth are not executed.
+        """
+        query = "{ comments { " + "replies { " * 10 + "id" + " }" * 11 + " }"
+        with CaptureQueriesContext(connection) as queries:
+            result = self.execute(query)
+
+        self.assertIn("exceeds maximum operation depth", result["errors"][0]["message"])
+        self.assertEqual(len(queries), 0)
+
+    @override_settings(GRAPHQL_MAX_COMPLEXITY=500)
+    def test_expensive_queries_are_rejected(self) -> None:
+        """
+        Test that the cost of nested lists is estimated from their `first` argument.
+        """
+        cheap = self.execute("{ comments(first: 5) { id replies { id replies { id } } } }")
+        self.assertNotIn("errors", cheap)
+
+        expensive = self.execute("{ comments(first: 100) { id replies { id replies { id } } } }")
+        self.assertIn("complexity of 3701", expensive["errors"][0]["message"])
+
+        # A variable `first` is priced at the largest page, whatever value is passed.
+        variable = self.execute(
+            "query ($n: Int) { comments(first: $n) { id replies { id replies { id } } } }",
+            {"n": 5},
+        )
+        self.assertIn("complexity of 3701", variable["errors"][0]["message"])
+        nested = self.execute("{ comments(first: 5) { replies(first: 100) { replies { id } } } }")
+        self.assertIn("complexity of 3006", nested["errors"][0]["message"])
+
+
+@override_settings(COMMENT_EVENTS_QUEUE_SIZE=2, COMMENT_EVENTS_KEEPALIVE=0.05)
+class CommentEventsTests(TestCase):
+    def setUp(self) -> None:
+        """
+        Route publishing and subscribing to one fake Redis server.
+        """
+        self.server = FakeServer()
+        self.redis = FakeStrictRedis(server=self.server)
+        self.broker = events.CommentEventBroker(lambda: FakeAsyncRedis(server=self.server))
+        for patch in (
+            mock.patch.object(events, "redis_client", self.redis),
+            mock.patch.object(events, "comment_event_broker", self.broker),
+            mock.patch("comment.views.comment_event_broker", self.broker),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.root = Comment.objects.create(
+            username="root", email="root@gmail.com", text="Root", is_approved=True
+        )
+
+    def test_new_replies_are_published_to_their_thread(self) -> None:
+        """
+        Test that a reply is published with its rendered HTML once it is approved.
+        """
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(events.thread_channel(self.root.pk), events.ROOTS_CHANNEL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reply = Comment.objects.create(
+                username="reply", email="reply@gmail.com", text="Live reply", parent=self.root
+            )
+        self.assertIsNone(pubsub.get_message(timeout=0.1))
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@gmail.com", "pw"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("admin:comment_comment_changelist"),
+                {"action": "approve_comments", "_selected_action": [reply.pk]},
+            )
+
+        received = [pubsub.get_message(timeout=0.1) for _ in range(4)]
+        messages = [message for message in received if message]
+        self.assertEqual(len(messages), 1)
+        payload = json.loads(messages[0]["data"])
+        self.assertEqual(messages[0]["channel"], events.thread_channel(self.root.pk).encode())
+        self.assertEqual((payload["id"], payload["parent"]), (reply.pk, self.root.pk))
+        self.assertIn(f'id="comment-{reply.pk}"', payload["html"])
+
+    def test_events_fan_out_and_slow_clients_are_reset(self) -> None:
+        """
+        Test that one subscription serves many clients and a client that falls behind is reset.
+        """
+
+        async def scenario() -> Tuple[List[str], List[str]]:
+            channel = events.thread_channel(self.root.pk)
+            fast = await self.broker.subscribe([channel])
+            slow = await self.broker.subscribe([channel])
+            fast_stream = events.stream_events(self.broker, fast)
+            slow_stream = events.stream_events(self.broker, slow)
+            fast_chunks = [await fast_stream.__anext__()]
+
+            publisher = FakeAsyncRedis(server=self.server)
+            for pk in (1, 2, 3):
+                await publisher.publish(channel, json.dumps({"id": pk}))
+                await asyncio.sleep(0.05)
+                fast_chunks.append(await fast_stream.__anext__())
+            slow_chunks = [chunk async for chunk in slow_stream]
+            await fast_stream.aclose()
+            return fast_chunks, slow_chunks
+
+        fast_chunks, slow_chunks = asyncio.run(scenario())
+
+        self.assertTrue(fast_chunks[0].startswith("retry:"))
+        self.assertEqual(
+            [chunk.split("\n")[0] for chunk in fast_chunks[1:]], ["id: 1", "id: 2", "id: 3"]
+        )
+        self.assertEqual(
+            slow_chunks[1:],
+            [
+                'id: 1\nevent: comment\ndata: {"id": 1}\n\n',
+                'id: 2\nevent: comment\ndata: {"id": 2}\n\n',
+                "event: reset\ndata: {}\n\n",
+            ],
+        )
+        self.assertEqual(self.broker.connections, 0)
+
+    def test_stream_endpoint(self) -> None:
+        """
+        Test that the endpoint validates its threads and streams server-sent events.
+        """
+
+        async def scenario() -> Tuple[int, int, str, str]:
+            client = AsyncClient()
+            invalid = await client.get(reverse("comment_events"), {"thread": "abc"})
+            with override_settings(COMMENT_EVENTS_MAX_THREADS=1):
+                too_many = await client.get(reverse("comment_events"), {"thread": [1, 2]})
+
+            response = await client.get(reverse("comment_events"), {"thread": self.root.pk})
+            stream = response.streaming_content
+            first, keepalive = await stream.__anext__(), await stream.__anext__()
+            await stream.aclose()
+            return (
+                invalid.status_code,
+                too_many.status_code,
+                response["Content-Type"],
+                (first + keepalive).decode(),
+            )
+
+        # Closing the loop also closes the abandoned stream, which unsubscribes it.
+        invalid, too_many, content_type, chunks = asyncio.run(scenario())
+
+        self.assertEqual((invalid, too_many), (400, 400))
+        self.assertEqual(content_type, "text/event-stream")
+        self.assertEqual(chunks, "retry: 3000\n\n: keepalive\n\n")
+        self.assertEqual(self.broker.connections, 0)
@@ -0,0 +1,179 @@
+import json
+from typing import IO, Any, Dict, Iterable, Iterator, List, Set, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment
+from .tree import PATH_SEPARATOR, path_segment, rebuild_reply_counters
+
+# Columns written for every comment. Tree fields other than `depth` are not exported,
+# they are recomputed for the new primary keys on import.
+EXPORT_FIELDS = (
+    "id",
+    "parent_id",
+    "depth",
+    "username",
+    "email",
+    "text",
+    "file",
+    "thumbnail",
+    "thumbnail_webp",
+    "image_webp",
+    "user_ip",
+    "is_approved",
+    "created",
+    "updated",
+)
+
+# An imported comment as seen by its replies: (new pk, path, tree_id).
+ImportedNode = Tuple[int, str, int]
+ImportRecord = Tuple[int, Dict[str, Any]]
+
+
+class CommentImportError(ValueError):
+    """
+    Raised when a JSON Lines export cannot be imported.
+    """
+
+
+def export_comments(stream: IO[str], chunk_size: int = 2000) -> int:
+    """
+    Writes every comment to the stream as one JSON object per line.
+
+    Rows are read through a server-side cursor in chunks of `chunk_size`, so memory use
+    does not grow with the table. Comments are ordered by depth, which guarantees that
+    every parent is written before its replies. Attached files are exported by name only.
+
+    Args:
+        stream (IO[str]): The text stream to write to.
+        chunk_size (int): The number of rows fetched from the database at a time.
+
+    Returns:
+        int: The number of exported comments.
+    """
+    rows = Comment.objects.order_by("depth", "id").values(*EXPORT_FIELDS)
+    total = 0
+    for row in rows.iterator(chunk_size=chunk_size):
+        stream.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+        stream.write("\n")
+        total += 1
+    return total
+
+
+def import_comments(lines: Iterable[str], batch_size: int = 1000) -> int:
+    """
+    Imports comments from JSON Lines produced by `export_comments`.
+
+    Comments are inserted with `bulk_create` in batches of at most `batch_size` rows,
+    get new primary keys, and their `parent` references are remapped to those keys.
+    Each batch holds a single depth level, so the parents of a batch are always already
+    inserted, and only the mappings of the current and previous level are kept in memory.
+    The reply counters of the imported threads are computed once all rows are in.
+    Run it inside a transaction to make the import all-or-nothing.
+
+    Args:
+        lines (Iterable[str]): The lines of the export, e.g. an open file.
+        batch_size (int): The maximum number of rows inserted per query.
+
+    Returns:
+        int: The number of imported comments.
+
+    Raises:
+        CommentImportError: If a line is malformed or a reply comes before its parent.
+    """
+    levels: Dict[int, Dict[int, ImportedNode]] = {}
+    tree_ids: Set[int] = set()
+    total = 0
+    for depth, batch in _batches(_read_records(lines), batch_size):
+        for level in [level for level in levels if level < depth - 1]:
+            del levels[level]
+        parents = levels.get(depth - 1, {})
+        imported = levels.setdefault(depth, {})
+        _import_batch(depth, batch, parents, imported)
+        if depth == 0:
+            tree_ids.update(tree_id for _, _, tree_id in imported.values())
+        total += len(batch)
+    if tree_ids:
+        rebuild_reply_counters(Comment, tree_ids)
+    return total
+
+
+def _read_records(lines: Iterable[str]) -> Iterator[ImportRecord]:
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            row["depth"] = int(row["depth"])
+        except (ValueError, TypeError, KeyError) as e:
+            raise CommentImportError(f"Line {line_number}: invalid comment record ({e}).")
+        yield line_number, row
+
+
+def _batches(
+    records: Iterator[ImportRecord], batch_size: int
+) -> Iterator[Tuple[int, List[ImportRecord]]]:
+    batch: List[ImportRecord] = []
+    depth = 0
+    for line_number, row in records:
+        if batch and (row["depth"] != depth or len(batch) >= batch_size):
+            yield depth, batch
+            batch = []
+        if row["depth"] < depth:
+            raise CommentImportError(
+                f"Line {line_number}: comments must be ordered by depth, as exported."
+            )
+        depth = row["depth"]
+        batch.append((line_number, row))
+    if batch:
+        yield depth, batch
+
+
+def _import_batch(
+    depth: int,
+    batch: List[ImportRecord],
+    parents: Dict[int, ImportedNode],
+    imported: Dict[int, ImportedNode],
+) -> None:
+    comments = []
+    for line_number, row in batch:
+        has_parent = row["parent_id"] is not None
+        if has_parent != (depth > 0) or (has_parent and row["parent_id"] not in parents):
+            raise CommentImportError(
+                f"Line {line_number}: parent {row['parent_id']} of comment {row['id']} "
+                "was not imported before it."
+            )
+        comments.append(
+            Comment(
+                parent_id=parents[row["parent_id"]][0] if has_parent else None,
+                username=row["username"],
+                email=row["email"],
+                text=row["text"],
+                file=row["file"] or None,
+                thumbnail=row.get("thumbnail") or None,
+                thumbnail_webp=row.get("thumbnail_webp") or None,
+                image_webp=row.get("image_webp") or None,
+                user_ip=row["user_ip"],
+                is_approved=row["is_approved"],
+            )
+        )
+
+    Comment.objects.bulk_create(comments)
+
+    # `created` and `updated` are overwritten by auto_now(_add) on insert and the tree
+    # fields need the new primary keys, so they are written by a second query.
+    for (_, row), comment in zip(batch, comments):
+        parent = parents.get(row["parent_id"])
+        if parent:
+            comment.path = f"{parent[1]}{PATH_SEPARATOR}{path_segment(comment.pk)}"
+            comment.tree_id = parent[2]
+        else:
+            comment.path = path_segment(comment.pk)
+            comment.tree_id = comment.pk
+        comment.depth = depth
+        comment.created = parse_datetime(row["created"])
+        comment.updated = parse_datetime(row["updated"])
+        imported[row["id"]] = (comment.pk, comment.path, comment.tree_id)
+
+    Comment.objects.bulk_update(comments, ["path", "tree_id", "depth", "created", "updated"])
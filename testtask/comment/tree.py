@@ -0,0 +1,247 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Type
+
+from django.db.models import (
+    Case,
+    CharField,
+    Count,
+    F,
+    IntegerField,
+    Max,
+    OuterRef,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, Concat, Greatest, LPad
+
+if TYPE_CHECKING:
+    from .models import Comment
+
+# Width of a single zero-padded ID inside a materialized path. Padding keeps
+# lexicographic order of paths identical to the numeric order of the IDs.
+PATH_SEGMENT_WIDTH = 10
+PATH_SEPARATOR = "/"
+
+
+def path_segment(pk: int) -> str:
+    """
+    Formats a comment ID as a fixed-width materialized path segment.
+
+    Args:
+        pk (int): The primary key of the comment.
+
+    Returns:
+        str: The zero-padded path segment.
+    """
+    return f"{pk:0{PATH_SEGMENT_WIDTH}d}"
+
+
+def ancestor_ids(path: str) -> List[int]:
+    """
+    Returns the IDs of the ancestors encoded in a materialized path, root first.
+    """
+    return [int(segment) for segment in path.split(PATH_SEPARATOR)[:-1]]
+
+
+class ReplyCounterChange(NamedTuple):
+    """
+    A change of the reply counters of the ancestors of one comment.
+    """
+
+    # Materialized path of the comment; its ancestors are the ones updated.
+    path: str
+    # Added to the `reply_count` of the parent.
+    replies: int
+    # Added to the `descendant_count` of every ancestor.
+    descendants: int
+    # Raises the `last_activity` of every ancestor to at least this time, if given.
+    activity: Optional[datetime] = None
+
+
+def update_reply_counters(model: Type[Any], changes: Iterable[ReplyCounterChange]) -> int:
+    """
+    Applies reply counter changes to the affected ancestors with a single UPDATE.
+
+    The counters are incremented in the database with `F()` expressions, so concurrent
+    replies to the same thread never overwrite each other's counts. Changes that cancel
+    out, e.g. when a subtree is moved within its thread, issue no query.
+
+    Args:
+        model (Type[Comment]): The comment model class.
+        changes (Iterable[ReplyCounterChange]): The changes to apply.
+
+    Returns:
+        int: The number of updated ancestors.
+    """
+    replies: Dict[int, int] = defaultdict(int)
+    descendants: Dict[int, int] = defaultdict(int)
+    activity: Dict[int, datetime] = {}
+    for change in changes:
+        ancestors = ancestor_ids(change.path)
+        if not ancestors:
+            continue
+        replies[ancestors[-1]] += change.replies
+        for pk in ancestors:
+            descendants[pk] += change.descendants
+            if change.activity is not None and (
+                pk not in activity or change.activity > activity[pk]
+            ):
+                activity[pk] = change.activity
+
+    def delta(field: str, deltas: Dict[int, int]) -> Any:
+        cases = [When(pk=pk, then=Value(value)) for pk, value in deltas.items() if value]
+        if not cases:
+            return None
+        # Clamped at zero, so counters that drifted cannot violate the column constraint.
+        return Greatest(
+            F(field) + Case(*cases, default=Value(0), output_field=IntegerField()), Value(0)
+        )
+
+    updates = {
+        field: expression
+        for field, expression in (
+            ("reply_count", delta("reply_count", replies)),
+            ("descendant_count", delta("descendant_count", descendants)),
+        )
+        if expression is not None
+    }
+    if activity:
+        updates["last_activity"] = Greatest(
+            "last_activity",
+            Case(
+                *[When(pk=pk, then=Value(value)) for pk, value in activity.items()],
+                default=F("last_activity"),
+            ),
+        )
+    if not updates:
+        return 0
+    pks = {pk for pk, value in replies.items() if value}
+    pks |= {pk for pk, value in descendants.items() if value}
+    pks |= set(activity)
+    updated: int = model.objects.filter(pk__in=pks).update(**updates)
+    return updated
+
+
+def rebuild_reply_counters(model: Type[Any], tree_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recomputes `reply_count`, `descendant_count` and `last_activity` from scratch.
+
+    Only approved replies are counted; `last_activity` is the latest creation time of
+    the comment and its approved descendants. Descendants are found by path prefix
+    within the thread, so each comment costs an index scan of its own thread.
+
+    Accepts the model class explicitly, so callers can pass a historical model.
+
+    Args:
+        model (Type[Comment]): The comment model class.
+        tree_ids (Optional[Iterable[int]]): Only rebuild these threads, by default all.
+
+    Returns:
+        int: The number of updated comments.
+    """
+    children = (
+        model.objects.filter(parent_id=OuterRef("pk"), is_approved=True)
+        .order_by()
+        .values("parent_id")
+    )
+    descendants = (
+        model.objects.filter(
+            tree_id=OuterRef("tree_id"),
+            path__startswith=Concat(OuterRef("path"), Value(PATH_SEPARATOR)),
+            is_approved=True,
+        )
+        .order_by()
+        .values("tree_id")
+    )
+    queryset = model.objects.all()
+    if tree_ids is not None:
+        queryset = queryset.filter(tree_id__in=list(tree_ids))
+    updated: int = queryset.update(
+        reply_count=Coalesce(Subquery(children.annotate(count=Count("pk")).values("count")), 0),
+        descendant_count=Coalesce(
+            Subquery(descendants.annotate(count=Count("pk")).values("count")), 0
+        ),
+        last_activity=Greatest(
+            "created",
+            Coalesce(
+                Subquery(descendants.annotate(latest=Max("created")).values("latest")), "created"
+            ),
+        ),
+    )
+    return updated
+
+
+def build_comment_tree(
+    roots: Sequence["Comment"], descendants: Iterable["Comment"]
+) -> List["Comment"]:
+    """
+    Assembles root comments and their descendants into a tree in a single pass.
+
+    Every comment gets a `children` list. Descendants must be ordered so that a parent
+    always comes before its replies (e.g. by `depth`); siblings keep the order in which
+    they are given.
+
+    Args:
+        roots (Sequence[Comment]): The root comments of the threads.
+        descendants (Iterable[Comment]): All replies belonging to the given threads.
+
+    Returns:
+        List[Comment]: The root comments with `children` populated recursively.
+    """
+    nodes: Dict[int, "Comment"] = {}
+    for root in roots:
+        root.children = []  # type: ignore
+        nodes[root.pk] = root
+
+    for comment in descendants:
+        comment.children = []  # type: ignore
+        nodes[comment.pk] = comment
+        parent = nodes.get(comment.parent_id)  # type: ignore
+        if parent is not None:
+            parent.children.append(comment)  # type: ignore
+
+    return list(roots)
+
+
+def rebuild_tree(model: Type[Any]) -> int:
+    """
+    Recomputes `tree_id`, `depth` and `path` for every comment, one tree level per query.
+
+    Accepts the model class explicitly, so callers can pass a historical model.
+
+    Args:
+        model (Type[Comment]): The comment model class.
+
+    Returns:
+        int: The number of rebuilt comments.
+    """
+    segment = LPad(Cast("pk", output_field=CharField()), PATH_SEGMENT_WIDTH, Value("0"))
+
+    model.objects.update(path="")
+    total: int = model.objects.filter(parent__isnull=True).update(
+        tree_id=F("pk"), depth=0, path=segment
+    )
+
+    depth = 0
+    while True:
+        depth += 1
+        parents = model.objects.filter(pk=OuterRef("parent_id"))
+        updated: int = (
+            model.objects.filter(path="", parent__isnull=False)
+            .exclude(parent__path="")
+            .update(
+                tree_id=Subquery(parents.values("tree_id")[:1]),
+                depth=depth,
+                path=Concat(
+                    Subquery(parents.values("path")[:1]),
+                    Value(PATH_SEPARATOR),
+                    segment,
+                    output_field=CharField(),
+                ),
+            )
+        )
+        if not updated:
+            return total
+        total += updated
@@ -0,0 +1,170 @@
+import codecs
+import os
+from io import BytesIO
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from django.http import HttpRequest
+from django.template.defaultfilters import filesizeformat
+from django.utils.datastructures import MultiValueDict
+
+# Leading bytes every file of an image type starts with, keyed by file extension.
+MAGIC_NUMBERS = {
+    "jpg": (b"\xff\xd8\xff",),
+    "jpeg": (b"\xff\xd8\xff",),
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "gif": (b"GIF87a", b"GIF89a"),
+}
+TEXT_EXTENSIONS = ("txt",)
+# Number of leading bytes needed to recognize any of the types above.
+SNIFF_LENGTH = 8
+
+
+class RejectedUploadedFile(UploadedFile):  # type: ignore
+    """
+    Stand-in for an upload that was rejected while it was being received.
+
+    Its content is never stored; it only carries the reason so model validation can
+    report it on the form field.
+    """
+
+    def __init__(self, name: str, content_type: str, size: int, error: str) -> None:
+        super().__init__(BytesIO(), name, content_type, size)
+        self.error = error
+
+
+class CommentUploadHandler(TemporaryFileUploadHandler):  # type: ignore
+    """
+    Streams uploads to a temporary file while validating them chunk by chunk.
+
+    An upload is rejected as soon as it grows past its size limit
+    (`COMMENT_TEXT_UPLOAD_MAX_SIZE` for text files, `COMMENT_UPLOAD_MAX_SIZE` otherwise),
+    its leading bytes do not match its extension, or a text file is not valid UTF-8.
+    The temporary file is deleted right away, so bogus files cost neither memory nor
+    disk space. An oversized file also stops the upload: the rest of the request body
+    is not read, and the rejected file is kept on the request for `get_uploaded_files`.
+    """
+
+    def new_file(self, *args: Any, **kwargs: Any) -> None:
+        super().new_file(*args, **kwargs)
+        self.extension = os.path.splitext(self.file_name or "")[1].lower().lstrip(".")
+        self.max_size = (
+            settings.COMMENT_TEXT_UPLOAD_MAX_SIZE
+            if self.extension in TEXT_EXTENSIONS
+            else settings.COMMENT_UPLOAD_MAX_SIZE
+        )
+        self.error: Optional[str] = None
+        self.header = b""
+        self.received = 0
+        self.decoder = (
+            codecs.getincrementaldecoder("utf-8")() if self.extension in TEXT_EXTENSIONS else None
+        )
+
+    def receive_data_chunk(self, raw_data: bytes, start: int) -> Optional[bytes]:
+        if self.error:
+            return None
+
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.reject(
+                f"The file is too large. The maximum size is {filesizeformat(self.max_size)}."
+            )
+            if self.request is not None:
+                rejected: Dict[str, UploadedFile] = getattr(self.request, "rejected_uploads", {})
+                rejected[self.field_name] = self.rejected_file()
+                self.request.rejected_uploads = rejected
+            raise StopUpload(connection_reset=True)
+        if len(self.header) < SNIFF_LENGTH and self.extension in MAGIC_NUMBERS:
+            self.header = (self.header + raw_data)[:SNIFF_LENGTH]
+            if len(self.header) >= SNIFF_LENGTH and not self.has_valid_signature():
+                self.reject("The file content does not match its extension.")
+                return None
+        if self.decoder is not None:
+            try:
+                self.decoder.decode(raw_data)
+            except UnicodeDecodeError:
+                self.reject("Text files must be UTF-8 encoded.")
+                return None
+            if b"\x00" in raw_data:
+                self.reject("The file content does not match its extension.")
+                return None
+        return super().receive_data_chunk(raw_data, start)  # type: ignore
+
+    def file_complete(self, file_size: int) -> Optional[UploadedFile]:
+        if not self.error and not self.has_valid_signature():
+            self.reject("The file content does not match its extension.")
+        if not self.error and self.decoder is not None:
+            try:
+                self.decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                self.reject("Text files must be UTF-8 encoded.")
+        if self.error:
+            return self.rejected_file()
+        return super().file_complete(file_size)
+
+    def rejected_file(self) -> "RejectedUploadedFile":
+        """
+        Returns the stand-in reporting why the current file was rejected.
+        """
+        return RejectedUploadedFile(
+            self.file_name, self.content_type, max(self.received, 1), str(self.error)
+        )
+
+    def has_valid_signature(self) -> bool:
+        """
+        Checks the leading bytes of the upload against its extension.
+
+        Returns:
+            bool: False if the file is not of the type its extension claims.
+        """
+        if self.extension in MAGIC_NUMBERS:
+            return self.header.startswith(MAGIC_NUMBERS[self.extension])
+        return True
+
+    def reject(self, error: str) -> None:
+        """
+        Stops receiving the current file and deletes what was written so far.
+
+        Args:
+            error (str): The validation error to report for the file.
+        """
+        self.error = error
+        self.file.close()
+
+
+def get_uploaded_files(request: HttpRequest) -> MultiValueDict:
+    """
+    Returns the files of a request, including those whose upload was stopped for being
+    too large, so forms report them instead of saving the comment without its file.
+
+    Fields sent after a stopped upload are never read and are missing from the form.
+
+    Args:
+        request (HttpRequest): The request, or a DRF request wrapping it.
+
+    Returns:
+        MultiValueDict: The uploaded and the rejected files by field name.
+    """
+    files: MultiValueDict = request.FILES.copy()
+    for field_name, upload in getattr(request, "rejected_uploads", {}).items():
+        files[field_name] = upload
+    return files
+
+
+def validate_upload(value: Any) -> None:
+    """
+    Reports uploads rejected by `CommentUploadHandler` as validation errors.
+
+    Args:
+        value (FieldFile): The file assigned to the model field.
+
+    Raises:
+        ValidationError: If the upload was rejected while it was received.
+    """
+    # Only look at fresh uploads; accessing `file` of a stored one would open it.
+    upload = value.file if value and not getattr(value, "_committed", True) else None
+    if isinstance(upload, RejectedUploadedFile):
+        raise ValidationError(upload.error, code="invalid_upload")
@@ -5,4 +5,5 @@ from comment import views
 urlpatterns = [
     path("", views.CommentListView.as_view(), name="index"),
     path("preview/", views.preview_message, name="preview_message"),
+    path("events/comments/", views.comment_events, name="comment_events"),
 ]
@@ -1,9 +1,34 @@
-from typing import Any, Dict
-
-import bleach
-from django.http import HttpRequest, HttpResponse
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+from bleach.sanitizer import Cleaner
+from django.conf import settings
+from django.http import HttpResponse
 from django.utils.cache import patch_cache_control
-from django.utils.timezone import now
+
+ALLOWED_TAGS = frozenset({"a", "code", "i", "strong"})
+ALLOWED_ATTRIBUTES = {"a": ["href", "title"]}
+
+# bleach's Cleaner keeps parser state and is not thread-safe, so each thread builds its
+# own once and reuses it for every call.
+_cleaners = threading.local()
+
+
+def get_cleaner() -> Cleaner:
+    """
+    Returns the HTML cleaner of the current thread, configured with the allowed markup.
+
+    Returns:
+        Cleaner: The pre-configured bleach cleaner.
+    """
+    cleaner = getattr(_cleaners, "cleaner", None)
+    if cleaner is None:
+        cleaner = _cleaners.cleaner = Cleaner(
+            tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, strip=True
+        )
+    return cleaner
 
 
 def clean_html(user_input: str) -> str:
@@ -16,13 +41,8 @@ def clean_html(user_input: str) -> str:
     Returns:
         str: The sanitized HTML.
     """
-    allowed_tags = ["a", "code", "i", "strong"]
-    allowed_attributes = {"a": ["href", "title"]}
-
     try:
-        cleaned_input = bleach.clean(
-            user_input, tags=allowed_tags, attributes=allowed_attributes, strip=True
-        )
+        cleaned_input: str = get_cleaner().clean(user_input)
     except Exception as e:
         # Log the error if needed
         print(f"Error during HTML cleaning: {e}")
@@ -31,6 +51,77 @@ def clean_html(user_input: str) -> str:
     return cleaned_input
 
 
+class CleanHTMLCache:
+    """
+    Bounded LRU cache of sanitized HTML keyed by a hash of the raw input.
+
+    Keying on a digest instead of the input itself keeps memory proportional to the
+    sanitized output, and inputs longer than `max_input_length` are not cached at all.
+    """
+
+    def __init__(self, max_size: int, max_input_length: int) -> None:
+        """
+        Args:
+            max_size (int): The maximum number of cached results.
+            max_input_length (int): The longest input, in characters, that is cached.
+        """
+        self.max_size = max_size
+        self.max_input_length = max_input_length
+        self.hits = 0
+        self.misses = 0
+        self._results: "OrderedDict[bytes, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clean(self, user_input: str) -> str:
+        """
+        Sanitizes the input, reusing the result of an identical earlier input.
+
+        Args:
+            user_input (str): The raw HTML input from the user.
+
+        Returns:
+            str: The sanitized HTML.
+        """
+        if len(user_input) > self.max_input_length:
+            return clean_html(user_input)
+
+        key = hashlib.blake2b(user_input.encode(), digest_size=16).digest()
+        with self._lock:
+            cleaned = self._results.get(key)
+            if cleaned is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return cleaned
+            self.misses += 1
+
+        cleaned = clean_html(user_input)
+        with self._lock:
+            self._results[key] = cleaned
+            if len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+        return cleaned
+
+    def info(self) -> Dict[str, int]:
+        """
+        Returns the hit and miss counters and the current size.
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._results)}
+
+    def clear(self) -> None:
+        """
+        Empties the cache and resets its counters.
+        """
+        with self._lock:
+            self._results.clear()
+            self.hits = self.misses = 0
+
+
+preview_html_cache = CleanHTMLCache(
+    max_size=settings.COMMENT_PREVIEW_CACHE_SIZE,
+    max_input_length=settings.COMMENT_PREVIEW_CACHE_MAX_INPUT,
+)
+
+
 def user_specific_cache_control(response: HttpResponse) -> HttpResponse:
     """
     Applies user-specific cache control to the given HTTP response.
@@ -43,53 +134,3 @@ def user_specific_cache_control(response: HttpResponse) -> HttpResponse:
     """
     patch_cache_control(response, private=True)
     return response
-
-
-def comment_limit(request: HttpRequest) -> bool:
-    """
-    Limits the number of comments a user can make within a given time period.
-    If the limit is exceeded, the user is banned for 10 minutes.
-
-    Args:
-        request: The HTTP request object.
-
-    Returns:
-        bool: True if the user can comment, False if banned.
-    """
-    COMMENT_LIMIT = 3
-    BAN_DURATION = 10 * 60  # 10 minutes
-
-    # Get the client's IP address from the request
-    user_ip = getattr(request, "ip_address", None)
-    if not user_ip:
-        raise ValueError("IP address not found. Ensure UserStatsMiddleware is properly configured.")
-
-    # Access session data
-    session = request.session
-    if "comment_data" not in session:
-        session["comment_data"] = {}
-
-    user_data: Dict[str, Any] = session["comment_data"].get(
-        user_ip, {"comments": 0, "ban_until": None}
-    )
-
-    # Check if the user is currently banned
-    current_time = now().timestamp()
-    if user_data["ban_until"] and current_time < user_data["ban_until"]:
-        return False  # User is banned
-
-    # Increment comment count
-    user_data["comments"] += 1
-
-    # If the user exceeds the comment limit, ban them
-    if user_data["comments"] > COMMENT_LIMIT:
-        user_data["ban_until"] = current_time + BAN_DURATION
-        user_data["comments"] = 0  # Reset comment counter after banning
-        session["comment_data"][user_ip] = user_data
-        session.save()
-        return False  # User is now banned
-
-    # Save updated user data to session
-    session["comment_data"][user_ip] = user_data
-    session.save()
-    return True  # User is allowed to comment
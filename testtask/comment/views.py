@@ -1,94 +1,246 @@
 import logging
-from typing import Any, Dict, Union
+import math
+from typing import Any, Dict, Iterable, List, Tuple, Union
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.db.models import Model, QuerySet
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse
-from django.utils.decorators import method_decorator
+from django.utils.cache import add_never_cache_headers
 from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
+from django.views.generic.base import ContextMixin
 from django.views.generic.list import ListView
+from redis.exceptions import RedisError
 
 from geoip.middleware import UserStatsMiddleware
+from testtask.ratelimit import acheck_rate_limit, check_rate_limit
+from .cache import aget_thread_fragments, aset_thread_fragments
+from .events import ROOTS_CHANNEL, comment_event_broker, stream_events, thread_channel
 from .form import CommentForm
 from .models import Comment
-from .task import send_comment_notification
-from .utils import clean_html, comment_limit
+from .pagination import CursorPaginator, get_sort_field
+from .task import queue_comment_notification
+from .tree import build_comment_tree
+from .uploads import get_uploaded_files
+from .utils import clean_html, preview_html_cache
 
 logger = logging.getLogger(__name__)
 
 
-@method_decorator(never_cache, name="dispatch")
 class CommentListView(ListView):  # type: ignore
     """
     View for displaying a list of comments and handling comment submissions.
+
+    The list is rendered asynchronously: under ASGI its queries and cache reads
+    suspend the request instead of holding a worker thread while they wait. Under WSGI
+    Django runs the same handlers in a private event loop per request.
+
+    Responses are marked uncacheable in the handlers, as `never_cache` cannot wrap
+    async methods through `method_decorator` on this Django version.
     """
 
     model = Comment
     template_name = "base.html"
     context_object_name = "comments"
+    thread_template_name = "includes/comment_item.html"
     paginate_by = 25
 
     def get_queryset(self) -> Union[QuerySet[Comment], QuerySet[Model]]:
         """
-        Fetches the queryset of approved parent comments with prefetching for replies.
+        Fetches the queryset of approved parent comments.
+
+        Replies are loaded separately for the current page only, see `get_context_data`.
 
         Returns:
             QuerySet: A queryset of approved parent comments with sorting applied.
         """
         try:
-            queryset = Comment.approved.filter(parent__isnull=True).prefetch_related("replies")
-            logger.info("Fetched %d approved comments.", queryset.count())
-
-            # Sorting logic
-            sort_by = self.request.GET.get("sort", "created")
-            order = self.request.GET.get("order", "asc")
-
-            if sort_by in ["username", "email", "created"]:
-                if order == "desc":
-                    sort_by = f"-{sort_by}"
-                queryset = queryset.order_by(sort_by)
-            return queryset
+            sort_field, descending = self.get_sorting()
+            prefix = "-" if descending else ""
+            return Comment.approved.filter(parent__isnull=True).order_by(
+                f"{prefix}{sort_field}", f"{prefix}id"
+            )
         except Exception as e:
             logger.error("An error occurred while fetching comments: %s", str(e), exc_info=True)
             return Comment.objects.none()
 
+    def get_sorting(self) -> Tuple[str, bool]:
+        """
+        Reads the requested sort column and direction from the query string.
+
+        Returns:
+            Tuple[str, bool]: The sort column and whether the order is descending.
+        """
+        sort_by = get_sort_field(self.request.GET.get("sort"))
+        return sort_by, self.request.GET.get("order", "asc") == "desc"
+
+    async def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        """
+        Renders a page of root comments with their threads.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            HttpResponse: The rendered comment list.
+        """
+        self.object_list = self.get_queryset()
+        paginator, page, roots, is_paginated = await self.apaginate_queryset(
+            self.object_list, self.paginate_by
+        )
+        roots = await self.render_threads(roots)
+        context = self.get_context_data(
+            paginator=paginator,
+            page_obj=page,
+            is_paginated=is_paginated,
+            object_list=roots,
+            comments=roots,
+        )
+        # The template is rendered in a thread by Django, as the form's CAPTCHA and the
+        # context processors may query the database.
+        response: HttpResponse = self.render_to_response(context)
+        add_never_cache_headers(response)
+        return response
+
+    async def apaginate_queryset(
+        self, queryset: QuerySet[Comment], page_size: int
+    ) -> Tuple[Any, ...]:
+        """
+        Paginates root comments by cursor unless `COMMENT_PAGINATION_MODE` is "offset".
+
+        Cursor mode seeks directly to the page boundary via the sort column and `id`,
+        so deep pages are as cheap as the first one and no `COUNT(*)` is issued.
+
+        Returns:
+            Tuple[Any, ...]: The paginator, page, root comments and whether the list is paginated.
+        """
+        if settings.COMMENT_PAGINATION_MODE != "cursor":
+            # Django's Paginator counts and slices synchronously.
+            paginator, page, object_list, is_paginated = await sync_to_async(
+                self.paginate_queryset
+            )(queryset, page_size)
+            return paginator, page, [comment async for comment in object_list], is_paginated
+
+        sort_field, descending = self.get_sorting()
+        paginator = CursorPaginator(queryset, sort_field, descending, page_size)
+        page = await paginator.aget_page(self.request.GET.get("cursor"))
+        return paginator, page, page.object_list, page.has_next or page.has_previous
+
     def get_context_data(self, **kwargs: Any) -> Dict[Any, Any]:
         """
-        Adds the comment form to the context.
+        Adds the comment form and the current ordering to the context of a page.
 
         Args:
-            **kwargs: Additional keyword arguments for the context.
+            **kwargs: The paginated comments prepared by `get`.
 
         Returns:
             Dict[Any, Any]: The updated context with the comment form included.
         """
-        context: Dict[Any, Any] = super().get_context_data(**kwargs)
+        # Skips MultipleObjectMixin, which would paginate the queryset synchronously again.
+        context: Dict[Any, Any] = ContextMixin.get_context_data(self, **kwargs)
         context["form"] = CommentForm()
         context["current_sort"] = self.request.GET.get("sort", "created")
         context["current_order"] = self.request.GET.get("order", "asc")
+        context["pagination_mode"] = settings.COMMENT_PAGINATION_MODE
         return context
 
-    def post(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+    async def render_threads(self, roots: Iterable[Comment]) -> List[Comment]:
+        """
+        Attaches the rendered HTML of each thread to its root comment as `rendered_html`.
+
+        Threads whose version did not change since they were last rendered are served
+        from the cache; replies are loaded and rendered only for the dirty ones.
+
+        Args:
+            roots (Iterable[Comment]): The root comments of the current page.
+
+        Returns:
+            List[Comment]: The root comments with `rendered_html` set.
+        """
+        roots = list(roots)
+        fragments, versions = await aget_thread_fragments(root.pk for root in roots)
+
+        dirty = [root for root in roots if root.pk not in fragments]
+        rendered = {
+            root.pk: render_to_string(self.thread_template_name, {"comment": root})
+            for root in await self.get_comment_tree(dirty)
+        }
+        if rendered:
+            await aset_thread_fragments(rendered, versions)
+            fragments.update(rendered)
+
+        for root in roots:
+            root.rendered_html = fragments[root.pk]  # type: ignore
+        return roots
+
+    @staticmethod
+    async def get_comment_tree(roots: Iterable[Comment]) -> List[Comment]:
+        """
+        Loads every reply of the given root comments with a single query and assembles
+        the threads in memory.
+
+        Replies are streamed in chunks with `aiterator()`, so a large thread does not
+        have to be fetched in one piece before the event loop gets control back.
+
+        Args:
+            roots (Iterable[Comment]): The root comments to load replies for.
+
+        Returns:
+            List[Comment]: The root comments with their `children` populated recursively.
+        """
+        roots = list(roots)
+        if not roots:
+            return roots
+        descendants = Comment.objects.filter(
+            tree_id__in=[root.pk for root in roots], depth__gt=0
+        ).order_by("depth", "-created", "-id")
+        return build_comment_tree(roots, [reply async for reply in descendants.aiterator()])
+
+    async def post(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
         """
         Handles the submission of a new comment.
 
+        All handlers of a view must be async once one is, so the submission, which
+        validates the CAPTCHA and saves files, runs in a thread through `sync_to_async`.
+
         Args:
             request (HttpRequest): The HTTP request object.
 
         Returns:
             HttpResponse: Redirects to the index view after processing the comment.
         """
-        form = CommentForm(request.POST, request.FILES)
+        response: HttpResponse = await sync_to_async(self.create_comment)(request)
+        add_never_cache_headers(response)
+        return response
+
+    def create_comment(self, request: HttpRequest) -> HttpResponse:
+        """
+        Validates and saves a submitted comment.
+
+        Args:
+            request (HttpRequest): The HTTP request object.
+
+        Returns:
+            HttpResponse: Redirects to the index view after processing the comment.
+        """
+        form = CommentForm(request.POST, get_uploaded_files(request))
         if form.is_valid():
             try:
-                if not request.user.is_authenticated and not comment_limit(request):
-                    messages.error(
-                        request, "You cant add more comments.Try latter after 10 minutes"
-                    )
-                    return redirect(reverse("index"))
+                if not request.user.is_authenticated:
+                    rate_limit = check_rate_limit(request, "comment_post")
+                    if not rate_limit.allowed:
+                        messages.error(
+                            request,
+                            "You can't add more comments right now. "
+                            f"Try again in {math.ceil(rate_limit.retry_after / 60)} minute(s).",
+                        )
+                        return redirect(reverse("index"))
                 # Create a new comment object but don't save it yet
                 comment = form.save(commit=False)
                 comment.is_approved = True  # Automatically approve the comment (if required)
@@ -104,8 +256,12 @@ class CommentListView(ListView):  # type: ignore
 
                 # Save the comment and display success message
                 comment.save()
-                # Send email notification to the admin
-                send_comment_notification.delay(comment.username, comment.text)
+                # Queue an email notification to the admin; a failure here must not
+                # report the already saved comment as lost
+                try:
+                    queue_comment_notification(comment.username, comment.text)
+                except Exception as e:
+                    logger.error("Failed to queue the comment notification: %s", e)
                 logger.info("New comment saved successfully: %s", comment)
                 messages.success(request, "The comment has been added.")
             except Exception as e:
@@ -126,10 +282,13 @@ class CommentListView(ListView):  # type: ignore
 
 
 @csrf_exempt
-def preview_message(request: HttpRequest) -> HttpResponse:
+async def preview_message(request: HttpRequest) -> HttpResponse:
     """
     Handles the preview of a comment message.
 
+    Validation and sanitizing are CPU-only and the rate limit is checked with the
+    asyncio Redis client, so a preview never needs a worker thread under ASGI.
+
     Args:
         request (HttpRequest): The HTTP request object.
 
@@ -137,7 +296,13 @@ def preview_message(request: HttpRequest) -> HttpResponse:
         JsonResponse: A JSON response with the preview data or validation errors.
     """
     if request.method == "POST":
-        form = CommentForm(request.POST, request.FILES)
+        rate_limit = await acheck_rate_limit(request, "comment_preview")
+        if not rate_limit.allowed:
+            response = JsonResponse({"error": "Too many preview requests"}, status=429)
+            response["Retry-After"] = str(math.ceil(rate_limit.retry_after))
+            return response
+
+        form = CommentForm(request.POST, get_uploaded_files(request))
 
         # Remove CAPTCHA field for preview
         if "captcha" in form.fields:
@@ -148,7 +313,7 @@ def preview_message(request: HttpRequest) -> HttpResponse:
                 # Clean and extract form data
                 username: str = form.cleaned_data["username"]
                 email: str = form.cleaned_data["email"]
-                text: str = clean_html(form.cleaned_data["text"])
+                text: str = preview_html_cache.clean(form.cleaned_data["text"])
 
                 # Return JSON response with the preview
                 return JsonResponse(
@@ -159,8 +324,7 @@ def preview_message(request: HttpRequest) -> HttpResponse:
                     }
                 )
             except Exception as e:
-                # Log the error and return a server error response
-                print(f"Error during comment preview: {e}")
+                logger.error("Error during comment preview: %s", e, exc_info=True)
                 return JsonResponse({"error": "Server error"}, status=500)
 
         # Return validation errors
@@ -168,3 +332,47 @@ def preview_message(request: HttpRequest) -> HttpResponse:
 
     # Handle invalid request method
     return JsonResponse({"error": "Invalid request method"}, status=405)
+
+
+@never_cache
+@require_GET
+async def comment_events(request: HttpRequest) -> HttpResponse:
+    """
+    Streams newly posted and approved comments as server-sent events.
+
+    `?thread=<id>` (repeatable) streams the replies of those threads, without it the
+    stream carries new root comments. Requires an ASGI server: a WSGI worker would
+    hold a thread per connection and buffer the endless response.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: A `text/event-stream` response, 400 for invalid threads, or 503
+            when the worker is at its connection limit or Redis is unavailable.
+    """
+    try:
+        tree_ids = sorted({int(tree_id) for tree_id in request.GET.getlist("thread")})
+    except ValueError:
+        return HttpResponse("Invalid thread ID.", status=400)
+    if len(tree_ids) > settings.COMMENT_EVENTS_MAX_THREADS:
+        return HttpResponse("Too many threads.", status=400)
+
+    if comment_event_broker.connections >= settings.COMMENT_EVENTS_MAX_CONNECTIONS:
+        response = HttpResponse("Too many event streams, try again later.", status=503)
+        response["Retry-After"] = str(settings.COMMENT_EVENTS_RETRY_MS // 1000)
+        return response
+
+    channels = [thread_channel(tree_id) for tree_id in tree_ids] or [ROOTS_CHANNEL]
+    try:
+        subscription = await comment_event_broker.subscribe(channels)
+    except RedisError as e:
+        logger.error("Failed to subscribe to comment events: %s", e)
+        return HttpResponse("Live updates are unavailable.", status=503)
+
+    response = StreamingHttpResponse(
+        stream_events(comment_event_broker, subscription), content_type="text/event-stream"
+    )
+    # Stop nginx from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,188 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from django.conf import settings
+
+# Length of a rollup bucket and the format of its key suffix, per granularity.
+GRANULARITIES = {
+    "minute": (timedelta(minutes=1), "%Y%m%d%H%M"),
+    "hour": (timedelta(hours=1), "%Y%m%d%H"),
+}
+# Longest stored dimension value; languages come from a client-controlled header.
+MAX_VALUE_LENGTH = 32
+
+
+def truncate_timestamp(timestamp: datetime, granularity: str) -> datetime:
+    """
+    Returns the start of the bucket the timestamp falls into.
+
+    Args:
+        timestamp (datetime): The timestamp; naive timestamps are taken as UTC.
+        granularity (str): One of `GRANULARITIES`.
+
+    Returns:
+        datetime: The bucket start in UTC.
+    """
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    timestamp = timestamp.astimezone(timezone.utc).replace(second=0, microsecond=0)
+    if granularity == "hour":
+        timestamp = timestamp.replace(minute=0)
+    return timestamp
+
+
+def rollup_key(granularity: str, bucket: datetime) -> str:
+    """
+    Returns the key of the counters hash of a bucket; `<key>:visitors` is its HyperLogLog.
+    """
+    return f"user_stats:{granularity}:{bucket.strftime(GRANULARITIES[granularity][1])}"
+
+
+def normalize_value(value: str) -> str:
+    return value.strip()[:MAX_VALUE_LENGTH] or "Unknown"
+
+
+def add_rollups(pipeline: Any, stats: Iterable[Dict[str, str]]) -> None:
+    """
+    Queues the rollup updates for a batch of visits on a Redis pipeline.
+
+    Every visit increments the `visits`, `country:<name>` and `language:<code>`
+    counters of its minute and hour buckets and adds its IP address to the buckets'
+    HyperLogLog of unique visitors. Visits are aggregated first, so a batch costs a
+    few commands per bucket instead of per visit, and nothing beyond the pipeline's
+    own round-trip.
+
+    Args:
+        pipeline (Any): The pipeline the user statistics are written with.
+        stats (Iterable[Dict[str, str]]): Visits with `ip_address`, `country`,
+            `language` and an ISO 8601 `timestamp`.
+    """
+    counters: Dict[Tuple[str, datetime], Counter[str]] = defaultdict(Counter)
+    visitors: Dict[Tuple[str, datetime], Set[str]] = defaultdict(set)
+    for stat in stats:
+        timestamp = datetime.fromisoformat(stat["timestamp"])
+        for granularity in GRANULARITIES:
+            bucket_key = (granularity, truncate_timestamp(timestamp, granularity))
+            counters[bucket_key].update(
+                (
+                    "visits",
+                    f"country:{normalize_value(stat['country'])}",
+                    f"language:{normalize_value(stat['language'])}",
+                )
+            )
+            visitors[bucket_key].add(stat["ip_address"])
+
+    for (granularity, bucket), counts in counters.items():
+        key = rollup_key(granularity, bucket)
+        ttl = settings.USER_STATS_ROLLUP_TTL[granularity]
+        for field, count in counts.items():
+            pipeline.hincrby(key, field, count)
+        pipeline.pfadd(f"{key}:visitors", *visitors[(granularity, bucket)])
+        pipeline.expire(key, ttl)
+        pipeline.expire(f"{key}:visitors", ttl)
+
+
+def get_buckets(granularity: str, start: datetime, end: datetime) -> List[datetime]:
+    """
+    Lists the bucket starts covering `[start, end]`.
+
+    Raises:
+        ValueError: If the granularity is unknown or the range spans more than
+            `USER_STATS_MAX_BUCKETS` buckets.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularity must be one of: {', '.join(GRANULARITIES)}.")
+    step = GRANULARITIES[granularity][0]
+    bucket = truncate_timestamp(start, granularity)
+    end = truncate_timestamp(end, granularity)
+    if (end - bucket) // step >= settings.USER_STATS_MAX_BUCKETS:
+        raise ValueError(f"At most {settings.USER_STATS_MAX_BUCKETS} buckets can be read at once.")
+
+    buckets = []
+    while bucket <= end:
+        buckets.append(bucket)
+        bucket += step
+    return buckets
+
+
+def read_rollups(client: Any, granularity: str, start: datetime, end: datetime) -> Dict[str, Any]:
+    """
+    Reads the visit counters of a time range with a single pipelined round-trip.
+
+    The cost depends on the number of buckets in the range, not on the number of
+    visitors or stored `user_stat:*` keys.
+
+    Args:
+        client (Any): The Redis client.
+        granularity (str): One of `GRANULARITIES`.
+        start (datetime): The start of the range.
+        end (datetime): The end of the range, inclusive.
+
+    Returns:
+        Dict[str, Any]: `buckets`, a list of dicts with `start`, `visits`,
+            `unique_visitors`, `countries` and `languages` (counts by value), and
+            `unique_visitors`, the estimated number of distinct visitors in the range.
+
+    Raises:
+        ValueError: If the granularity or range is invalid.
+    """
+    buckets = get_buckets(granularity, start, end)
+    if not buckets:
+        return {"buckets": [], "unique_visitors": 0}
+    pipeline = client.pipeline(transaction=False)
+    queue_rollup_reads(pipeline, granularity, buckets)
+    return parse_rollups(buckets, pipeline.execute())
+
+
+async def aread_rollups(
+    client: Any, granularity: str, start: datetime, end: datetime
+) -> Dict[str, Any]:
+    """
+    Async version of `read_rollups` for an asyncio Redis client.
+    """
+    buckets = get_buckets(granularity, start, end)
+    if not buckets:
+        return {"buckets": [], "unique_visitors": 0}
+    pipeline = client.pipeline(transaction=False)
+    queue_rollup_reads(pipeline, granularity, buckets)
+    return parse_rollups(buckets, await pipeline.execute())
+
+
+def queue_rollup_reads(pipeline: Any, granularity: str, buckets: List[datetime]) -> None:
+    """
+    Queues the reads `parse_rollups` expects: the counters and unique visitors of every
+    bucket, followed by the unique visitors of all buckets together.
+    """
+    keys = [rollup_key(granularity, bucket) for bucket in buckets]
+    for key in keys:
+        pipeline.hgetall(key)
+        pipeline.pfcount(f"{key}:visitors")
+    pipeline.pfcount(*(f"{key}:visitors" for key in keys))
+
+
+def parse_rollups(buckets: List[datetime], results: List[Any]) -> Dict[str, Any]:
+    """
+    Builds the result of `read_rollups` from the replies to `queue_rollup_reads`.
+    """
+    series = []
+    for index, bucket in enumerate(buckets):
+        counters, unique_visitors = results[2 * index], results[2 * index + 1]
+        countries: Dict[str, int] = {}
+        languages: Dict[str, int] = {}
+        for field, count in counters.items():
+            dimension, _, value = field.decode("utf-8").partition(":")
+            if dimension == "country":
+                countries[value] = int(count)
+            elif dimension == "language":
+                languages[value] = int(count)
+        series.append(
+            {
+                "start": bucket,
+                "visits": int(counters.get(b"visits", 0)),
+                "unique_visitors": unique_visitors,
+                "countries": countries,
+                "languages": languages,
+            }
+        )
+    return {"buckets": series, "unique_visitors": results[-1]}
@@ -0,0 +1,154 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from typing import Any, Callable, List, Optional, Tuple
+
+from django.conf import settings
+
+from geoip.utils import save_user_stats_batch
+
+logger = logging.getLogger(__name__)
+
+UserStatEntry = Tuple[str, str, str]
+
+
+class UserStatBuffer:
+    """
+    Bounded in-process queue of user statistics drained in batches by a background thread.
+
+    Requests only enqueue an (ip, language, timestamp) entry, so their latency does not
+    depend on GeoIP or Redis. When the queue is full, the request waits at most
+    `enqueue_timeout` seconds for room (backpressure) and the entry is dropped after that.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[UserStatEntry]], Any],
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        enqueue_timeout: float = 0.0,
+    ) -> None:
+        """
+        Args:
+            flush (Callable): Writes one batch of entries, e.g. `save_user_stats_batch`.
+            max_size (int): The maximum number of queued entries.
+            batch_size (int): The maximum number of entries written per flush.
+            flush_interval (float): Seconds to wait for more entries before flushing.
+            enqueue_timeout (float): Seconds a request may wait for room in a full queue.
+        """
+        self._flush = flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.dropped = 0
+        self.flushed = 0
+
+        self._queue: "queue.Queue[UserStatEntry]" = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def enqueue(self, ip: str, language: str, timestamp: str, wait: bool = True) -> bool:
+        """
+        Queues a user statistic for the next batch.
+
+        Args:
+            ip (str): The IP address of the user.
+            language (str): The preferred language of the user.
+            timestamp (str): When the request was received, in ISO format.
+            wait (bool): Whether to wait up to `enqueue_timeout` for room in a full queue;
+                callers on an event loop must not block it.
+
+        Returns:
+            bool: True if the entry was queued, False if it was dropped.
+        """
+        self._ensure_started()
+        try:
+            if wait and self.enqueue_timeout > 0:
+                self._queue.put((ip, language, timestamp), timeout=self.enqueue_timeout)
+            else:
+                self._queue.put_nowait((ip, language, timestamp))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning("User stat queue is full, %d entries dropped so far.", self.dropped)
+            return False
+
+    def flush(self) -> int:
+        """
+        Writes every queued entry in batches on the calling thread.
+
+        Returns:
+            int: The number of entries taken from the queue.
+        """
+        total = 0
+        while True:
+            batch = self._take_batch(block=False)
+            if not batch:
+                return total
+            self._write(batch)
+            total += len(batch)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Stops the background thread and flushes the remaining entries.
+
+        Args:
+            timeout (float): Seconds to wait for the background thread to finish.
+        """
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush()
+
+    def _ensure_started(self) -> None:
+        # The PID check restarts the thread in processes forked after it was started,
+        # such as uWSGI workers, since threads do not survive a fork.
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._stopping.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="user-stat-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            batch = self._take_batch(block=True)
+            if batch:
+                self._write(batch)
+
+    def _take_batch(self, block: bool) -> List[UserStatEntry]:
+        batch: List[UserStatEntry] = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch: List[UserStatEntry]) -> None:
+        try:
+            self._flush(batch)
+            self.flushed += len(batch)
+        except Exception as e:
+            logger.error("Failed to flush %d user stat(s): %s", len(batch), e)
+
+
+user_stat_buffer = UserStatBuffer(
+    flush=save_user_stats_batch,
+    max_size=settings.USER_STATS_QUEUE_SIZE,
+    batch_size=settings.USER_STATS_BATCH_SIZE,
+    flush_interval=settings.USER_STATS_FLUSH_INTERVAL,
+    enqueue_timeout=settings.USER_STATS_ENQUEUE_TIMEOUT,
+)
+atexit.register(user_stat_buffer.stop)
@@ -0,0 +1,61 @@
+import random
+import time
+from typing import Any, Callable, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from geoip2.database import Reader
+from geoip2.errors import AddressNotFoundError
+
+from geoip.utils import _lookup_country, get_country_from_ip, get_geoip_cache_info
+
+
+def uncached_lookup(ip: str) -> str:
+    """
+    Reproduces the previous lookup, which opened the database on every call.
+    """
+    try:
+        return Reader(settings.GEOIP_PATH).city(ip).country.name or "Unknown"
+    except AddressNotFoundError:
+        return "Unknown"
+
+
+class Command(BaseCommand):
+    """
+    Measures the per-request cost of resolving the visitor country.
+    """
+
+    help = "Benchmarks GeoIP lookups: reader per call vs shared reader with LRU cache."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--requests", type=int, default=5000, help="Lookups per run.")
+        parser.add_argument(
+            "--unique-ips", type=int, default=500, help="Distinct visitor IPs in the traffic."
+        )
+        parser.add_argument("--seed", type=int, default=42, help="Random seed for the IPs.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if not settings.GEOIP_PATH.exists():
+            raise CommandError(f"GeoIP database not found at {settings.GEOIP_PATH}")
+
+        rng = random.Random(options["seed"])
+        visitors = [
+            ".".join(str(rng.randint(1, 254)) for _ in range(4))
+            for _ in range(options["unique_ips"])
+        ]
+        traffic = [rng.choice(visitors) for _ in range(options["requests"])]
+
+        before = self._measure("reader per call", uncached_lookup, traffic)
+        _lookup_country.cache_clear()
+        after = self._measure("shared reader + LRU", get_country_from_ip, traffic)
+
+        self.stdout.write(f"Speedup: {before / after:.1f}x")
+        self.stdout.write(f"LRU cache: {get_geoip_cache_info()}")
+
+    def _measure(self, label: str, lookup: Callable[[str], str], traffic: List[str]) -> float:
+        started = time.perf_counter()
+        for ip in traffic:
+            lookup(ip)
+        per_lookup = (time.perf_counter() - started) / len(traffic) * 1_000_000
+        self.stdout.write(f"{label:>20}: {per_lookup:8.1f} µs/lookup")
+        return per_lookup
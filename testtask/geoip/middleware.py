@@ -1,15 +1,25 @@
 from typing import Optional
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
 from django.http import HttpRequest, HttpResponse
+from django.utils.timezone import now
 
-from geoip.utils import save_user_stat
+from geoip.buffer import user_stat_buffer
 
 
 class UserStatsMiddleware:
     """
     Middleware to log user statistics such as IP address and preferred language.
+
+    Statistics are only queued here; GeoIP lookups and Redis writes happen in batches
+    on a background thread, see `geoip.buffer.UserStatBuffer`. Under ASGI the middleware
+    runs on the event loop without a thread hop and never waits for room in the queue.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response: HttpResponse) -> None:
         """
         Initializes the middleware.
@@ -18,10 +28,12 @@ class UserStatsMiddleware:
             get_response: The next middleware or view in the chain.
         """
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
         """
-        Processes the request to save user statistics and attaches IP to the request object.
+        Processes the request to queue user statistics and attaches IP to the request object.
 
         Args:
             request: The HTTP request object.
@@ -29,6 +41,29 @@ class UserStatsMiddleware:
         Returns:
             HttpResponse: The HTTP response object.
         """
+        if iscoroutinefunction(self):
+            return self.__acall__(request)  # type: ignore
+        self.record_visit(request)
+
+        # Pass the request to the next middleware or view
+        response = self.get_response(request)  # type: ignore
+        return response  # type: ignore
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        """
+        Async version of `__call__` used when the middleware chain runs under ASGI.
+        """
+        self.record_visit(request, wait=False)
+        return await self.get_response(request)  # type: ignore
+
+    def record_visit(self, request: HttpRequest, wait: bool = True) -> None:
+        """
+        Queues the statistics of a request and attaches the client IP to the request object.
+
+        Args:
+            request: The HTTP request object.
+            wait (bool): Whether a full queue may be waited on, see `UserStatBuffer.enqueue`.
+        """
         try:
             # Get the client IP address
             ip = self.get_client_ip(request)
@@ -39,31 +74,38 @@ class UserStatsMiddleware:
                 # Get the user's preferred language
                 language = request.headers.get("Accept-Language", "Unknown").split(",")[0]
 
-                # Save user statistics using the external utility
-                save_user_stat(ip, language)
+                # Queue user statistics for the background flusher
+                user_stat_buffer.enqueue(ip, language, now().isoformat(), wait=wait)
         except Exception as e:
             # Log any unexpected exceptions (logging can be added here if needed)
             print(f"Error in UserStatsMiddleware: {e}")
 
-        # Pass the request to the next middleware or view
-        response = self.get_response(request)  # type: ignore
-        return response  # type: ignore
-
     @staticmethod
     def get_client_ip(request: HttpRequest) -> Optional[str]:
         """
         Retrieves the client's IP address from the HTTP request.
 
+        Behind `TRUSTED_PROXY_COUNT` proxies the address is the entry of `X-Forwarded-For`
+        added by the outermost trusted proxy; anything left of it comes from the client.
+        A request with fewer entries did not pass all proxies and is identified by
+        `REMOTE_ADDR`, like every request when no proxy is trusted.
+
         Args:
             request: The HTTP request object.
 
         Returns:
             str | None: The client's IP address, or None if unavailable.
         """
-        x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(",")[0].strip()
-        else:
-            ip = request.META.get("REMOTE_ADDR", "").strip()
+        ip = request.META.get("REMOTE_ADDR", "")
+        proxies = settings.TRUSTED_PROXY_COUNT
+        if proxies:
+            hops = [
+                hop.strip()
+                for hop in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")
+                if hop.strip()
+            ]
+            if len(hops) >= proxies:
+                ip = hops[-proxies]
+        ip = ip.strip()
 
         return ip if ip else None
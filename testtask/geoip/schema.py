@@ -1,8 +1,22 @@
-from typing import Any, Optional
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 
-from graphene import Field, Mutation, ObjectType, Schema, String
+from django.conf import settings
+from django.utils.timezone import now
+from graphene import DateTime, Field, InputObjectType, Int, Mutation, NonNull, ObjectType, String
+from graphene import List as GraphQLList
+from graphql import GraphQLError
 
-from geoip.utils import get_user_stat, save_user_stat
+from geoip.analytics import GRANULARITIES
+from geoip.utils import (
+    get_user_stat,
+    get_user_stats,
+    get_visitor_series,
+    save_user_stat,
+    save_user_stats_batch,
+)
+from testtask.ratelimit import check_rate_limit
 
 
 class UserStatType(ObjectType):  # type: ignore
@@ -44,6 +58,12 @@ class CreateUserStat(Mutation):  # type: ignore
         Returns:
             CreateUserStat: The mutation result containing success message and created user statistic.
         """
+        rate_limit = check_rate_limit(info.context, "graphql_mutation")
+        if not rate_limit.allowed:
+            return CreateUserStat(
+                success=f"Rate limit exceeded, retry in {math.ceil(rate_limit.retry_after)}s",
+                user_stat=None,
+            )
         try:
             result = save_user_stat(ip_address, language)
             if result:
@@ -54,6 +74,118 @@ class CreateUserStat(Mutation):  # type: ignore
         return CreateUserStat(success="Failed to add user stat", user_stat=None)
 
 
+class CountType(ObjectType):  # type: ignore
+    """
+    GraphQL type representing the number of visits with one country or language.
+    """
+
+    name = String()
+    count = Int()
+
+
+def to_counts(counts: Dict[str, int]) -> List[CountType]:
+    """
+    Converts counts by value to `CountType`s, most frequent first.
+    """
+    return [
+        CountType(name=name, count=count)
+        for name, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    ]
+
+
+class VisitorBucketType(ObjectType):  # type: ignore
+    """
+    GraphQL type representing the visits of one minute or hour.
+    """
+
+    start = DateTime()
+    visits = Int()
+    unique_visitors = Int(description="Estimated number of distinct IP addresses.")
+    countries = GraphQLList(NonNull(CountType))
+    languages = GraphQLList(NonNull(CountType))
+
+
+class VisitorSeriesType(ObjectType):  # type: ignore
+    """
+    GraphQL type representing the visits of a time range, bucket by bucket.
+    """
+
+    granularity = String()
+    buckets = GraphQLList(NonNull(VisitorBucketType))
+    unique_visitors = Int(description="Estimated number of distinct IP addresses in the range.")
+
+
+class UserStatInput(InputObjectType):  # type: ignore
+    """
+    GraphQL input for one user statistic entry of a bulk mutation.
+    """
+
+    ip_address = String(required=True)
+    language = String(required=True)
+
+
+def check_batch_size(count: int) -> None:
+    """
+    Rejects batches larger than `USER_STATS_MAX_BATCH_SIZE`.
+
+    Raises:
+        GraphQLError: If the batch is too large.
+    """
+    if count > settings.USER_STATS_MAX_BATCH_SIZE:
+        raise GraphQLError(
+            f"At most {settings.USER_STATS_MAX_BATCH_SIZE} user stats can be handled at once."
+        )
+
+
+class CreateUserStats(Mutation):  # type: ignore
+    """
+    Mutation to create many user statistic entries with a single Redis round-trip.
+
+    Fields:
+        success (String): A message indicating success or failure.
+        user_stats (List[UserStatType]): The created user statistic entries, one per IP address.
+    """
+
+    class Arguments:
+        stats = NonNull(GraphQLList(NonNull(UserStatInput)))
+
+    success = String()
+    user_stats = GraphQLList(NonNull(lambda: UserStatType))
+
+    def mutate(self, info: Any, stats: List[UserStatInput]) -> "CreateUserStats":
+        """
+        Handles the mutation to create many user statistics.
+
+        Args:
+            info (Any): The GraphQL execution context.
+            stats (List[UserStatInput]): The entries to save; for repeated IP addresses
+                the last entry wins.
+
+        Returns:
+            CreateUserStats: The mutation result containing success message and created user statistics.
+        """
+        check_batch_size(len(stats))
+        rate_limit = check_rate_limit(info.context, "graphql_mutation")
+        if not rate_limit.allowed:
+            return CreateUserStats(
+                success=f"Rate limit exceeded, retry in {math.ceil(rate_limit.retry_after)}s",
+                user_stats=None,
+            )
+        timestamp = now().isoformat()
+        try:
+            result = save_user_stats_batch(
+                (stat.ip_address, stat.language, timestamp) for stat in stats
+            )
+            return CreateUserStats(
+                success=f"{len(result)} user stat(s) added",
+                user_stats=[UserStatType(**stat) for stat in result],
+            )
+        except Exception as e:
+            # Log the error or handle it appropriately
+            print(f"Error saving user stats: {e}")
+        return CreateUserStats(success="Failed to add user stats", user_stats=None)
+
+
 class Query(ObjectType):  # type: ignore
     """
     Query for retrieving user statistics.
@@ -64,6 +196,20 @@ class Query(ObjectType):  # type: ignore
         ip_address=String(required=True),
         description="Retrieve user statistics by IP address.",
     )
+    user_stats = GraphQLList(
+        UserStatType,
+        ip_addresses=NonNull(GraphQLList(NonNull(String))),
+        description="Retrieve the statistics of many IP addresses at once, in the given order.",
+    )
+
+    visitor_stats = Field(
+        VisitorSeriesType,
+        granularity=String(default_value="hour"),
+        start=DateTime(),
+        end=DateTime(),
+        description="Visits per minute or hour by country and language. "
+        "Defaults to the last 24 buckets.",
+    )
 
     def resolve_user_stat(self, info: Any, ip_address: str) -> Optional[UserStatType]:
         """
@@ -85,6 +231,75 @@ class Query(ObjectType):  # type: ignore
             print(f"Error retrieving user stat: {e}")
         return None
 
+    def resolve_user_stats(
+        self, info: Any, ip_addresses: List[str]
+    ) -> Optional[List[Optional[UserStatType]]]:
+        """
+        Resolves the statistics of many IP addresses with a single Redis round-trip.
+
+        Args:
+            info (Any): The GraphQL execution context.
+            ip_addresses (List[str]): The IP addresses to query.
+
+        Returns:
+            Optional[List[Optional[UserStatType]]]: The user statistics of each address,
+                None for addresses without statistics, or None if Redis failed.
+        """
+        check_batch_size(len(ip_addresses))
+        try:
+            stats = get_user_stats(ip_addresses)
+        except Exception as e:
+            # Log the error or handle it appropriately
+            print(f"Error retrieving user stats: {e}")
+            return None
+        return [UserStatType(**stats[ip]) if stats[ip] else None for ip in ip_addresses]
+
+    def resolve_visitor_stats(
+        self,
+        info: Any,
+        granularity: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Optional[VisitorSeriesType]:
+        """
+        Resolves the visitor rollups of a time range with a single Redis round-trip.
+
+        Args:
+            info (Any): The GraphQL execution context.
+            granularity (str): "minute" or "hour".
+            start (Optional[datetime]): The start of the range.
+            end (Optional[datetime]): The end of the range, inclusive; defaults to now.
+
+        Returns:
+            Optional[VisitorSeriesType]: The visits of the range, or None if Redis failed.
+        """
+        if granularity not in GRANULARITIES:
+            raise GraphQLError(f"Granularity must be one of: {', '.join(GRANULARITIES)}.")
+        end = end or now()
+        start = start or end - 23 * GRANULARITIES[granularity][0]
+        try:
+            series = get_visitor_series(granularity, start, end)
+        except ValueError as e:
+            raise GraphQLError(str(e))
+        except Exception as e:
+            # Log the error or handle it appropriately
+            print(f"Error retrieving visitor stats: {e}")
+            return None
+        return VisitorSeriesType(
+            granularity=granularity,
+            unique_visitors=series["unique_visitors"],
+            buckets=[
+                VisitorBucketType(
+                    start=bucket["start"],
+                    visits=bucket["visits"],
+                    unique_visitors=bucket["unique_visitors"],
+                    countries=to_counts(bucket["countries"]),
+                    languages=to_counts(bucket["languages"]),
+                )
+                for bucket in series["buckets"]
+            ],
+        )
+
 
 class RootMutation(ObjectType):  # type: ignore
     """
@@ -92,6 +307,4 @@ class RootMutation(ObjectType):  # type: ignore
     """
 
     create_user_stat = CreateUserStat.Field()
-
-
-schema = Schema(query=Query, mutation=RootMutation)
+    create_user_stats = CreateUserStats.Field()
@@ -0,0 +1,473 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, cast
+from unittest import mock
+
+import redis
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from fakeredis import FakeAsyncRedis, FakeConnection, FakeServer
+from geoip2.errors import AddressNotFoundError
+
+from geoip import utils
+from geoip.buffer import UserStatBuffer
+from geoip.middleware import UserStatsMiddleware
+from geoip.views import document_cache
+from testtask.schema import schema
+
+
+class FakeReader:
+    """
+    Stand-in for geoip2's Reader that counts how often the database is opened.
+    """
+
+    opened = 0
+
+    def __init__(self, path: Any, mode: int = 0) -> None:
+        FakeReader.opened += 1
+        self.lookups = 0
+
+    def city(self, ip: str) -> SimpleNamespace:
+        self.lookups += 1
+        if ip.startswith("10."):
+            raise AddressNotFoundError(f"{ip} not found")
+        return SimpleNamespace(country=SimpleNamespace(name="Ukraine"))
+
+
+class GeoIPLookupTests(SimpleTestCase):
+    def setUp(self) -> None:
+        """
+        Point the GeoIP settings at a temporary database file and reset the shared reader.
+        """
+        handle, self.path = tempfile.mkstemp(suffix=".mmdb")
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+        geoip_settings = override_settings(GEOIP_PATH=self.path, GEOIP_RELOAD_INTERVAL=0)
+        geoip_settings.enable()
+        self.addCleanup(geoip_settings.disable)
+        for patch in (
+            mock.patch.object(utils, "Reader", FakeReader),
+            mock.patch.object(utils, "_reader", None),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        FakeReader.opened = 0
+        utils._lookup_country.cache_clear()
+        self.addCleanup(utils._lookup_country.cache_clear)
+
+    def test_reader_is_opened_once_and_lookups_are_cached(self) -> None:
+        """
+        Test that repeated lookups reuse one reader and are served from the LRU cache.
+        """
+        for _ in range(3):
+            self.assertEqual(utils.get_country_from_ip("8.8.8.8"), "Ukraine")
+        self.assertEqual(utils.get_country_from_ip("10.0.0.1"), "Unknown")
+
+        self.assertEqual(FakeReader.opened, 1)
+        self.assertEqual(cast(FakeReader, utils.get_geoip_reader()).lookups, 2)
+        info = utils.get_geoip_cache_info()
+        self.assertEqual((info["hits"], info["misses"]), (2, 2))
+
+    def test_batched_lookup_checks_the_reader_once_per_batch(self) -> None:
+        """
+        Test that a batch looks up each distinct address once and survives a missing database.
+        """
+        countries = utils.get_countries_from_ips(["8.8.8.8", "10.0.0.1", "8.8.8.8"])
+
+        self.assertEqual(countries, {"8.8.8.8": "Ukraine", "10.0.0.1": "Unknown"})
+        self.assertEqual(cast(FakeReader, utils.get_geoip_reader()).lookups, 2)
+
+        with override_settings(GEOIP_PATH=self.path + ".missing"), mock.patch.object(
+            utils, "_reader", None
+        ), self.assertLogs("geoip.utils", "WARNING") as logs:
+            countries = utils.get_countries_from_ips(["1.1.1.1", "2.2.2.2"])
+        self.assertEqual(set(countries.values()), {"Unknown"})
+        self.assertEqual(len(logs.output), 1)
+
+    def test_updated_database_is_reopened(self) -> None:
+        """
+        Test that a changed database file is reopened and cached results are dropped.
+        """
+        utils.get_country_from_ip("8.8.8.8")
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+
+        utils.get_country_from_ip("8.8.8.8")
+
+        self.assertEqual(FakeReader.opened, 2)
+        self.assertEqual(utils.get_geoip_cache_info()["misses"], 1)
+
+
+class UserStatBufferTests(SimpleTestCase):
+    def setUp(self) -> None:
+        """
+        Set up a buffer whose flushes are collected instead of written to Redis.
+        """
+        self.batches: List[List[Any]] = []
+        self.buffer = UserStatBuffer(self.batches.append, max_size=3, batch_size=2)
+        patch = mock.patch.object(self.buffer, "_ensure_started")
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_flush_writes_queued_entries_in_batches(self) -> None:
+        """
+        Test that queued entries are written in batches of at most `batch_size`.
+        """
+        for index in range(3):
+            self.buffer.enqueue(f"1.1.1.{index}", "en", "2025-01-01T00:00:00")
+
+        self.buffer.stop()
+
+        self.assertEqual([len(batch) for batch in self.batches], [2, 1])
+        self.assertEqual(self.buffer.flushed, 3)
+
+    def test_entries_are_dropped_when_the_queue_is_full(self) -> None:
+        """
+        Test that a full queue drops new entries instead of blocking the request.
+        """
+        results = [self.buffer.enqueue("1.1.1.1", "en", "now") for _ in range(5)]
+
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual(self.buffer.dropped, 2)
+
+    def test_background_thread_flushes_and_stops(self) -> None:
+        """
+        Test that the background thread drains the queue and a stop flushes the rest.
+        """
+        buffer = UserStatBuffer(self.batches.append, flush_interval=0.01)
+        buffer.enqueue("1.1.1.1", "en", "now")
+        buffer.stop()
+
+        self.assertEqual(sum(len(batch) for batch in self.batches), 1)
+
+    def test_middleware_only_enqueues(self) -> None:
+        """
+        Test that the middleware queues the stat and never touches Redis itself.
+        """
+        request = RequestFactory().get("/", HTTP_ACCEPT_LANGUAGE="uk,en;q=0.8")
+        with mock.patch("geoip.middleware.user_stat_buffer", self.buffer), mock.patch.object(
+            utils, "redis_client"
+        ) as redis_client:
+            UserStatsMiddleware(lambda request: HttpResponse())(request)
+        self.buffer.flush()
+
+        redis_client.assert_not_called()
+        self.assertEqual(request.ip_address, "127.0.0.1")
+        self.assertEqual(self.batches[0][0][:2], ("127.0.0.1", "uk"))
+
+    def test_async_middleware_does_not_wait_for_a_full_queue(self) -> None:
+        """
+        Test that under ASGI the middleware is a coroutine that drops instead of blocking.
+        """
+
+        async def get_response(request: Any) -> HttpResponse:
+            return HttpResponse()
+
+        middleware = UserStatsMiddleware(get_response)
+        self.buffer.enqueue_timeout = 5
+        for _ in range(3):
+            self.buffer.enqueue("1.1.1.1", "en", "now")
+
+        with mock.patch("geoip.middleware.user_stat_buffer", self.buffer):
+            started = time.monotonic()
+            response = asyncio.run(middleware(RequestFactory().get("/")))
+
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(self.buffer.dropped, 1)
+
+
+def make_fake_redis() -> utils.InstrumentedRedis:
+    """
+    Builds an instrumented client backed by an in-process fake Redis server.
+    """
+    pool = redis.ConnectionPool(connection_class=FakeConnection, server=FakeServer())
+    return utils.InstrumentedRedis(connection_pool=pool)
+
+
+class RedisRoundTripTests(SimpleTestCase):
+    def setUp(self) -> None:
+        """
+        Route the shared Redis client to a fake server and stub out GeoIP.
+        """
+        self.redis = make_fake_redis()
+        for patch in (
+            mock.patch.object(utils, "redis_client", self.redis),
+            mock.patch.object(utils, "get_country_from_ip", return_value="Ukraine"),
+            mock.patch.object(
+                utils,
+                "get_countries_from_ips",
+                side_effect=lambda ips: {ip: "Ukraine" for ip in ips},
+            ),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_save_user_stat_is_a_single_round_trip(self) -> None:
+        """
+        Test that the hash and its TTL are written in one transactional round-trip.
+        """
+        with utils.count_redis_round_trips() as round_trips:
+            utils.save_user_stat("1.1.1.1", "en")
+
+        self.assertEqual(round_trips.count, 1)
+        self.assertEqual(self.redis.hget("user_stat:1.1.1.1", "country"), b"Ukraine")
+        self.assertGreater(self.redis.ttl("user_stat:1.1.1.1"), 0)
+
+    def test_batch_is_written_in_one_round_trip(self) -> None:
+        """
+        Test that a batch is written with a single pipeline keeping the latest entry per IP.
+        """
+        with utils.count_redis_round_trips() as round_trips:
+            stats = utils.save_user_stats_batch(
+                [
+                    ("1.1.1.1", "en", "2026-10-17T10:01:00+00:00"),
+                    ("2.2.2.2", "uk", "2026-10-17T10:02:00+00:00"),
+                    ("1.1.1.1", "de", "2026-10-17T10:03:00+00:00"),
+                ]
+            )
+
+        self.assertEqual(round_trips.count, 1)
+        self.assertEqual(len(stats), 2)
+        self.assertEqual(self.redis.hget("user_stat:1.1.1.1", "language"), b"de")
+        self.assertGreater(self.redis.ttl("user_stat:2.2.2.2"), 0)
+
+    def test_requests_make_no_round_trips(self) -> None:
+        """
+        Test that serving a request does not talk to Redis for user statistics.
+        """
+        buffer = UserStatBuffer(lambda batch: None)
+        with mock.patch("geoip.middleware.user_stat_buffer", buffer), mock.patch.object(
+            buffer, "_ensure_started"
+        ), utils.count_redis_round_trips() as round_trips:
+            UserStatsMiddleware(lambda request: HttpResponse())(RequestFactory().get("/"))
+
+        self.assertEqual(round_trips.count, 0)
+
+    def test_user_stats_are_read_in_one_round_trip(self) -> None:
+        """
+        Test that many IP addresses are fetched with a single pipeline.
+        """
+        utils.save_user_stats_batch(
+            [
+                ("1.1.1.1", "en", "2026-10-17T10:01:00+00:00"),
+                ("2.2.2.2", "uk", "2026-10-17T10:02:00+00:00"),
+            ]
+        )
+
+        with utils.count_redis_round_trips() as round_trips:
+            stats = utils.get_user_stats(["2.2.2.2", "3.3.3.3", "1.1.1.1", "2.2.2.2"])
+
+        self.assertEqual(round_trips.count, 1)
+        self.assertEqual(list(stats), ["2.2.2.2", "3.3.3.3", "1.1.1.1"])
+        self.assertEqual(stats["2.2.2.2"]["language"], "uk")  # type: ignore
+        self.assertIsNone(stats["3.3.3.3"])
+
+    @override_settings(RATE_LIMIT_BACKEND="testtask.ratelimit.InMemoryRateLimitBackend")
+    def test_graphql_batch_query_and_mutation_are_single_round_trips(self) -> None:
+        """
+        Test that `createUserStats` and `userStats` each make one Redis round-trip.
+        """
+        request = RequestFactory().post("/ip/graphql/")
+        request.user = AnonymousUser()
+        mutation = """mutation {
+            createUserStats(stats: [
+                {ipAddress: "1.1.1.1", language: "en"}, {ipAddress: "2.2.2.2", language: "uk"}
+            ]) { success userStats { ipAddress country } }
+        }"""
+        with utils.count_redis_round_trips() as round_trips:
+            created = schema.execute(mutation, context_value=request)
+        self.assertIsNone(created.errors)
+        self.assertEqual(round_trips.count, 1)
+        self.assertEqual(created.data["createUserStats"]["success"], "2 user stat(s) added")
+
+        query = (
+            '{ userStats(ipAddresses: ["2.2.2.2", "9.9.9.9", "1.1.1.1"]) { ipAddress language } }'
+        )
+        with utils.count_redis_round_trips() as round_trips:
+            result = schema.execute(query, context_value=request)
+        self.assertEqual(round_trips.count, 1)
+        self.assertEqual(
+            result.data["userStats"],
+            [
+                {"ipAddress": "2.2.2.2", "language": "uk"},
+                None,
+                {"ipAddress": "1.1.1.1", "language": "en"},
+            ],
+        )
+
+    @override_settings(USER_STATS_MAX_BATCH_SIZE=2)
+    def test_oversized_batches_are_rejected(self) -> None:
+        """
+        Test that a query for more addresses than allowed fails without touching Redis.
+        """
+        with utils.count_redis_round_trips() as round_trips:
+            result = schema.execute(
+                '{ userStats(ipAddresses: ["1.1.1.1", "2.2.2.2", "3.3.3.3"]) { ipAddress } }'
+            )
+
+        self.assertIn("At most 2", result.errors[0].message)
+        self.assertEqual(round_trips.count, 0)
+
+    def test_visits_are_rolled_up_in_the_same_round_trip(self) -> None:
+        """
+        Test that every visit of a batch is counted per minute and hour with unique visitors.
+        """
+        entries = [
+            ("1.1.1.1", "en", "2026-10-17T10:15:20+00:00"),
+            ("2.2.2.2", "uk", "2026-10-17T10:15:50+00:00"),
+            ("1.1.1.1", "en", "2026-10-17T10:42:00+00:00"),
+        ]
+        with utils.count_redis_round_trips() as round_trips:
+            utils.save_user_stats_batch(entries)
+        self.assertEqual(round_trips.count, 1)
+
+        hour = cast(Dict[bytes, bytes], self.redis.hgetall("user_stats:hour:2026101710"))
+        self.assertEqual(hour[b"visits"], b"3")
+        self.assertEqual(hour[b"language:en"], b"2")
+        self.assertEqual(hour[b"country:Ukraine"], b"3")
+        self.assertEqual(self.redis.pfcount("user_stats:hour:2026101710:visitors"), 2)
+        self.assertEqual(self.redis.hget("user_stats:minute:202610171015", "visits"), b"2")
+        self.assertGreater(self.redis.ttl("user_stats:minute:202610171015:visitors"), 0)
+
+    def test_visitor_series_is_read_per_bucket_in_one_round_trip(self) -> None:
+        """
+        Test that `visitorStats` reads a range with one pipeline, including empty buckets.
+        """
+        utils.save_user_stats_batch(
+            [
+                ("1.1.1.1", "en", "2026-10-17T09:59:00+00:00"),
+                ("2.2.2.2", "uk", "2026-10-17T11:01:00+00:00"),
+                ("1.1.1.1", "uk", "2026-10-17T11:30:00+00:00"),
+            ]
+        )
+        query = """{
+            visitorStats(start: "2026-10-17T09:30:00+00:00", end: "2026-10-17T11:59:00+00:00") {
+                uniqueVisitors buckets { start visits uniqueVisitors languages { name count } }
+            }
+        }"""
+        with utils.count_redis_round_trips() as round_trips:
+            result = schema.execute(query)
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(round_trips.count, 1)
+        series = result.data["visitorStats"]
+        self.assertEqual(series["uniqueVisitors"], 2)
+        self.assertEqual([bucket["visits"] for bucket in series["buckets"]], [1, 0, 2])
+        self.assertEqual(series["buckets"][2]["uniqueVisitors"], 2)
+        self.assertEqual(series["buckets"][2]["languages"], [{"name": "uk", "count": 2}])
+
+    @override_settings(USER_STATS_MAX_BUCKETS=60)
+    def test_visitor_series_range_is_limited(self) -> None:
+        """
+        Test that ranges with too many buckets are rejected without touching Redis.
+        """
+        query = '{ visitorStats(granularity: "minute", start: "2026-10-17T09:00:00+00:00", end: "2026-10-17T11:00:00+00:00") { visits: uniqueVisitors } }'  # noqa: E501
+        with utils.count_redis_round_trips() as round_trips:
+            result = schema.execute(query)
+
+        self.assertIn("At most 60 buckets", result.errors[0].message)
+        self.assertEqual(round_trips.count, 0)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_visitor_stats_endpoint_reads_with_the_async_client(self) -> None:
+        """
+        Test that the async stats endpoint serves the rollups through the asyncio client.
+        """
+        utils.save_user_stats_batch(
+            [
+                ("1.1.1.1", "en", "2026-10-17T09:59:00+00:00"),
+                ("2.2.2.2", "uk", "2026-10-17T11:01:00+00:00"),
+            ]
+        )
+        async_redis = FakeAsyncRedis(server=self.redis.connection_pool.connection_kwargs["server"])
+        url = reverse("visitor_stats")
+        with mock.patch.object(utils, "get_async_redis_client", return_value=async_redis):
+            response = self.client.get(
+                url, {"start": "2026-10-17T09:30:00+00:00", "end": "2026-10-17T11:59:00+00:00"}
+            )
+            invalid = [
+                self.client.get(url, {"granularity": "day"}),
+                self.client.get(url, {"start": "yesterday"}),
+            ]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["unique_visitors"], 2)
+        self.assertEqual([bucket["visits"] for bucket in response.json()["buckets"]], [1, 0, 1])
+        self.assertEqual([response.status_code for response in invalid], [400, 400])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    GRAPHQL_SLOW_OPERATION_MS=0,
+)
+class CustomGraphQLViewTests(TestCase):
+    url = "/ip/graphql/"
+    query = "query RootComments { comments(first: 5) { id username } }"
+
+    def setUp(self) -> None:
+        """
+        Start every test with empty document and persisted query caches.
+        """
+        document_cache.clear()
+        cache.clear()
+
+    def post(self, data: Dict[str, Any]) -> Any:
+        return self.client.post(self.url, data, content_type="application/json")
+
+    def test_documents_are_parsed_once(self) -> None:
+        """
+        Test that a repeated query is served from the document cache.
+        """
+        first = self.post({"query": self.query})
+        second = self.post({"query": self.query})
+
+        self.assertEqual(second.json(), {"data": {"comments": []}})
+        self.assertIn('desc="parsed"', first["Server-Timing"])
+        self.assertIn('desc="cached"', second["Server-Timing"])
+        self.assertEqual(document_cache.info(), {"hits": 1, "misses": 1, "size": 1})
+
+    def test_persisted_queries_are_registered_and_resolved_by_hash(self) -> None:
+        """
+        Test the automatic persisted query round-trip of a client.
+        """
+        sha256_hash = hashlib.sha256(self.query.encode()).hexdigest()
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": sha256_hash}}
+
+        missing = self.post({"extensions": extensions})
+        self.assertEqual(missing.status_code, 200)
+        self.assertEqual(missing.json()["errors"][0]["message"], "PersistedQueryNotFound")
+
+        self.assertEqual(
+            self.post({"query": self.query, "extensions": extensions}).status_code, 200
+        )
+        response = self.client.get(
+            self.url, {"extensions": json.dumps(extensions)}, HTTP_ACCEPT="application/json"
+        )
+        self.assertEqual(response.json(), {"data": {"comments": []}})
+
+        wrong = {"persistedQuery": {"version": 1, "sha256Hash": "0" * 64}}
+        self.assertEqual(self.post({"query": self.query, "extensions": wrong}).status_code, 400)
+
+    def test_resolver_timings_are_logged(self) -> None:
+        """
+        Test that slow operations are logged with their per-resolver times.
+        """
+        with self.assertLogs("geoip.views", "WARNING") as logs:
+            self.post({"query": self.query})
+
+        self.assertIn("GraphQL RootComments", logs.output[0])
+        self.assertIn("Query.comments", logs.output[0])
@@ -1,6 +1,9 @@
 from django.urls import path
-from graphene_django.views import GraphQLView
+
+from geoip.views import CustomGraphQLView, visitor_stats
+from testtask.schema import validation_rules
 
 urlpatterns = [
-    path("graphql/", GraphQLView.as_view(graphiql=True)),
+    path("graphql/", CustomGraphQLView.as_view(graphiql=True, validation_rules=validation_rules)),
+    path("stats/visitors/", visitor_stats, name="visitor_stats"),
 ]
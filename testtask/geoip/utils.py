@@ -1,27 +1,240 @@
-from typing import Any, Dict, Optional
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import redis
+import redis.asyncio
 from django.conf import settings
 from django.utils.timezone import now
 from geoip2.database import Reader
+from geoip2.errors import AddressNotFoundError
+from maxminddb import MODE_MMAP
 
-# Initialize Redis client
-redis_client = redis.StrictRedis(host="testtask-redis", port=6379, db=0)
+from geoip.analytics import add_rollups, aread_rollups, read_rollups
+
+logger = logging.getLogger(__name__)
+
+_round_trip_counter: ContextVar[Optional["RoundTripCounter"]] = ContextVar(
+    "redis_round_trip_counter", default=None
+)
+
+
+class RoundTripCounter:
+    """
+    Number of Redis round-trips made inside a `count_redis_round_trips` block.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+
+
+@contextmanager
+def count_redis_round_trips() -> Iterator[RoundTripCounter]:
+    """
+    Counts the Redis round-trips made by the current thread or task, e.g. per request.
+
+    Yields:
+        RoundTripCounter: The counter, updated while the block runs.
+    """
+    counter = RoundTripCounter()
+    token = _round_trip_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _round_trip_counter.reset(token)
+
+
+def _record_round_trip() -> None:
+    counter = _round_trip_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+class InstrumentedPipeline(redis.client.Pipeline):  # type: ignore
+    """
+    Pipeline that counts each `execute()` as a single round-trip.
+    """
+
+    def execute(self, raise_on_error: bool = True) -> List[Any]:
+        if self.command_stack:
+            _record_round_trip()
+        return super().execute(raise_on_error)  # type: ignore
+
+    def immediate_execute_command(self, *args: Any, **options: Any) -> Any:
+        _record_round_trip()
+        return super().immediate_execute_command(*args, **options)
+
+
+class InstrumentedRedis(redis.StrictRedis):  # type: ignore
+    """
+    Redis client that counts round-trips, see `count_redis_round_trips`.
+    """
+
+    def execute_command(self, *args: Any, **options: Any) -> Any:
+        _record_round_trip()
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Any = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+# Shared connection pool; blocks for up to REDIS_POOL_TIMEOUT when all connections are busy
+redis_pool = redis.BlockingConnectionPool.from_url(
+    settings.REDIS_URL,
+    max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+    timeout=settings.REDIS_POOL_TIMEOUT,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+    socket_keepalive=True,
+    health_check_interval=30,
+)
+redis_client = InstrumentedRedis(connection_pool=redis_pool)
+
+# Connections of redis.asyncio belong to the event loop they were opened on
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, redis.asyncio.Redis]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_async_redis_client() -> redis.asyncio.Redis:
+    """
+    Returns the asyncio Redis client of the running event loop, creating it on first use.
+
+    An ASGI worker runs a single loop, so it shares one pool like `redis_client` does;
+    code run through `async_to_sync` gets a client per loop instead of a broken one.
+
+    Returns:
+        redis.asyncio.Redis: The client bound to the running loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = redis.asyncio.Redis(
+            connection_pool=redis.asyncio.BlockingConnectionPool.from_url(
+                settings.REDIS_URL,
+                max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+                timeout=settings.REDIS_POOL_TIMEOUT,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+                socket_keepalive=True,
+                health_check_interval=30,
+            )
+        )
+        _async_clients[loop] = client
+    return client
+
+
+# User statistics expire after 24 hours
+USER_STAT_TTL = 86400
+
+_reader: Optional[Reader] = None
+_reader_mtime: Optional[float] = None
+_reader_checked_at = 0.0
+_reader_lock = threading.Lock()
+
+
+def get_geoip_reader() -> Reader:
+    """
+    Returns the process-wide GeoIP reader, opening the database on first use.
+
+    The database is memory-mapped, so it is parsed once and shared by all requests.
+    At most every `GEOIP_RELOAD_INTERVAL` seconds the file modification time is checked
+    and the reader is reopened when the database was updated.
+
+    Returns:
+        Reader: The GeoIP database reader.
+    """
+    global _reader, _reader_mtime, _reader_checked_at
+
+    current_time = time.monotonic()
+    if _reader is not None and current_time - _reader_checked_at < settings.GEOIP_RELOAD_INTERVAL:
+        return _reader
+
+    with _reader_lock:
+        mtime = os.stat(settings.GEOIP_PATH).st_mtime
+        if _reader is None or mtime != _reader_mtime:
+            # The previous reader is left to the garbage collector, as other threads
+            # may still be using it.
+            _reader = Reader(settings.GEOIP_PATH, mode=MODE_MMAP)
+            _reader_mtime = mtime
+            _lookup_country.cache_clear()
+        _reader_checked_at = current_time
+        return _reader
+
+
+@functools.lru_cache(maxsize=settings.GEOIP_CACHE_SIZE)
+def _lookup_country(ip: str) -> str:
+    try:
+        response = get_geoip_reader().city(ip)
+    except (AddressNotFoundError, ValueError):
+        return "Unknown"
+    return response.country.name or "Unknown"
 
 
 def get_country_from_ip(ip: str) -> str:
     """
     Retrieve the country name from an IP address using the GeoIP database.
 
+    Results are kept in a bounded LRU cache, which is cleared when the database is reloaded.
+
     Args:
         ip (str): The IP address to lookup.
 
     Returns:
         str: The country name associated with the IP address, or "Unknown" if lookup fails.
     """
-    reader = Reader(settings.GEOIP_PATH)
-    response = reader.city(ip)
-    return response.country.name or "Unknown"
+    get_geoip_reader()
+    return _lookup_country(ip)
+
+
+def get_countries_from_ips(ips: Iterable[str]) -> Dict[str, str]:
+    """
+    Retrieve the country names of many IP addresses at once.
+
+    The reader is checked for updates once for the whole batch and every distinct
+    address is looked up once, through the same LRU cache as `get_country_from_ip`.
+    If the database cannot be opened, all addresses map to "Unknown" and a single
+    warning is logged instead of one per address.
+
+    Args:
+        ips (Iterable[str]): The IP addresses to lookup, possibly with duplicates.
+
+    Returns:
+        Dict[str, str]: The country name of each distinct IP address.
+    """
+    unique_ips = dict.fromkeys(ips)
+    try:
+        get_geoip_reader()
+    except Exception as e:
+        logger.warning("GeoIP lookup failed for %d address(es): %s", len(unique_ips), e)
+        return {ip: "Unknown" for ip in unique_ips}
+    return {ip: _lookup_country(ip) for ip in unique_ips}
+
+
+def get_geoip_cache_info() -> Dict[str, Optional[int]]:
+    """
+    Returns the hit/miss counters of the IP to country LRU cache.
+
+    Returns:
+        Dict[str, Optional[int]]: The hits, misses, current size and maximum size.
+    """
+    info = _lookup_country.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+    }
 
 
 def save_user_stat(ip: str, language: str) -> Optional[Dict[str, str]]:
@@ -40,29 +253,81 @@ def save_user_stat(ip: str, language: str) -> Optional[Dict[str, str]]:
     timestamp = now().isoformat()
 
     redis_key = f"user_stat:{ip}"
+    stat = {
+        "ip_address": ip,
+        "country": country,
+        "language": language,
+        "timestamp": timestamp,
+    }
     try:
-        redis_client.hset(
-            redis_key,
-            mapping={
-                "ip_address": ip,
-                "country": country,
-                "language": language,
-                "timestamp": timestamp,
-            },
-        )
-        redis_client.expire(redis_key, 86400)  # Set expiration to 24 hours
-        return {
-            "ip_address": ip,
-            "country": country,
-            "language": language,
-            "timestamp": timestamp,
-        }
+        # Write the hash, its TTL and the rollups atomically in a single round-trip
+        pipeline = redis_client.pipeline(transaction=True)
+        pipeline.hset(redis_key, mapping=stat)
+        pipeline.expire(redis_key, USER_STAT_TTL)
+        add_rollups(pipeline, [stat])
+        pipeline.execute()
+        return stat
     except redis.ConnectionError as e:
         # Log Redis connection error
         print(f"Redis Connection Error: {e}")
         return None
 
 
+def save_user_stats_batch(entries: Iterable[Tuple[str, str, str]]) -> List[Dict[str, str]]:
+    """
+    Save a batch of user statistics in Redis with a single pipelined round-trip.
+
+    Only the most recent entry per IP address is written, as each write replaces
+    the whole `user_stat:<ip>` hash anyway. Every entry is counted in the visitor
+    rollups, see `geoip.analytics.add_rollups`.
+
+    Args:
+        entries (Iterable[Tuple[str, str, str]]): (ip, language, timestamp) tuples,
+                                                  oldest first.
+
+    Returns:
+        List[Dict[str, str]]: The saved user statistics.
+
+    Raises:
+        redis.RedisError: If the batch could not be written.
+    """
+    entries = list(entries)
+    latest: Dict[str, Tuple[str, str]] = {}
+    for ip, language, timestamp in entries:
+        latest[ip] = (language, timestamp)
+
+    countries = get_countries_from_ips(latest)
+    stats: List[Dict[str, str]] = []
+    pipeline = redis_client.pipeline(transaction=False)
+    for ip, (language, timestamp) in latest.items():
+        stat = {
+            "ip_address": ip,
+            "country": countries[ip],
+            "language": language,
+            "timestamp": timestamp,
+        }
+        redis_key = f"user_stat:{ip}"
+        pipeline.hset(redis_key, mapping=stat)
+        pipeline.expire(redis_key, USER_STAT_TTL)
+        stats.append(stat)
+
+    if stats:
+        add_rollups(
+            pipeline,
+            (
+                {
+                    "ip_address": ip,
+                    "country": countries[ip],
+                    "language": language,
+                    "timestamp": timestamp,
+                }
+                for ip, language, timestamp in entries
+            ),
+        )
+        pipeline.execute()
+    return stats
+
+
 def get_user_stat(ip: str) -> Optional[Dict[str, Any]]:
     """
     Retrieve user statistics from Redis by IP address.
@@ -100,3 +365,71 @@ def get_user_stat(ip: str) -> Optional[Dict[str, Any]]:
         # Log any unexpected exceptions
         print(f"Unexpected Error in get_user_stat: {e}")
         return None
+
+
+# Fields of a `user_stat:<ip>` hash, in the order they are fetched.
+USER_STAT_FIELDS = ("ip_address", "country", "language", "timestamp")
+
+
+def get_user_stats(ips: Iterable[str]) -> Dict[str, Optional[Dict[str, Optional[str]]]]:
+    """
+    Retrieve the statistics of many IP addresses from Redis in a single round-trip.
+
+    Args:
+        ips (Iterable[str]): The IP addresses to fetch, possibly with duplicates.
+
+    Returns:
+        Dict[str, Optional[Dict[str, Optional[str]]]]: The statistics of each distinct
+            IP address, or None for addresses without statistics.
+
+    Raises:
+        redis.RedisError: If the statistics could not be read.
+    """
+    unique_ips = list(dict.fromkeys(ips))
+    if not unique_ips:
+        return {}
+
+    pipeline = redis_client.pipeline(transaction=False)
+    for ip in unique_ips:
+        pipeline.hmget(f"user_stat:{ip}", USER_STAT_FIELDS)
+
+    stats: Dict[str, Optional[Dict[str, Optional[str]]]] = {}
+    for ip, values in zip(unique_ips, pipeline.execute()):
+        if not any(values):
+            stats[ip] = None
+            continue
+        stats[ip] = {
+            field: value.decode("utf-8") if value else None
+            for field, value in zip(USER_STAT_FIELDS, values)
+        }
+    return stats
+
+
+def get_visitor_series(granularity: str, start: datetime, end: datetime) -> Dict[str, Any]:
+    """
+    Retrieve visit counts per country and language over a time range, see `read_rollups`.
+
+    Args:
+        granularity (str): "minute" or "hour".
+        start (datetime): The start of the range.
+        end (datetime): The end of the range, inclusive.
+
+    Returns:
+        Dict[str, Any]: The buckets of the range and its estimated unique visitors.
+
+    Raises:
+        ValueError: If the granularity or range is invalid.
+        redis.RedisError: If the rollups could not be read.
+    """
+    return read_rollups(redis_client, granularity, start, end)
+
+
+async def aget_visitor_series(granularity: str, start: datetime, end: datetime) -> Dict[str, Any]:
+    """
+    Async version of `get_visitor_series` using the asyncio Redis client of the running loop.
+
+    Raises:
+        ValueError: If the granularity or range is invalid.
+        redis.RedisError: If the rollups could not be read.
+    """
+    return await aread_rollups(get_async_redis_client(), granularity, start, end)
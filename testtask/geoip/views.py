@@ -1,37 +1,367 @@
-from typing import Any
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
 
-from graphene_django.views import GraphQLView
-from utils import redis_client
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.dispatch import receiver
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+    JsonResponse,
+)
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import (
+    DocumentNode,
+    ExecutionResult,
+    GraphQLError,
+    OperationType,
+    execute,
+    get_operation_ast,
+    parse,
+    validate,
+)
+from redis.exceptions import RedisError
 
+from geoip.analytics import GRANULARITIES
+from geoip.utils import aget_visitor_series
 
-class CustomGraphQLView(GraphQLView):  # type: ignore
+logger = logging.getLogger(__name__)
+
+PERSISTED_QUERY_NOT_FOUND = "PersistedQueryNotFound"
+
+
+class DocumentCache:
     """
-    Custom GraphQLView with additional logging of user IP and language to Redis.
+    Bounded LRU cache of parsed and validated GraphQL documents keyed by a hash of the query.
+
+    Clients send the same few query strings over and over, so parsing and validating
+    them once per process saves both on every later request. Queries that fail to parse
+    or validate are cached with their errors.
     """
 
-    def execute_graphql_request(self, *args: Any, **kwargs: Any) -> Any:
+    def __init__(self, max_size: int) -> None:
+        """
+        Args:
+            max_size (int): The maximum number of cached documents.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._documents: "OrderedDict[bytes, Tuple[Optional[DocumentNode], List[GraphQLError]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(
+        self, schema: Any, query: str, validation_rules: Any
+    ) -> Tuple[Optional[DocumentNode], List[GraphQLError], bool]:
         """
-        Executes a GraphQL request while logging the user's IP and language to Redis.
+        Parses and validates the query, reusing the result for an identical earlier query.
 
         Args:
-            *args: Positional arguments passed to the GraphQL request.
-            **kwargs: Keyword arguments passed to the GraphQL request.
+            schema (GraphQLSchema): The schema to validate against.
+            query (str): The GraphQL query string.
+            validation_rules (Any): The rules to validate with, or None for the defaults.
 
         Returns:
-            Any: The result of the GraphQL request execution.
+            Tuple: The document (None if it could not be parsed), the parse or validation
+                errors, and whether the result came from the cache.
+        """
+        key = hashlib.blake2b(query.encode(), digest_size=16).digest()
+        with self._lock:
+            cached = self._documents.get(key)
+            if cached is not None:
+                self._documents.move_to_end(key)
+                self.hits += 1
+                return cached[0], cached[1], True
+            self.misses += 1
+
+        try:
+            document: Optional[DocumentNode] = parse(query)
+        except GraphQLError as e:
+            document, errors = None, [e]
+        else:
+            errors = validate(
+                schema, document, validation_rules, graphene_settings.MAX_VALIDATION_ERRORS
+            )
+        with self._lock:
+            self._documents[key] = (document, errors)
+            if len(self._documents) > self.max_size:
+                self._documents.popitem(last=False)
+        return document, errors, False
+
+    def info(self) -> Dict[str, int]:
+        """
+        Returns the hit and miss counters and the current size.
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._documents)}
+
+    def clear(self) -> None:
+        """
+        Empties the cache and resets its counters.
+        """
+        with self._lock:
+            self._documents.clear()
+            self.hits = self.misses = 0
+
+
+document_cache = DocumentCache(max_size=settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+
+
+@receiver(setting_changed)
+def clear_document_cache(setting: str, **kwargs: Any) -> None:
+    """
+    Drops cached validation results when a setting the validation rules read changes.
+    """
+    if setting.startswith("GRAPHQL_"):
+        document_cache.clear()
+
+
+class ResolverTimingMiddleware:
+    """
+    Graphene middleware that adds up the time spent in each resolver per request.
+
+    Timings are collected in `request.graphql_resolver_timings` as
+    `{"Type.field": [calls, seconds]}`, which `CustomGraphQLView` sets up and reports.
+    The time of a resolver excludes the resolvers of its nested fields.
+    """
+
+    def resolve(self, next: Any, root: Any, info: Any, **args: Any) -> Any:
+        timings = getattr(info.context, "graphql_resolver_timings", None)
+        if timings is None:
+            return next(root, info, **args)
+
+        started = time.perf_counter()
+        try:
+            return next(root, info, **args)
+        finally:
+            timing = timings[f"{info.parent_type.name}.{info.field_name}"]
+            timing[0] += 1
+            timing[1] += time.perf_counter() - started
+
+
+class CustomGraphQLView(GraphQLView):  # type: ignore
+    """
+    GraphQL endpoint with cached query parsing, persisted queries and timing metrics.
+
+    - Parsed and validated documents are kept in `document_cache`.
+    - Automatic persisted queries: a client may send only the SHA-256 of a query in
+      `extensions.persistedQuery.sha256Hash`. Unknown hashes are answered with
+      `PersistedQueryNotFound`, after which the client sends the query with its hash
+      once and it is stored for `GRAPHQL_PERSISTED_QUERY_TTL` seconds.
+    - Parse, execution and per-resolver times are logged and returned in a
+      `Server-Timing` header.
+    """
+
+    def dispatch(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        request.graphql_timings = {}  # type: ignore
+        request.graphql_resolver_timings = defaultdict(lambda: [0, 0.0])  # type: ignore
+        response: HttpResponse = super().dispatch(request, *args, **kwargs)
+
+        timings: Dict[str, Any] = request.graphql_timings  # type: ignore
+        if "parse" in timings:
+            timings.setdefault("execute", 0.0)
+            response["Server-Timing"] = ", ".join(
+                [
+                    f'graphql-parse;dur={timings["parse"] * 1000:.2f};'
+                    f'desc="{"cached" if timings["cached"] else "parsed"}"',
+                    f'graphql-execute;dur={timings["execute"] * 1000:.2f}',
+                ]
+            )
+            self.log_timings(request)
+        return response
+
+    def get_graphql_params(
+        self, request: HttpRequest, data: Dict[str, Any]
+    ) -> Tuple[Optional[str], Any, Optional[str], Any]:
+        """
+        Reads the GraphQL parameters, resolving persisted queries by their hash.
+
+        Raises:
+            HttpError: If the hash is unknown or does not match the query sent with it.
+        """
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+
+        extensions = request.GET.get("extensions") or data.get("extensions") or {}
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        persisted_query = extensions.get("persistedQuery") if isinstance(extensions, dict) else None
+        if not isinstance(persisted_query, dict) or "sha256Hash" not in persisted_query:
+            return query, variables, operation_name, id
+
+        sha256_hash = str(persisted_query["sha256Hash"])
+        cache_key = f"graphql:persisted_query:{sha256_hash}"
+        if query:
+            if hashlib.sha256(query.encode()).hexdigest() != sha256_hash:
+                raise HttpError(HttpResponseBadRequest("The hash does not match the query."))
+            cache.set(cache_key, query, settings.GRAPHQL_PERSISTED_QUERY_TTL)
+        else:
+            query = cache.get(cache_key)
+            if query is None:
+                raise HttpError(HttpResponse(status=200), PERSISTED_QUERY_NOT_FOUND)
+        return query, variables, operation_name, id
+
+    def execute_graphql_request(
+        self,
+        request: HttpRequest,
+        data: Dict[str, Any],
+        query: Optional[str],
+        variables: Any,
+        operation_name: Optional[str],
+        show_graphiql: bool = False,
+    ) -> Optional[ExecutionResult]:
+        """
+        Executes a GraphQL request like `GraphQLView` does, with the document taken from
+        `document_cache` and the parse and execution times recorded on the request.
         """
-        # Extract IP and language from the request
-        ip: str = self.request.META.get("REMOTE_ADDR", "0.0.0.0")
-        language: str = self.request.headers.get("Accept-Language", "Unknown").split(",")[0]
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
 
-        # Log to Redis
-        redis_key: str = f"stat:{ip}"
+        timings: Dict[str, Any] = request.graphql_timings  # type: ignore
+        started = time.perf_counter()
+        document, errors, timings["cached"] = document_cache.get(
+            self.schema.graphql_schema, query, self.validation_rules
+        )
+        timings["parse"] = time.perf_counter() - started
+        timings["operation"] = operation_name
+        if errors or document is None:
+            return ExecutionResult(data=None, errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if operation_ast is not None and operation_ast.name and not operation_name:
+            timings["operation"] = operation_ast.name.value
+        is_mutation = (
+            operation_ast is not None and operation_ast.operation == OperationType.MUTATION
+        )
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and (operation_ast.operation != OperationType.QUERY)
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    f"Can only perform a {operation_ast.operation.value} operation from a POST request.",
+                )
+            )
+
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+
+        started = time.perf_counter()
         try:
-            redis_client.hset(redis_key, mapping={"ip_address": ip, "language": language})
-            redis_client.expire(redis_key, 86400)  # Set key to expire after 24 hours
+            if is_mutation and (
+                graphene_settings.ATOMIC_MUTATIONS is True
+                or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+            ):
+                with transaction.atomic():
+                    result = execute(self.schema.graphql_schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+            return execute(self.schema.graphql_schema, document, **execute_options)
         except Exception as e:
-            # Log error (replace print with a proper logging mechanism)
-            print(f"Error logging to Redis: {e}")
+            return ExecutionResult(errors=[e])
+        finally:
+            timings["execute"] = time.perf_counter() - started
+
+    @staticmethod
+    def log_timings(request: HttpRequest) -> None:
+        """
+        Logs the times of a GraphQL operation with its slowest resolvers.
+
+        Operations slower than `GRAPHQL_SLOW_OPERATION_MS` are logged as warnings.
+        """
+        timings: Dict[str, Any] = request.graphql_timings  # type: ignore
+        resolvers = sorted(
+            request.graphql_resolver_timings.items(),  # type: ignore
+            key=lambda item: item[1][1],
+            reverse=True,
+        )
+        slowest = ", ".join(
+            f"{field} {seconds * 1000:.1f}ms/{calls}" for field, (calls, seconds) in resolvers[:5]
+        )
+        total_ms = (timings["parse"] + timings["execute"]) * 1000
+        logger.log(
+            logging.WARNING if total_ms > settings.GRAPHQL_SLOW_OPERATION_MS else logging.DEBUG,
+            "GraphQL %s: parse %.1fms (%s), execute %.1fms, slowest resolvers: %s",
+            timings["operation"] or "anonymous operation",
+            timings["parse"] * 1000,
+            "cached" if timings["cached"] else "parsed",
+            timings["execute"] * 1000,
+            slowest or "none",
+        )
+
+
+@never_cache
+@require_GET
+async def visitor_stats(request: HttpRequest) -> HttpResponse:
+    """
+    Returns the visitor rollups of a time range as JSON, like the `visitorStats` query.
+
+    Accepts `granularity` ("minute" or "hour") and ISO 8601 `start` and `end`; the
+    range defaults to the last 24 buckets. Redis is read with the asyncio client, so
+    under ASGI a slow Redis suspends the request instead of occupying a thread.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        JsonResponse: The buckets and unique visitors of the range, 400 for invalid
+            parameters, or 503 when Redis is unavailable.
+    """
+    granularity = request.GET.get("granularity", "hour")
+    if granularity not in GRANULARITIES:
+        return JsonResponse(
+            {"error": f"Granularity must be one of: {', '.join(GRANULARITIES)}."}, status=400
+        )
+
+    bounds = {}
+    for name in ("start", "end"):
+        value = request.GET.get(name)
+        try:
+            bounds[name] = parse_datetime(value) if value else None
+        except ValueError:
+            bounds[name] = None
+        if value and bounds[name] is None:
+            return JsonResponse({"error": f"Invalid {name} timestamp."}, status=400)
+    end = bounds["end"] or now()
+    start = bounds["start"] or end - 23 * GRANULARITIES[granularity][0]
 
-        # Proceed with the GraphQL request execution
-        return super().execute_graphql_request(*args, **kwargs)
+    try:
+        series = await aget_visitor_series(granularity, start, end)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except RedisError as e:
+        logger.error("Failed to read visitor stats: %s", e)
+        return JsonResponse({"error": "Statistics are unavailable."}, status=503)
+    return JsonResponse({"granularity": granularity, **series})
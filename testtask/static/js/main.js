@@ -2,29 +2,29 @@ document.addEventListener('DOMContentLoaded', function () {
     // -----------------------------
     // Reply Form Script
     // -----------------------------
-    const replyLinks = document.querySelectorAll('.comment-reply');
     const replyForm = document.getElementById('reply-form');
     const parentInput = document.getElementById('parent-id');
     let currentParentComment = null;
 
-    replyLinks.forEach(link => {
-        link.addEventListener('click', function (event) {
-            event.preventDefault();
-
-            const commentId = this.getAttribute('data-comment-id');
-            const parentComment = this.closest('.comment-meta');
-
-            if (currentParentComment === parentComment) {
-                replyForm.style.display = 'none';
-                parentInput.value = '';
-                currentParentComment = null;
-            } else {
-                parentInput.value = commentId;
-                parentComment.appendChild(replyForm);
-                replyForm.style.display = 'block';
-                currentParentComment = parentComment;
-            }
-        });
+    // Delegated, so replies inserted by live updates get the handler too
+    document.addEventListener('click', function (event) {
+        const link = event.target.closest('.comment-reply');
+        if (!link) return;
+        event.preventDefault();
+
+        const commentId = link.getAttribute('data-comment-id');
+        const parentComment = link.closest('.comment-meta');
+
+        if (currentParentComment === parentComment) {
+            replyForm.style.display = 'none';
+            parentInput.value = '';
+            currentParentComment = null;
+        } else {
+            parentInput.value = commentId;
+            parentComment.appendChild(replyForm);
+            replyForm.style.display = 'block';
+            currentParentComment = parentComment;
+        }
     });
 
     // -----------------------------
@@ -134,5 +134,39 @@ document.addEventListener('DOMContentLoaded', function () {
                 console.error('There was a problem with the fetch operation:', error);
             });
         });
+
+    // -----------------------------
+    // Live Replies Script
+    // -----------------------------
+    const commentsList = document.querySelector('.comments-list');
+    const threadIds = Array.from(
+        commentsList.querySelectorAll(':scope > .single_comment_area'),
+        item => item.id.replace('comment-', '')
+    );
+
+    if (window.EventSource && threadIds.length) {
+        const params = new URLSearchParams(threadIds.map(id => ['thread', id]));
+        const events = new EventSource(`${commentsList.dataset.eventsUrl}?${params}`);
+
+        events.addEventListener('comment', function (event) {
+            const comment = JSON.parse(event.data);
+            const parent = document.getElementById(`comment-${comment.parent}`);
+            if (!parent || document.getElementById(`comment-${comment.id}`)) return;
+
+            let children = parent.querySelector(':scope > .children');
+            if (!children) {
+                children = document.createElement('ul');
+                children.className = 'children';
+                parent.appendChild(children);
+            }
+            // Replies are listed newest first
+            children.insertAdjacentHTML('afterbegin', comment.html);
+        });
+
+        // Sent when this page fell too far behind; reconnecting would skip replies
+        events.addEventListener('reset', function () {
+            events.close();
+        });
+    }
     });
 
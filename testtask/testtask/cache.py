@@ -0,0 +1,102 @@
+import logging
+import time
+from typing import Any, Callable, Dict
+
+from django.core.cache.backends.locmem import LocMemCache
+from django_redis.cache import RedisCache
+from django_redis.compressors.zlib import ZlibCompressor
+from redis.exceptions import ConnectionError, TimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Cache API methods that are served by the local fallback while Redis is unreachable.
+FALLBACK_METHODS = (
+    "add",
+    "get",
+    "set",
+    "touch",
+    "delete",
+    "get_many",
+    "set_many",
+    "delete_many",
+    "has_key",
+    "incr",
+    "decr",
+    "clear",
+)
+
+
+class FragmentCompressor(ZlibCompressor):  # type: ignore
+    """
+    Zlib compressor that leaves small values such as counters and flags uncompressed
+    and only pays the compression cost for larger values like rendered page fragments.
+    """
+
+    min_length = 1024
+
+
+class FallbackRedisCache(RedisCache):  # type: ignore
+    """
+    django-redis cache that falls back to a process-local LocMemCache while Redis is
+    unreachable, instead of failing the request.
+
+    After a connection error Redis is not retried for `FALLBACK_RETRY_INTERVAL` seconds,
+    so an outage costs one connection timeout per interval rather than one per call.
+    """
+
+    def __init__(self, server: str, params: Dict[str, Any]) -> None:
+        """
+        Args:
+            server (str): The Redis URL(s) from `LOCATION`.
+            params (Dict[str, Any]): The cache configuration. `OPTIONS` may contain
+                `FALLBACK_RETRY_INTERVAL` and `FALLBACK_MAX_ENTRIES`.
+        """
+        params = dict(params)
+        options = dict(params.get("OPTIONS", {}))
+        self._retry_interval: float = options.pop("FALLBACK_RETRY_INTERVAL", 30)
+        max_entries = options.pop("FALLBACK_MAX_ENTRIES", 1000)
+        params["OPTIONS"] = options
+        super().__init__(server, params)
+
+        self._redis_down_until = 0.0
+        self._fallback = LocMemCache(
+            f"fallback:{server}",
+            {
+                "TIMEOUT": params.get("TIMEOUT", 300),
+                "KEY_PREFIX": params.get("KEY_PREFIX", ""),
+                "VERSION": params.get("VERSION", 1),
+                "OPTIONS": {"MAX_ENTRIES": max_entries},
+            },
+        )
+
+    @property
+    def is_using_fallback(self) -> bool:
+        """
+        Whether calls are currently served by the local fallback cache.
+        """
+        return time.monotonic() < self._redis_down_until
+
+    def _call(self, method_name: str, *args: Any, **kwargs: Any) -> Any:
+        if not self.is_using_fallback:
+            try:
+                return getattr(super(), method_name)(*args, **kwargs)
+            except (ConnectionError, TimeoutError) as e:
+                logger.warning(
+                    "Redis cache unreachable, using local memory for %ss: %s",
+                    self._retry_interval,
+                    e,
+                )
+                self._redis_down_until = time.monotonic() + self._retry_interval
+        return getattr(self._fallback, method_name)(*args, **kwargs)
+
+
+def _with_fallback(method_name: str) -> Callable[..., Any]:
+    def method(self: FallbackRedisCache, *args: Any, **kwargs: Any) -> Any:
+        return self._call(method_name, *args, **kwargs)
+
+    method.__name__ = method_name
+    return method
+
+
+for _method_name in FALLBACK_METHODS:
+    setattr(FallbackRedisCache, _method_name, _with_fallback(_method_name))
@@ -0,0 +1,253 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpRequest
+from django.utils.module_loading import import_string
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Sliding window log kept in a sorted set scored by millisecond timestamps. The whole
+# check-and-record runs atomically inside Redis and uses the Redis clock, so every
+# worker sees the same window regardless of local clock skew.
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local member = ARGV[3]
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+local count = redis.call('ZCARD', key)
+if count < limit then
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, window)
+    return {1, limit - count - 1, 0}
+end
+
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+return {0, 0, tonumber(oldest[2]) + window - now}
+"""
+
+
+class RateLimitResult:
+    """
+    Outcome of a single rate limit check.
+    """
+
+    def __init__(self, allowed: bool, remaining: int, retry_after: float) -> None:
+        """
+        Args:
+            allowed (bool): Whether the action may proceed.
+            remaining (int): How many more actions fit into the current window.
+            retry_after (float): Seconds until the next action will be allowed, 0 if allowed.
+        """
+        self.allowed = allowed
+        self.remaining = remaining
+        self.retry_after = retry_after
+
+    def __repr__(self) -> str:
+        return (
+            f"RateLimitResult(allowed={self.allowed}, remaining={self.remaining}, "
+            f"retry_after={self.retry_after})"
+        )
+
+
+class BaseRateLimitBackend:
+    """
+    Records actions and decides whether another one fits into a sliding window.
+    """
+
+    def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        """
+        Records an action for the key if it is within the limit.
+
+        Args:
+            key (str): The identity being limited, e.g. "ratelimit:comment_post:1.2.3.4".
+            limit (int): The maximum number of actions per window.
+            window (int): The window length in seconds.
+
+        Returns:
+            RateLimitResult: Whether the action is allowed and when to retry otherwise.
+        """
+        raise NotImplementedError
+
+    async def ahit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        """
+        Async version of `hit`, by default running it in a worker thread.
+        """
+        return await sync_to_async(self.hit, thread_sensitive=False)(key, limit, window)
+
+
+class RedisRateLimitBackend(BaseRateLimitBackend):
+    """
+    Sliding window rate limiter shared by all workers through Redis.
+    """
+
+    def __init__(self, client: Any = None, async_client: Any = None) -> None:
+        """
+        Args:
+            client (Optional[Redis]): The Redis client, by default the shared pooled client.
+            async_client (Optional[redis.asyncio.Redis]): The client of `ahit`, by default
+                the one of the running event loop.
+        """
+        if client is None:
+            from geoip.utils import redis_client as client
+        self.script = client.register_script(SLIDING_WINDOW_SCRIPT)
+        self.async_client = async_client
+
+    def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        allowed, remaining, retry_after_ms = self.script(
+            keys=[key], args=[window * 1000, limit, uuid.uuid4().hex]
+        )
+        return RateLimitResult(bool(allowed), int(remaining), int(retry_after_ms) / 1000)
+
+    async def ahit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        client = self.async_client
+        if client is None:
+            from geoip.utils import get_async_redis_client
+
+            client = get_async_redis_client()
+        # Scripts are run by their SHA1, so registering one per call costs no round-trip.
+        script = client.register_script(SLIDING_WINDOW_SCRIPT)
+        allowed, remaining, retry_after_ms = await script(
+            keys=[key], args=[window * 1000, limit, uuid.uuid4().hex]
+        )
+        return RateLimitResult(bool(allowed), int(remaining), int(retry_after_ms) / 1000)
+
+
+class InMemoryRateLimitBackend(BaseRateLimitBackend):
+    """
+    Process-local sliding window rate limiter, meant for tests and development.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Args:
+            clock (Callable[[], float]): Returns the current time in seconds.
+        """
+        self.clock = clock
+        self._hits: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        with self._lock:
+            now = self.clock()
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if len(hits) < limit:
+                hits.append(now)
+                return RateLimitResult(True, limit - len(hits), 0)
+            return RateLimitResult(False, 0, hits[0] + window - now)
+
+    async def ahit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        # Nothing here waits on I/O, the lock is only held for a few list operations.
+        return self.hit(key, limit, window)
+
+    def clear(self) -> None:
+        """
+        Forgets every recorded action.
+        """
+        with self._lock:
+            self._hits.clear()
+
+
+_backends: Dict[str, BaseRateLimitBackend] = {}
+
+
+def get_rate_limit_backend() -> BaseRateLimitBackend:
+    """
+    Returns the backend configured by `RATE_LIMIT_BACKEND`, creating it once per process.
+
+    Returns:
+        BaseRateLimitBackend: The rate limit backend.
+    """
+    path = settings.RATE_LIMIT_BACKEND
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+def get_rate_limit_identity(request: HttpRequest, key: str, user: Any = None) -> Optional[str]:
+    """
+    Builds the identity a rate limit applies to.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        key (str): "ip", "user", or "user_or_ip" to limit authenticated users by account
+            and anonymous ones by IP address.
+        user (Any): The user of the request if already loaded, by default `request.user`.
+
+    Returns:
+        Optional[str]: The identity, or None if it cannot be determined.
+    """
+    if user is None:
+        user = getattr(request, "user", None)
+    if key in ("user", "user_or_ip") and user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    if key == "user":
+        return None
+
+    from geoip.middleware import UserStatsMiddleware
+
+    ip = getattr(request, "ip_address", None) or UserStatsMiddleware.get_client_ip(request)
+    return f"ip:{ip}" if ip else None
+
+
+def check_rate_limit(request: HttpRequest, scope: str) -> RateLimitResult:
+    """
+    Records an action of the given scope and checks it against `RATE_LIMITS[scope]`.
+
+    Requests are let through if the backend is unavailable, so a Redis outage does not
+    take the endpoints down with it.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        scope (str): The endpoint being limited, e.g. "comment_post".
+
+    Returns:
+        RateLimitResult: Whether the action is allowed and when to retry otherwise.
+    """
+    config = settings.RATE_LIMITS[scope]
+    identity = get_rate_limit_identity(request, config.get("key", "ip"))
+    if identity is None:
+        return RateLimitResult(True, config["limit"], 0)
+
+    try:
+        return get_rate_limit_backend().hit(
+            f"ratelimit:{scope}:{identity}", config["limit"], config["window"]
+        )
+    except RedisError as e:
+        logger.warning("Rate limit backend unavailable, allowing %s: %s", scope, e)
+        return RateLimitResult(True, config["limit"], 0)
+
+
+async def acheck_rate_limit(request: HttpRequest, scope: str) -> RateLimitResult:
+    """
+    Async version of `check_rate_limit` for views running on the event loop.
+
+    The user is loaded with `request.auser()` and the backend is called through `ahit`,
+    so the check does not block the loop on the session store or Redis.
+    """
+    config = settings.RATE_LIMITS[scope]
+    key = config.get("key", "ip")
+    user = await request.auser() if key in ("user", "user_or_ip") else None  # type: ignore
+    identity = get_rate_limit_identity(request, key, user)
+    if identity is None:
+        return RateLimitResult(True, config["limit"], 0)
+
+    try:
+        return await get_rate_limit_backend().ahit(
+            f"ratelimit:{scope}:{identity}", config["limit"], config["window"]
+        )
+    except RedisError as e:
+        logger.warning("Rate limit backend unavailable, allowing %s: %s", scope, e)
+        return RateLimitResult(True, config["limit"], 0)
@@ -0,0 +1,136 @@
+from typing import Any, FrozenSet, Optional
+
+from django.conf import settings
+from graphene import ObjectType, Schema
+from graphene.validation import depth_limit_validator
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLField,
+    GraphQLNamedType,
+    InlineFragmentNode,
+    IntValueNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    ValidationRule,
+    get_named_type,
+    get_nullable_type,
+    is_list_type,
+    specified_rules,
+)
+
+from comment.schema import Query as CommentQuery
+from geoip.schema import Query as UserStatQuery
+from geoip.schema import RootMutation
+
+
+class QueryComplexityValidator(ValidationRule):  # type: ignore
+    """
+    Rejects operations whose estimated cost exceeds `GRAPHQL_MAX_COMPLEXITY`.
+
+    Every field costs 1. The cost of the fields selected below a list is multiplied by
+    the list's `first` argument, its default, or `GRAPHQL_LIST_SIZE` for lists without
+    one, so nesting `replies` a few levels deep is priced by the number of comments it
+    could return.
+    """
+
+    def enter_operation_definition(self, node: OperationDefinitionNode, *args: Any) -> None:
+        root_type = self.context.schema.get_root_type(node.operation)
+        if root_type is None:
+            return
+        complexity = self.get_complexity(node.selection_set, root_type, frozenset())
+        if complexity > settings.GRAPHQL_MAX_COMPLEXITY:
+            self.report_error(
+                GraphQLError(
+                    f"'{node.name.value if node.name else 'anonymous'}' has a complexity of "
+                    f"{complexity}, the maximum is {settings.GRAPHQL_MAX_COMPLEXITY}.",
+                    [node],
+                )
+            )
+
+    def get_complexity(
+        self,
+        selection_set: SelectionSetNode,
+        parent_type: Optional[GraphQLNamedType],
+        fragments: FrozenSet[str],
+    ) -> int:
+        """
+        Estimates the cost of a selection set.
+
+        Args:
+            selection_set (SelectionSetNode): The selections to price.
+            parent_type (Optional[GraphQLNamedType]): The type the selections are made on.
+            fragments (FrozenSet[str]): Fragments already expanded on this path, to stop
+                at fragment cycles (those are reported by another rule).
+
+        Returns:
+            int: The estimated number of fields the selection set resolves.
+        """
+        complexity = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                field = getattr(parent_type, "fields", {}).get(selection.name.value)
+                if field is None:
+                    continue
+                complexity += 1
+                if selection.selection_set:
+                    multiplier = 1
+                    if is_list_type(get_nullable_type(field.type)):
+                        multiplier = self.get_list_size(selection, field)
+                    complexity += multiplier * self.get_complexity(
+                        selection.selection_set, get_named_type(field.type), fragments
+                    )
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = parent_type
+                if selection.type_condition:
+                    fragment_type = self.context.schema.get_type(
+                        selection.type_condition.name.value
+                    )
+                complexity += self.get_complexity(selection.selection_set, fragment_type, fragments)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.context.get_fragment(name)
+                if fragment is None or name in fragments:
+                    continue
+                complexity += self.get_complexity(
+                    fragment.selection_set,
+                    self.context.schema.get_type(fragment.type_condition.name.value),
+                    fragments | {name},
+                )
+        return complexity
+
+    @staticmethod
+    def get_list_size(node: FieldNode, field: GraphQLField) -> int:
+        """
+        Returns the number of items a list field is expected to return.
+
+        Validation runs before variables are bound, so a `first` passed as a variable is
+        priced as the largest page any list returns.
+        """
+        max_size = int(settings.GRAPHQL_MAX_LIST_SIZE)
+        for argument in node.arguments or ():
+            if argument.name.value == "first":
+                if isinstance(argument.value, IntValueNode):
+                    return max(1, min(int(argument.value.value), max_size))
+                return max_size
+        first = field.args.get("first")
+        if first is not None and isinstance(first.default_value, int):
+            return max(1, min(first.default_value, max_size))
+        return int(settings.GRAPHQL_LIST_SIZE)
+
+
+class Query(CommentQuery, UserStatQuery, ObjectType):  # type: ignore
+    """
+    Root query combining the queries of all apps.
+    """
+
+
+schema = Schema(query=Query, mutation=RootMutation)
+
+# The standard rules followed by the limits on nesting and cost.
+validation_rules = (
+    *specified_rules,
+    depth_limit_validator(max_depth=settings.GRAPHQL_MAX_DEPTH),
+    QueryComplexityValidator,
+)
@@ -29,6 +29,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Apps
     "comment",
     "api",
@@ -53,10 +54,34 @@ MIDDLEWARE = [
     "geoip.middleware.UserStatsMiddleware",
 ]
 
+REDIS_URL = env("REDIS_URL", default="redis://testtask-redis:6379/0")
+# Connection pool shared by the user statistics code (geoip.utils.redis_client)
+REDIS_POOL_MAX_CONNECTIONS = env.int("REDIS_POOL_MAX_CONNECTIONS", default=20)
+REDIS_POOL_TIMEOUT = 1
+REDIS_SOCKET_TIMEOUT = 1
+REDIS_SOCKET_CONNECT_TIMEOUT = 1
+
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "unique-snowflake",
+        # Shared by all uWSGI workers; falls back to per-process memory if Redis is down.
+        "BACKEND": "testtask.cache.FallbackRedisCache",
+        "LOCATION": env("REDIS_CACHE_URL", default="redis://testtask-redis:6379/1"),
+        "TIMEOUT": 300,
+        "KEY_PREFIX": "testtask",
+        # Bump to invalidate every cached value at once, e.g. after a deploy.
+        "VERSION": env.int("CACHE_VERSION", default=1),
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "COMPRESSOR": "testtask.cache.FragmentCompressor",
+            "SOCKET_CONNECT_TIMEOUT": 1,
+            "SOCKET_TIMEOUT": 1,
+            "CONNECTION_POOL_KWARGS": {
+                "max_connections": 50,
+                "retry_on_timeout": True,
+                "health_check_interval": 30,
+            },
+            "FALLBACK_RETRY_INTERVAL": 30,
+        },
     }
 }
 
@@ -135,6 +160,13 @@ STATIC_ROOT = BASE_DIR / "static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    # Comment attachments are stored once per distinct content, see comment.storage.
+    "comments": {"BACKEND": "comment.storage.ContentAddressedStorage"},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -267,10 +299,115 @@ EMAIL_HOST_USER = env("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD")
 EMAIL_USE_TLS = True
 
+# New-comment notifications are collected for COMMENT_DIGEST_WINDOW seconds and sent
+# as digests of at most COMMENT_DIGEST_MAX_EVENTS comments each.
+COMMENT_NOTIFICATION_RECIPIENTS = env.list(
+    "COMMENT_NOTIFICATION_RECIPIENTS", default=["danya.tkachenko.1997@gmail.com"]
+)
+COMMENT_DIGEST_WINDOW = env.int("COMMENT_DIGEST_WINDOW", default=60)
+COMMENT_DIGEST_MAX_EVENTS = 50
+COMMENT_DIGEST_BATCH_SIZE = 500
+COMMENT_DIGEST_RETRY_BACKOFF = 30
+
+# Comments
+
+# "cursor" for keyset pagination of the comment list, "offset" for classic page numbers.
+COMMENT_PAGINATION_MODE = env("COMMENT_PAGINATION_MODE", default="cursor")
+
+# How long rendered comment threads stay cached; edits invalidate them immediately.
+COMMENT_THREAD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Sanitized previews of up to COMMENT_PREVIEW_CACHE_MAX_INPUT characters are cached per
+# process, so repeated previews of the same text skip the HTML parser.
+COMMENT_PREVIEW_CACHE_SIZE = 2048
+COMMENT_PREVIEW_CACHE_MAX_INPUT = 10_000
+
+# Image attachments are scaled down to COMMENT_IMAGE_MAX_SIZE and get thumbnails of
+# COMMENT_THUMBNAIL_SIZE; images above COMMENT_IMAGE_MAX_PIXELS are not decoded at all.
+COMMENT_IMAGE_MAX_SIZE = (1920, 1920)
+COMMENT_THUMBNAIL_SIZE = (320, 240)
+COMMENT_IMAGE_MAX_PIXELS = 40_000_000
+
+# Uploads are validated while they stream in and rejected once they pass these sizes.
+FILE_UPLOAD_HANDLERS = ["comment.uploads.CommentUploadHandler"]
+COMMENT_UPLOAD_MAX_SIZE = 5 * 1024 * 1024
+COMMENT_TEXT_UPLOAD_MAX_SIZE = 100 * 1024
+
+# Above this many rows the admin changelist shows estimated counts instead of COUNT(*).
+COMMENT_ADMIN_EXACT_COUNT_LIMIT = 10_000
+# Comments approved per transaction by the admin's bulk approval.
+COMMENT_ADMIN_APPROVE_BATCH_SIZE = 1000
+
+# Live comment updates (server-sent events, served by the ASGI application)
+
+# Events a client may fall behind by before its stream is reset.
+COMMENT_EVENTS_QUEUE_SIZE = 100
+# Open event streams per ASGI worker; further clients get 503 and retry.
+COMMENT_EVENTS_MAX_CONNECTIONS = 1000
+# Threads a single stream may follow, one page of the comment list.
+COMMENT_EVENTS_MAX_THREADS = 25
+# Seconds between keep-alive comments on idle streams.
+COMMENT_EVENTS_KEEPALIVE = 15
+# Reconnection delay suggested to clients, in milliseconds.
+COMMENT_EVENTS_RETRY_MS = 3000
+
+# Rate limiting
+
+# Reverse proxies in front of the application that append the address they received a
+# request from to X-Forwarded-For (nginx in docker-compose). Client addresses are read
+# that many entries from the right of the header, the ones further left can be forged
+# by clients; with 0, REMOTE_ADDR is used.
+TRUSTED_PROXY_COUNT = env.int("TRUSTED_PROXY_COUNT", default=0)
+
+RATE_LIMIT_BACKEND = "testtask.ratelimit.RedisRateLimitBackend"
+# Sliding windows per endpoint: at most `limit` actions per `window` seconds,
+# keyed by "ip", "user" or "user_or_ip".
+RATE_LIMITS = {
+    "comment_post": {"limit": 3, "window": 10 * 60, "key": "ip"},
+    "comment_preview": {"limit": 60, "window": 60, "key": "user_or_ip"},
+    "graphql_mutation": {"limit": 30, "window": 60, "key": "user_or_ip"},
+    "api_comment_post": {"limit": 10, "window": 60, "key": "user_or_ip"},
+    "comment_search": {"limit": 30, "window": 60, "key": "user_or_ip"},
+}
+
 # GeoIp
 
 GEOIP_PATH = BASE_DIR / "GeoLite2-City.mmdb"
+# Seconds between checks whether the database file was updated and must be reopened.
+GEOIP_RELOAD_INTERVAL = 60
+# Number of IP address lookups kept in the per-process LRU cache.
+GEOIP_CACHE_SIZE = 10000
+
+# User statistics are queued in memory and written to Redis in batches.
+USER_STATS_QUEUE_SIZE = 10000
+USER_STATS_BATCH_SIZE = 500
+USER_STATS_FLUSH_INTERVAL = 1.0
+# Seconds a request may wait for room in a full queue before its stat is dropped.
+USER_STATS_ENQUEUE_TIMEOUT = 0.0
+# Most IP addresses a single `userStats` query or `createUserStats` mutation may handle.
+USER_STATS_MAX_BATCH_SIZE = 1000
+# Visits are also counted per minute and per hour by country and language, with a
+# HyperLogLog of unique visitors per bucket. Seconds each bucket is kept:
+USER_STATS_ROLLUP_TTL = {"minute": 2 * 24 * 60 * 60, "hour": 90 * 24 * 60 * 60}
+# Most buckets a single `visitorStats` query may read.
+USER_STATS_MAX_BUCKETS = 24 * 60
 
 GRAPHENE = {
-    "SCHEMA": "geoip.schema.schema",
+    "SCHEMA": "testtask.schema.schema",
+    "MIDDLEWARE": ["geoip.views.ResolverTimingMiddleware"],
 }
+# Parsed and validated query documents kept per process by geoip.views.CustomGraphQLView.
+GRAPHQL_DOCUMENT_CACHE_SIZE = 500
+# Seconds a query registered through automatic persisted queries is kept in the cache.
+GRAPHQL_PERSISTED_QUERY_TTL = 7 * 24 * 60 * 60
+# Operations taking longer than this are logged as warnings with their slowest resolvers.
+GRAPHQL_SLOW_OPERATION_MS = 500
+# Limits checked before a GraphQL operation is executed: the nesting depth of its
+# selections and its estimated cost. Lists are priced by their `first` argument, which
+# is capped at GRAPHQL_MAX_LIST_SIZE; a `first` passed as a variable is priced at the
+# cap. Lists without a `first` argument are assumed to return GRAPHQL_LIST_SIZE items,
+# which is also the default number of replies per comment.
+GRAPHQL_MAX_DEPTH = 10
+GRAPHQL_MAX_COMPLEXITY = 5000
+GRAPHQL_LIST_SIZE = 5
+GRAPHQL_MAX_LIST_SIZE = 100
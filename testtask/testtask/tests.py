@@ -0,0 +1,192 @@
+import asyncio
+import zlib
+from typing import Any, Dict
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from fakeredis import FakeAsyncRedis, FakeConnection, FakeServer, FakeStrictRedis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from .cache import FallbackRedisCache
+from .ratelimit import (
+    BaseRateLimitBackend,
+    InMemoryRateLimitBackend,
+    RedisRateLimitBackend,
+    check_rate_limit,
+    get_rate_limit_backend,
+    get_rate_limit_identity,
+)
+
+
+def make_cache(location: str, **options: Any) -> FallbackRedisCache:
+    """
+    Builds a cache configured like settings.CACHES["default"].
+    """
+    params: Dict[str, Any] = {
+        "TIMEOUT": 300,
+        "KEY_PREFIX": "testtask",
+        "VERSION": 1,
+        "OPTIONS": {"COMPRESSOR": "testtask.cache.FragmentCompressor", **options},
+    }
+    return FallbackRedisCache(location, params)
+
+
+class FallbackRedisCacheTests(SimpleTestCase):
+    def setUp(self) -> None:
+        """
+        Set up a cache talking to an in-process fake Redis server.
+        """
+        self.server = FakeServer()
+        self.cache = make_cache(
+            "redis://localhost:6379/1",
+            CONNECTION_POOL_KWARGS={"connection_class": FakeConnection, "server": self.server},
+        )
+
+    def test_values_are_shared_through_redis(self) -> None:
+        """
+        Test that values written by one cache instance (worker) are visible to another.
+        """
+        other_worker = make_cache(
+            "redis://localhost:6379/1",
+            CONNECTION_POOL_KWARGS={"connection_class": FakeConnection, "server": self.server},
+        )
+        self.cache.set("thread", "<li>cached</li>")
+        self.cache.incr_version("thread")
+
+        self.assertEqual(other_worker.get("thread", version=2), "<li>cached</li>")
+        self.assertIsNone(other_worker.get("thread", version=1))
+
+    def test_large_values_are_compressed(self) -> None:
+        """
+        Test that large fragments are stored compressed while small values are not.
+        """
+        fragment = "<li>comment</li>" * 500
+        self.cache.set("fragment", fragment)
+        self.cache.set("counter", 1)
+
+        client = self.cache.client.get_client()
+        raw_fragment = client.get(self.cache.make_key("fragment"))
+        self.assertLess(len(raw_fragment), len(fragment))
+        self.assertIsInstance(zlib.decompress(raw_fragment), bytes)
+        self.assertEqual(client.get(self.cache.make_key("counter")), b"1")
+        self.assertEqual(self.cache.get("fragment"), fragment)
+
+    def test_falls_back_to_local_memory_when_redis_is_unreachable(self) -> None:
+        """
+        Test that an unreachable Redis degrades to a working local cache and is not
+        retried on every call.
+        """
+        cache = make_cache(
+            "redis://127.0.0.1:1/0", SOCKET_CONNECT_TIMEOUT=0.1, FALLBACK_RETRY_INTERVAL=60
+        )
+
+        cache.set("key", "value")
+
+        self.assertTrue(cache.is_using_fallback)
+        self.assertEqual(cache.get("key"), "value")
+        self.assertEqual(cache.get_many(["key", "missing"]), {"key": "value"})
+        self.assertTrue(cache.add("counter", 1))
+        self.assertEqual(cache.incr("counter"), 2)
+
+
+class RateLimitBackendTests(SimpleTestCase):
+    def assertSlidingWindow(self, backend: BaseRateLimitBackend) -> None:
+        """
+        Asserts that three hits per minute are allowed per key and the fourth is rejected.
+        """
+        results = [backend.hit("ratelimit:test:ip:1.1.1.1", 3, 60) for _ in range(4)]
+
+        self.assertEqual([result.allowed for result in results], [True, True, True, False])
+        self.assertEqual([result.remaining for result in results], [2, 1, 0, 0])
+        self.assertGreater(results[-1].retry_after, 0)
+        self.assertLessEqual(results[-1].retry_after, 60)
+        self.assertTrue(backend.hit("ratelimit:test:ip:2.2.2.2", 3, 60).allowed)
+
+    def test_in_memory_backend(self) -> None:
+        """
+        Test the sliding window of the in-memory backend, including window expiry.
+        """
+        now = [1000.0]
+        backend = InMemoryRateLimitBackend(clock=lambda: now[0])
+
+        self.assertSlidingWindow(backend)
+        now[0] += 60
+        self.assertTrue(backend.hit("ratelimit:test:ip:1.1.1.1", 3, 60).allowed)
+
+    def test_redis_backend(self) -> None:
+        """
+        Test the atomic Lua sliding window against a fake Redis server.
+        """
+        client = FakeStrictRedis(server=FakeServer())
+        self.assertSlidingWindow(RedisRateLimitBackend(client))
+        self.assertGreater(client.pttl("ratelimit:test:ip:1.1.1.1"), 0)
+
+    def test_async_redis_backend_shares_the_window(self) -> None:
+        """
+        Test that `ahit` runs the same script through the asyncio client.
+        """
+        server = FakeServer()
+        backend = RedisRateLimitBackend(
+            FakeStrictRedis(server=server), async_client=FakeAsyncRedis(server=server)
+        )
+
+        async def hit_twice() -> list:
+            return [await backend.ahit("ratelimit:test:ip:1.1.1.1", 3, 60) for _ in range(2)]
+
+        self.assertTrue(backend.hit("ratelimit:test:ip:1.1.1.1", 3, 60).allowed)
+        results = asyncio.run(hit_twice())
+        self.assertEqual([result.remaining for result in results], [1, 0])
+        self.assertFalse(backend.hit("ratelimit:test:ip:1.1.1.1", 3, 60).allowed)
+
+
+@override_settings(
+    RATE_LIMIT_BACKEND="testtask.ratelimit.InMemoryRateLimitBackend",
+    RATE_LIMITS={"test": {"limit": 1, "window": 60, "key": "user_or_ip"}},
+)
+class CheckRateLimitTests(SimpleTestCase):
+    def setUp(self) -> None:
+        """
+        Start every test with an empty in-memory backend.
+        """
+        get_rate_limit_backend().clear()  # type: ignore
+
+    def test_limits_anonymous_users_by_ip_and_users_by_account(self) -> None:
+        """
+        Test that anonymous requests share a limit per IP and users get their own.
+        """
+        factory = RequestFactory()
+        anonymous = factory.get("/", REMOTE_ADDR="1.1.1.1")
+        anonymous.user = AnonymousUser()
+        user = factory.get("/", REMOTE_ADDR="1.1.1.1")
+        user.user = mock.Mock(is_authenticated=True, pk=7)
+
+        self.assertTrue(check_rate_limit(anonymous, "test").allowed)
+        self.assertFalse(check_rate_limit(anonymous, "test").allowed)
+        self.assertTrue(check_rate_limit(user, "test").allowed)
+
+    def test_forwarded_addresses_are_only_trusted_from_proxies(self) -> None:
+        """
+        Test that clients cannot pick their identity through `X-Forwarded-For`.
+        """
+        factory = RequestFactory()
+        forged = factory.get("/", REMOTE_ADDR="1.1.1.1", HTTP_X_FORWARDED_FOR="9.9.9.9")
+        self.assertEqual(get_rate_limit_identity(forged, "ip"), "ip:1.1.1.1")
+
+        proxied = factory.get("/", REMOTE_ADDR="10.0.0.2", HTTP_X_FORWARDED_FOR="9.9.9.9, 2.2.2.2")
+        with override_settings(TRUSTED_PROXY_COUNT=1):
+            self.assertEqual(get_rate_limit_identity(proxied, "ip"), "ip:2.2.2.2")
+            self.assertEqual(get_rate_limit_identity(forged, "ip"), "ip:9.9.9.9")
+        with override_settings(TRUSTED_PROXY_COUNT=2):
+            # Fewer entries than proxies: the request did not come through all of them.
+            self.assertEqual(get_rate_limit_identity(forged, "ip"), "ip:1.1.1.1")
+
+    def test_allows_requests_when_the_backend_is_down(self) -> None:
+        """
+        Test that a Redis outage does not block requests.
+        """
+        request = RequestFactory().get("/")
+        with mock.patch.object(
+            InMemoryRateLimitBackend, "hit", side_effect=RedisConnectionError("down")
+        ):
+            self.assertTrue(check_rate_limit(request, "test").allowed)